@@ -1,19 +1,34 @@
 from __future__ import annotations
 
 import json
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
-from . import memo_service
+from . import db, memo_service
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    db.shutdown_executors()
+    db.close_connections()
 
 
 app = FastAPI(
     title="Memo API",
     version="0.1.0",
-    root_path="/agentV2/general-agent/vnc-app/memo/api"
+    root_path="/agentV2/general-agent/vnc-app/memo/api",
+    lifespan=lifespan,
 )
 
 # Allow CORS for local frontend development
@@ -23,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -38,6 +54,42 @@ class MemoUpdate(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class MemoBatchUpdateItem(MemoUpdate):
+    id: int
+
+
+class MemoImportItem(BaseModel):
+    """One line of an NDJSON export; memos without an id are created."""
+    id: Optional[int] = None
+    title: str
+    content: str
+    tags: List[str] = []
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+class MemoBatchCreate(BaseModel):
+    items: List[MemoCreate] = Field(min_length=1, max_length=memo_service.MAX_BATCH_SIZE)
+
+
+class MemoBatchUpdate(BaseModel):
+    items: List[MemoBatchUpdateItem] = Field(min_length=1, max_length=memo_service.MAX_BATCH_SIZE)
+
+
+class MemoBatchDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=memo_service.MAX_BATCH_SIZE)
+
+
+class MemoBatchDeleteOut(BaseModel):
+    deleted: List[int]
+    missing: List[int]
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
 class MemoOut(BaseModel):
     id: int
     title: str
@@ -45,67 +97,201 @@ class MemoOut(BaseModel):
     tags: List[str]
     created_at: str
     updated_at: str
+    # Highlighted match excerpt, only present in full-text search results
+    snippet: Optional[str] = None
+
+
+MEMO_FIELDS = ("id", "title", "content", "tags", "created_at", "updated_at")
+
+
+def _json_bytes(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
+class MemoJSONResponse(Response):
+    """JSON response rendered straight to bytes (orjson when available).
 
-def _parse_tags(tags_value) -> List[str]:
-    if tags_value is None:
-        return []
-    if isinstance(tags_value, list):
-        return [str(t) for t in tags_value]
-    if isinstance(tags_value, str):
+    Memo rows come from our own schema, so handlers return them through this
+    class instead of building a MemoOut per row: FastAPI skips response_model
+    validation for Response instances. response_model is still declared on
+    each route for the OpenAPI schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _json_bytes(content)
+
+
+def _to_out(memo_dict: dict) -> Dict[str, Any]:
+    """Shape a service memo dict as MemoOut without re-validating it."""
+    out = {field: memo_dict[field] for field in MEMO_FIELDS}
+    if memo_dict.get("snippet") is not None:
+        out["snippet"] = memo_dict["snippet"]
+    return out
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/memos", response_model=MemoOut, response_model_exclude_none=True, status_code=201)
+async def create_memo_api(payload: MemoCreate):
+    created = await memo_service.create_memo_async(payload.title, payload.content, payload.tags)
+    return MemoJSONResponse(_to_out(created), status_code=201)
+
+
+# Batch endpoints: each request is one SQLite transaction (all-or-nothing)
+@app.post("/memos:batch", response_model=List[MemoOut], response_model_exclude_none=True, status_code=201)
+async def batch_create_memos_api(payload: MemoBatchCreate):
+    try:
+        created = await memo_service.create_memos_async([item.model_dump() for item in payload.items])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return MemoJSONResponse([_to_out(m) for m in created], status_code=201)
+
+
+@app.post("/memos:batchUpdate", response_model=List[MemoOut], response_model_exclude_none=True)
+async def batch_update_memos_api(payload: MemoBatchUpdate):
+    try:
+        updated = await memo_service.update_memos_async([item.model_dump() for item in payload.items])
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return MemoJSONResponse([_to_out(m) for m in updated])
+
+
+@app.post("/memos:batchDelete", response_model=MemoBatchDeleteOut)
+async def batch_delete_memos_api(payload: MemoBatchDelete):
+    return await memo_service.delete_memos_async(payload.ids)
+
+
+# NDJSON export/import: one memo per line, streamed in batches so backups and
+# migrations run in constant memory regardless of the store size
+async def _export_ndjson():
+    batches = memo_service.iter_memo_batches()
+    try:
+        while True:
+            batch = await db.run_read(next, batches, None)
+            if batch is None:
+                break
+            yield b"".join(_json_bytes(_to_out(m)) + b"\n" for m in batch)
+    finally:
         try:
-            parsed = json.loads(tags_value)
-            if isinstance(parsed, list):
-                return [str(t) for t in parsed]
-        except Exception:
+            batches.close()
+        except ValueError:
+            # Still running a batch on a reader thread (client went away); the
+            # generator closes its connection when it is garbage collected
             pass
-    return []
 
 
-def _to_out(memo_dict: dict) -> MemoOut:
-    return MemoOut(
-        id=memo_dict["id"],
-        title=memo_dict["title"],
-        content=memo_dict["content"],
-        tags=_parse_tags(memo_dict.get("tags")),
-        created_at=memo_dict["created_at"],
-        updated_at=memo_dict["updated_at"],
+@app.get("/memos:export")
+async def export_memos_api():
+    return StreamingResponse(
+        _export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="memos.ndjson"'},
     )
 
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+@app.post("/memos:import")
+async def import_memos_api(request: Request):
+    """Import an NDJSON export; each batch of lines is committed in its own transaction."""
+    imported = 0
+    line_no = 0
+    batch: List[dict] = []
+    buffer = b""
+
+    async def flush():
+        nonlocal imported, batch
+        if batch:
+            try:
+                imported += await memo_service.import_memos_async(batch)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"{e}（已导入 {imported} 条）")
+            batch = []
 
+    async def feed(lines: List[bytes]):
+        nonlocal line_no
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                item = _json_loads(line)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"第 {line_no} 行不是有效的 JSON（已导入 {imported} 条）")
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=400, detail=f"第 {line_no} 行不是 JSON 对象（已导入 {imported} 条）")
+            try:
+                memo = MemoImportItem.model_validate(item)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"第 {line_no} 行不是有效的备忘录：{field} {error['msg']}（已导入 {imported} 条）",
+                )
+            batch.append(memo.model_dump())
+            if len(batch) >= memo_service.EXPORT_BATCH_SIZE:
+                await flush()
 
-@app.post("/memos", response_model=MemoOut, status_code=201)
-def create_memo_api(payload: MemoCreate):
-    created = memo_service.create_memo(payload.title, payload.content, payload.tags)
-    return _to_out(created)
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        await feed(lines)
+    await feed([buffer])
+    await flush()
+    return {"imported": imported}
 
 
-@app.get("/memos/{memo_id}", response_model=MemoOut)
-def get_memo_api(memo_id: int):
-    memo = memo_service.get_memo(memo_id)
+@app.get("/memos/{memo_id}", response_model=MemoOut, response_model_exclude_none=True)
+async def get_memo_api(memo_id: int):
+    memo = await memo_service.get_memo_async(memo_id)
     if not memo:
         raise HTTPException(status_code=404, detail="Memo 不存在")
-    return _to_out(memo)
+    return MemoJSONResponse(_to_out(memo))
 
 
-@app.get("/memos", response_model=List[MemoOut])
-def list_memos_api(
+@app.get("/memos", response_model=List[MemoOut], response_model_exclude_none=True)
+async def list_memos_api(
     search: Optional[str] = Query(default=None),
     limit: Optional[int] = Query(default=None, ge=1),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None),
+    tag: Optional[str] = Query(default=None),
 ):
-    memos = memo_service.list_memos(search=search, limit=limit, offset=offset)
-    return [_to_out(m) for m in memos]
+    # offset paging is kept for compatibility; cursor paging returns the next cursor in X-Next-Cursor
+    if offset and cursor:
+        raise HTTPException(status_code=400, detail="offset 与 cursor 不能同时使用")
+    next_cursor = None
+    if offset:
+        memos = await memo_service.list_memos_async(search=search, limit=limit, offset=offset, tag=tag)
+    else:
+        try:
+            memos, next_cursor = await memo_service.list_memos_page_async(search=search, limit=limit, cursor=cursor, tag=tag)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return MemoJSONResponse([_to_out(m) for m in memos], headers=headers)
+
+
+@app.get("/tags", response_model=List[TagCount])
+async def tag_counts_api():
+    return await memo_service.tag_counts_async()
 
 
-@app.put("/memos/{memo_id}", response_model=MemoOut)
-def update_memo_api(memo_id: int, payload: MemoUpdate):
+@app.put("/memos/{memo_id}", response_model=MemoOut, response_model_exclude_none=True)
+async def update_memo_api(memo_id: int, payload: MemoUpdate):
     try:
-        updated = memo_service.update_memo(
+        updated = await memo_service.update_memo_async(
             memo_id=memo_id,
             title=payload.title,
             content=payload.content,
@@ -113,12 +299,12 @@ def update_memo_api(memo_id: int, payload: MemoUpdate):
         )
     except ValueError:
         raise HTTPException(status_code=404, detail="Memo 不存在")
-    return _to_out(updated)
+    return MemoJSONResponse(_to_out(updated))
 
 
 @app.delete("/memos/{memo_id}")
-def delete_memo_api(memo_id: int):
-    ok = memo_service.delete_memo(memo_id)
+async def delete_memo_api(memo_id: int):
+    ok = await memo_service.delete_memo_async(memo_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Memo 不存在")
     return {"deleted": True}
\ No newline at end of file
@@ -1,7 +1,12 @@
+import asyncio
+import functools
 import os
 import sqlite3
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, List, Optional, TypeVar
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -17,20 +22,145 @@ def _get_db_path() -> Path:
 
 DB_PATH = _get_db_path()
 
+# Per-connection tuning: WAL lets readers proceed while a write is in progress,
+# NORMAL sync is durable across app crashes in WAL mode, and the mmap/cache
+# sizes keep hot pages in memory.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+# Size of each connection's prepared statement cache
+STATEMENT_CACHE_SIZE = 256
 
-def connect() -> sqlite3.Connection:
-    """Create a SQLite connection with Row factory for dict-like access."""
-    conn = sqlite3.connect(DB_PATH)
+_local = threading.local()
+# Open pooled connections, so close_connections() can reach every thread's
+# connection; a connection is removed and closed when its thread exits
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+# Bumped by close_connections() so threads drop their closed connection
+_generation = 0
+
+
+def open_connection() -> sqlite3.Connection:
+    """Open a tuned connection outside the per-thread pool (caller closes it).
+
+    Used for long-running work such as streaming exports, which must not tie
+    up the calling thread's pooled connection between batches.
+    """
+    conn = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+def _release_connection(conn: sqlite3.Connection) -> None:
+    with _connections_lock:
+        if conn not in _connections:
+            # Already closed by close_connections()
+            return
+        _connections.remove(conn)
+    conn.close()
+
+
+class _ThreadConnection:
+    """A thread's pooled connection, stored in the thread-local.
+
+    When the thread exits its thread-local state is dropped and the finalizer
+    closes the connection, so short-lived threads do not leave connections
+    (and their file handles) behind in ``_connections``.
+    """
+
+    def __init__(self) -> None:
+        # Each pooled connection is only used by the thread that opened it; the
+        # check is disabled so close_connections() can close them from any thread.
+        self.conn = open_connection()
+        self.generation = _generation
+        with _connections_lock:
+            _connections.append(self.conn)
+        weakref.finalize(self, _release_connection, self.conn)
+
+
+def connect() -> sqlite3.Connection:
+    """Return this thread's SQLite connection, opening and tuning it on first use.
+
+    The connection is reused for the lifetime of the thread, so statements
+    prepared by earlier calls stay cached. ``with connect() as conn:`` wraps
+    a transaction (commit on success, rollback on error) and does not close it.
+    """
+    pooled: Optional[_ThreadConnection] = getattr(_local, "pooled", None)
+    if pooled is None or pooled.generation != _generation:
+        pooled = _local.pooled = _ThreadConnection()
+    return pooled.conn
+
+
+def close_connections() -> None:
+    """Close every pooled connection, e.g. on shutdown or before replacing the DB file."""
+    global _generation
+    with _connections_lock:
+        conns = list(_connections)
+        _connections.clear()
+        _generation += 1
+    for conn in conns:
+        conn.close()
+
+
+T = TypeVar("T")
+
+# Async access: writes are serialized on one dedicated thread (SQLite allows a
+# single writer anyway, so this avoids busy-waiting on the write lock), while
+# reads fan out over a pool; WAL lets them run alongside the writer. Each
+# executor thread keeps its own pooled connection from connect().
+READ_POOL_SIZE = int(os.environ.get("MEMO_DB_READERS", "8"))
+
+_writer: Optional[ThreadPoolExecutor] = None
+_readers: Optional[ThreadPoolExecutor] = None
+_executors_lock = threading.Lock()
+
+
+def _get_executors() -> tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+    global _writer, _readers
+    with _executors_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memo-db-writer")
+            _readers = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="memo-db-reader")
+        return _writer, _readers
+
+
+async def run_read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking read on the reader pool without blocking the event loop."""
+    _, readers = _get_executors()
+    return await asyncio.get_running_loop().run_in_executor(readers, functools.partial(fn, *args, **kwargs))
+
+
+async def run_write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking write on the single writer thread without blocking the event loop."""
+    writer, _ = _get_executors()
+    return await asyncio.get_running_loop().run_in_executor(writer, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    """Wait for queued database work to finish and stop the executor threads."""
+    global _writer, _readers
+    with _executors_lock:
+        executors = [e for e in (_writer, _readers) if e is not None]
+        _writer = _readers = None
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
 def init_db() -> None:
     """Create tables if they do not exist."""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     with connect() as conn:
         cur = conn.cursor()
-        # Basic memo table: title, content, timestamps, optional tags (JSON string)
+        # Basic memo table: title, content, timestamps; tags live in memo_tags
+        # (the tags JSON column is legacy and only read once for migration)
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS memos (
@@ -43,16 +173,95 @@ def init_db() -> None:
             )
             """
         )
-        # Simple index to help recent queries
+        # Composite index backing the (updated_at, id) keyset pagination order;
+        # it supersedes the old single-column updated_at index
+        cur.execute("DROP INDEX IF EXISTS idx_memos_updated_at")
         cur.execute(
             """
-            CREATE INDEX IF NOT EXISTS idx_memos_updated_at
-            ON memos(updated_at);
+            CREATE INDEX IF NOT EXISTS idx_memos_updated_at_id
+            ON memos(updated_at DESC, id DESC);
             """
         )
+        _init_tags(cur)
+        _init_fts(cur)
         conn.commit()
 
 
+def _init_tags(cur: sqlite3.Cursor) -> None:
+    """Create the normalized memo_tags table, indexed by tag for filtering and counts.
+
+    memo_tags is the source of truth for tags; the legacy memos.tags JSON column
+    is no longer read or written. Existing databases are backfilled from it once,
+    when the table is first created.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='memo_tags'")
+    if cur.fetchone() is not None:
+        return
+    cur.execute(
+        """
+        CREATE TABLE memo_tags (
+            memo_id INTEGER NOT NULL REFERENCES memos(id) ON DELETE CASCADE,
+            tag TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (memo_id, tag)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute("CREATE INDEX idx_memo_tags_tag ON memo_tags(tag, memo_id)")
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO memo_tags (memo_id, tag, position)
+        SELECT m.id, j.value, j.key
+        FROM memos m, json_each(m.tags) j
+        WHERE json_valid(m.tags) AND json_type(m.tags) = 'array' AND j.type = 'text'
+        """
+    )
+
+
+def _init_fts(cur: sqlite3.Cursor) -> None:
+    """Create the memos_fts full-text index and its sync triggers.
+
+    The trigram tokenizer matches arbitrary substrings (including CJK text,
+    which has no word boundaries), so it is a drop-in replacement for the
+    old ``LIKE '%q%'`` search. Databases created before the index existed
+    are backfilled with a one-off 'rebuild'. SQLite builds without FTS5 or
+    the trigram tokenizer (< 3.34) keep using LIKE search.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='memos_fts'")
+    if cur.fetchone() is None:
+        try:
+            cur.execute(
+                """
+                CREATE VIRTUAL TABLE memos_fts USING fts5(
+                    title, content,
+                    content='memos', content_rowid='id',
+                    tokenize='trigram'
+                )
+                """
+            )
+        except sqlite3.OperationalError:
+            return
+        # Migrate existing rows into the new index
+        cur.execute("INSERT INTO memos_fts(memos_fts) VALUES('rebuild')")
+
+    cur.executescript(
+        """
+        CREATE TRIGGER IF NOT EXISTS memos_fts_ai AFTER INSERT ON memos BEGIN
+            INSERT INTO memos_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS memos_fts_ad AFTER DELETE ON memos BEGIN
+            INSERT INTO memos_fts(memos_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS memos_fts_au AFTER UPDATE OF title, content ON memos BEGIN
+            INSERT INTO memos_fts(memos_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO memos_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END;
+        """
+    )
+
+
 def table_exists(table_name: str) -> bool:
     with connect() as conn:
         cur = conn.cursor()
@@ -63,6 +272,11 @@ def table_exists(table_name: str) -> bool:
         return cur.fetchone() is not None
 
 
+def fts_enabled() -> bool:
+    """Whether the memos_fts full-text index is available in this database."""
+    return table_exists("memos_fts")
+
+
 def ensure_initialized() -> None:
     if not table_exists("memos"):
         init_db()
\ No newline at end of file
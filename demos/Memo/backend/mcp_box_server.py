@@ -8,16 +8,19 @@ import httpx
 
 
 # ============================================================================
-# 工具1: memo.create - 创建备忘录
+# Memo 工具模块: memo.create / memo.get / memo.list / memo.update / memo.delete,
+# memo.tag_counts,以及批量工具 memo.batch_create / memo.batch_update / memo.batch_delete
+# 全部工具共享同一份导入与 _http_request,作为一个注册单元注册、存储并加载到沙箱;
+# _http_request 使用 MCP Box 注入的 http_client 连接池
 # ============================================================================
-memo_create_code = """
+memo_tools_code = """
 \"\"\"
 <requirements>
 httpx>=0.27.0
 </requirements>
 \"\"\"
 import os
-from typing import List, Optional, Any, Dict
+from typing import Any, Dict, List, Optional
 import httpx
 
 API_BASE_URL = os.getenv("MEMO_API_URL", "http://127.0.0.1:48000")
@@ -27,11 +30,14 @@ def _http_request(
     path: str,
     json_data: Optional[Dict[str, Any]] = None,
     params: Optional[Dict[str, Any]] = None,
+    return_response: bool = False,
 ) -> Any:
     \"\"\"封装 HTTP 请求,统一错误处理\"\"\"
     url = f"{API_BASE_URL}{path}"
+    # 优先使用 MCP Box 注入的连接池客户端,复用 keep-alive 连接
+    client = globals().get("http_client") or httpx
     try:
-        response = httpx.request(
+        response = client.request(
             method=method,
             url=url,
             json=json_data,
@@ -40,6 +46,8 @@ def _http_request(
             headers={"Content-Type": "application/json"},
         )
         response.raise_for_status()
+        if return_response:
+            return response
         return response.json()
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -68,54 +76,6 @@ def memo_create(title: str, content: str, tags: Optional[List[str]] = None) -> D
     payload = {"title": title, "content": content, "tags": tags or []}
     data = _http_request("POST", "/memos", json_data=payload)
     return data
-"""
-
-
-# ============================================================================
-# 工具2: memo.get - 查询备忘录
-# ============================================================================
-memo_get_code = """
-\"\"\"
-<requirements>
-httpx>=0.27.0
-</requirements>
-\"\"\"
-import os
-from typing import Any, Dict, Optional
-import httpx
-
-API_BASE_URL = os.getenv("MEMO_API_URL", "http://127.0.0.1:48000")
-
-def _http_request(
-    method: str,
-    path: str,
-    json_data: Optional[Dict[str, Any]] = None,
-    params: Optional[Dict[str, Any]] = None,
-) -> Any:
-    \"\"\"封装 HTTP 请求,统一错误处理\"\"\"
-    url = f"{API_BASE_URL}{path}"
-    try:
-        response = httpx.request(
-            method=method,
-            url=url,
-            json=json_data,
-            params=params,
-            timeout=10.0,
-            headers={"Content-Type": "application/json"},
-        )
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            raise ValueError("Memo 不存在")
-        else:
-            try:
-                error_detail = e.response.json().get("detail", e.response.text)
-            except Exception:
-                error_detail = e.response.text
-            raise ValueError(f"API 错误: {e.response.status_code} - {error_detail}")
-    except httpx.RequestError as e:
-        raise ValueError(f"无法连接到 API 服务器 ({API_BASE_URL}): {str(e)}")
 
 @mcp.tool(
     description='根据 id 查询备忘录',
@@ -129,67 +89,27 @@ def memo_get(memo_id: int) -> Dict[str, Any]:
     \"\"\"根据 id 查询备忘录,不存在则抛出错误\"\"\"
     data = _http_request("GET", f"/memos/{memo_id}")
     return data
-"""
-
-
-# ============================================================================
-# 工具3: memo.list - 列表/搜索备忘录
-# ============================================================================
-memo_list_code = """
-\"\"\"
-<requirements>
-httpx>=0.27.0
-</requirements>
-\"\"\"
-import os
-from typing import Any, Dict, List, Optional
-import httpx
-
-API_BASE_URL = os.getenv("MEMO_API_URL", "http://127.0.0.1:48000")
-
-def _http_request(
-    method: str,
-    path: str,
-    json_data: Optional[Dict[str, Any]] = None,
-    params: Optional[Dict[str, Any]] = None,
-) -> Any:
-    \"\"\"封装 HTTP 请求,统一错误处理\"\"\"
-    url = f"{API_BASE_URL}{path}"
-    try:
-        response = httpx.request(
-            method=method,
-            url=url,
-            json=json_data,
-            params=params,
-            timeout=10.0,
-            headers={"Content-Type": "application/json"},
-        )
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            raise ValueError("Memo 不存在")
-        else:
-            try:
-                error_detail = e.response.json().get("detail", e.response.text)
-            except Exception:
-                error_detail = e.response.text
-            raise ValueError(f"API 错误: {e.response.status_code} - {error_detail}")
-    except httpx.RequestError as e:
-        raise ValueError(f"无法连接到 API 服务器 ({API_BASE_URL}): {str(e)}")
 
 @mcp.tool(
-    description='按更新时间倒序列出备忘录,支持搜索与分页',
+    description='按更新时间倒序列出备忘录,支持搜索与游标分页',
     annotations={
         "parameters": {
             "search": {"description": "搜索关键词，可选，搜索标题和内容"},
             "limit": {"description": "返回结果数量限制，可选"},
-            "offset": {"description": "分页偏移量，默认为 0"}
+            "offset": {"description": "分页偏移量，默认为 0，建议改用 cursor"},
+            "cursor": {"description": "分页游标，传入上一页返回的 next_cursor"},
+            "tag": {"description": "只返回带有该标签的备忘录，可选"}
         }
     }
 )
-def memo_list(search: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
-    \"\"\"按更新时间倒序列出备忘录,支持搜索与分页\"\"\"
+def memo_list(
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    tag: Optional[str] = None,
+) -> Dict[str, Any]:
+    \"\"\"按更新时间倒序列出备忘录,返回 {"items": [...], "next_cursor": 下一页游标或 None}\"\"\"
     params = {}
     if search:
         params["search"] = search
@@ -197,56 +117,12 @@ def memo_list(search: Optional[str] = None, limit: Optional[int] = None, offset:
         params["limit"] = limit
     if offset:
         params["offset"] = offset
-    data = _http_request("GET", "/memos", params=params)
-    return data
-"""
-
-
-# ============================================================================
-# 工具4: memo.update - 更新备忘录
-# ============================================================================
-memo_update_code = """
-\"\"\"
-<requirements>
-httpx>=0.27.0
-</requirements>
-\"\"\"
-import os
-from typing import Any, Dict, List, Optional
-import httpx
-
-API_BASE_URL = os.getenv("MEMO_API_URL", "http://127.0.0.1:48000")
-
-def _http_request(
-    method: str,
-    path: str,
-    json_data: Optional[Dict[str, Any]] = None,
-    params: Optional[Dict[str, Any]] = None,
-) -> Any:
-    \"\"\"封装 HTTP 请求,统一错误处理\"\"\"
-    url = f"{API_BASE_URL}{path}"
-    try:
-        response = httpx.request(
-            method=method,
-            url=url,
-            json=json_data,
-            params=params,
-            timeout=10.0,
-            headers={"Content-Type": "application/json"},
-        )
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            raise ValueError("Memo 不存在")
-        else:
-            try:
-                error_detail = e.response.json().get("detail", e.response.text)
-            except Exception:
-                error_detail = e.response.text
-            raise ValueError(f"API 错误: {e.response.status_code} - {error_detail}")
-    except httpx.RequestError as e:
-        raise ValueError(f"无法连接到 API 服务器 ({API_BASE_URL}): {str(e)}")
+    if cursor:
+        params["cursor"] = cursor
+    if tag:
+        params["tag"] = tag
+    response = _http_request("GET", "/memos", params=params, return_response=True)
+    return {"items": response.json(), "next_cursor": response.headers.get("X-Next-Cursor")}
 
 @mcp.tool(
     description='更新指定备忘录的字段',
@@ -275,54 +151,6 @@ def memo_update(
         payload["tags"] = tags
     data = _http_request("PUT", f"/memos/{memo_id}", json_data=payload)
     return data
-"""
-
-
-# ============================================================================
-# 工具5: memo.delete - 删除备忘录
-# ============================================================================
-memo_delete_code = """
-\"\"\"
-<requirements>
-httpx>=0.27.0
-</requirements>
-\"\"\"
-import os
-from typing import Any, Dict, Optional
-import httpx
-
-API_BASE_URL = os.getenv("MEMO_API_URL", "http://127.0.0.1:48000")
-
-def _http_request(
-    method: str,
-    path: str,
-    json_data: Optional[Dict[str, Any]] = None,
-    params: Optional[Dict[str, Any]] = None,
-) -> Any:
-    \"\"\"封装 HTTP 请求,统一错误处理\"\"\"
-    url = f"{API_BASE_URL}{path}"
-    try:
-        response = httpx.request(
-            method=method,
-            url=url,
-            json=json_data,
-            params=params,
-            timeout=10.0,
-            headers={"Content-Type": "application/json"},
-        )
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            raise ValueError("Memo 不存在")
-        else:
-            try:
-                error_detail = e.response.json().get("detail", e.response.text)
-            except Exception:
-                error_detail = e.response.text
-            raise ValueError(f"API 错误: {e.response.status_code} - {error_detail}")
-    except httpx.RequestError as e:
-        raise ValueError(f"无法连接到 API 服务器 ({API_BASE_URL}): {str(e)}")
 
 @mcp.tool(
     description='删除指定 id 的备忘录',
@@ -336,6 +164,51 @@ def memo_delete(memo_id: int) -> Dict[str, Any]:
     \"\"\"删除指定 id 的备忘录,返回删除结果\"\"\"
     data = _http_request("DELETE", f"/memos/{memo_id}")
     return data
+
+@mcp.tool(description='统计每个标签下的备忘录数量')
+def memo_tag_counts() -> List[Dict[str, Any]]:
+    \"\"\"返回 [{"tag": 标签, "count": 数量}, ...],按数量倒序\"\"\"
+    data = _http_request("GET", "/tags")
+    return data
+
+@mcp.tool(
+    description='批量创建备忘录,一次请求在同一事务中写入',
+    annotations={
+        "parameters": {
+            "items": {"description": "备忘录列表，每项包含 title、content 和可选的 tags"}
+        }
+    }
+)
+def memo_batch_create(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    \"\"\"批量创建备忘录,全部成功或全部失败,按输入顺序返回创建的记录\"\"\"
+    data = _http_request("POST", "/memos:batch", json_data={"items": items})
+    return data
+
+@mcp.tool(
+    description='批量更新备忘录的字段,一次请求在同一事务中写入',
+    annotations={
+        "parameters": {
+            "items": {"description": "更新列表，每项包含 id 和要更新的 title、content、tags"}
+        }
+    }
+)
+def memo_batch_update(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    \"\"\"批量更新备忘录,任一 id 不存在时全部不更新,按输入顺序返回更新后的记录\"\"\"
+    data = _http_request("POST", "/memos:batchUpdate", json_data={"items": items})
+    return data
+
+@mcp.tool(
+    description='按 id 批量删除备忘录',
+    annotations={
+        "parameters": {
+            "memo_ids": {"description": "备忘录 ID 列表"}
+        }
+    }
+)
+def memo_batch_delete(memo_ids: List[int]) -> Dict[str, Any]:
+    \"\"\"批量删除备忘录,返回 {"deleted": [...], "missing": [...]}\"\"\"
+    data = _http_request("POST", "/memos:batchDelete", json_data={"ids": memo_ids})
+    return data
 """
 
 
@@ -350,11 +223,11 @@ async def call_add_mcp_tool(host: str, port: int, mcp_tool_name: str, mcp_tool_c
     Args:
         host: MCP Box 主机地址
         port: MCP Box HTTP 管理端口 (通常是 SSE 端口 + 1)
-        mcp_tool_name: 工具名称
-        mcp_tool_code: 工具代码字符串
+        mcp_tool_name: 注册名称 (工具模块名)
+        mcp_tool_code: 工具模块代码字符串,可包含多个 @mcp.tool 工具
 
     Returns:
-        响应结果字典，包含 result, error, mcp_box_url 等字段
+        响应结果字典，包含 result, error, mcp_box_url, tools 等字段
     """
     url = f"http://{host}:{port}/add_mcp_tool/"
     params = {"mcp_tool_name": mcp_tool_name}
@@ -394,7 +267,7 @@ def main(host: str, port: int):
     """
     Memo MCP 工具注册脚本
 
-    将 5 个 Memo 工具 (create, get, list, update, delete) 注册到 MCP Box 服务器
+    将 Memo 工具模块 (create, get, list, update, delete, tag_counts 及 3 个批量工具共 9 个工具) 作为一个注册单元注册到 MCP Box 服务器
 
     使用方法:
         python mcp_box_server.py --host localhost --port 47071
@@ -410,23 +283,20 @@ def main(host: str, port: int):
     print("Memo MCP 工具注册脚本")
     print("=" * 70)
     print(f"目标 MCP Box: http://{host}:{port}")
-    print(f"准备注册 5 个工具: memo.create, memo.get, memo.list, memo.update, memo.delete")
+    print(f"准备注册工具模块 memo: memo.create, memo.get, memo.list, memo.update, memo.delete, memo.tag_counts, "
+          f"memo.batch_create, memo.batch_update, memo.batch_delete")
     print("=" * 70)
     print()
 
-    # 定义要注册的工具
+    # 定义要注册的工具模块,一个模块可包含多个工具
     tools = [
-        ("memo.create", memo_create_code),
-        ("memo.get", memo_get_code),
-        ("memo.list", memo_list_code),
-        ("memo.update", memo_update_code),
-        ("memo.delete", memo_delete_code),
+        ("memo", memo_tools_code),
     ]
 
     async def register_all_tools():
         results = []
         for tool_name, tool_code in tools:
-            print(f"正在注册工具: {tool_name}...")
+            print(f"正在注册工具模块: {tool_name}...")
             result = await call_add_mcp_tool(host, port, tool_name, tool_code)
             results.append((tool_name, result))
             print()
@@ -436,12 +306,14 @@ def main(host: str, port: int):
         print("注册结果汇总")
         print("=" * 70)
         success_count = sum(1 for _, r in results if r.get('result') == 0)
-        print(f"成功注册: {success_count}/{len(tools)} 个工具")
+        print(f"成功注册: {success_count}/{len(tools)} 个工具模块")
         print()
 
         for tool_name, result in results:
             status = "✅ 成功" if result.get('result') == 0 else "❌ 失败"
             print(f"{status} - {tool_name}")
+            for name in result.get('tools', []):
+                print(f"    - {name}")
 
         print("=" * 70)
 
@@ -17,6 +17,7 @@ def _http_request(
     path: str,
     json_data: Optional[Dict[str, Any]] = None,
     params: Optional[Dict[str, Any]] = None,
+    return_response: bool = False,
 ) -> Any:
     """
     封装 HTTP 请求,统一错误处理。
@@ -26,6 +27,7 @@ def _http_request(
         path: API 路径 (如 /memos)
         json_data: JSON 请求体 (可选)
         params: 查询参数 (可选)
+        return_response: 为 True 时返回原始响应 (需要读取响应头时使用)
 
     Returns:
         解析后的 JSON 响应
@@ -44,6 +46,8 @@ def _http_request(
             headers={"Content-Type": "application/json"},
         )
         response.raise_for_status()
+        if return_response:
+            return response
         return response.json()
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -59,23 +63,127 @@ def _http_request(
         raise ValueError(f"无法连接到 API 服务器 ({API_BASE_URL}): {str(e)}")
 
 
-def create_server(api_url: Optional[str] = None) -> FastMCP:
+MEMO_FIELDS = ("id", "title", "content", "tags", "created_at", "updated_at")
+
+
+class _HttpBackend:
+    """通过 HTTP API 操作备忘录,MCP 服务与 API 服务可分开部署"""
+
+    def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return _http_request("POST", "/memos", json_data=payload)
+
+    def get(self, memo_id: int) -> Dict[str, Any]:
+        return _http_request("GET", f"/memos/{memo_id}")
+
+    def list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = _http_request("GET", "/memos", params=params, return_response=True)
+        return {"items": response.json(), "next_cursor": response.headers.get("X-Next-Cursor")}
+
+    def update(self, memo_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return _http_request("PUT", f"/memos/{memo_id}", json_data=payload)
+
+    def delete(self, memo_id: int) -> Dict[str, Any]:
+        return _http_request("DELETE", f"/memos/{memo_id}")
+
+    def tag_counts(self) -> List[Dict[str, Any]]:
+        return _http_request("GET", "/tags")
+
+    def batch_create(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return _http_request("POST", "/memos:batch", json_data={"items": items})
+
+    def batch_update(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return _http_request("POST", "/memos:batchUpdate", json_data={"items": items})
+
+    def batch_delete(self, memo_ids: List[int]) -> Dict[str, Any]:
+        return _http_request("POST", "/memos:batchDelete", json_data={"ids": memo_ids})
+
+
+def _memo_out(memo: Dict[str, Any]) -> Dict[str, Any]:
+    """与 API 返回的备忘录对象保持相同的字段"""
+    out = {field: memo[field] for field in MEMO_FIELDS}
+    if memo.get("snippet") is not None:
+        out["snippet"] = memo["snippet"]
+    return out
+
+
+class _LocalBackend:
+    """在当前进程内直接调用 memo_service,省去 HTTP 往返和 API 请求处理,需与数据库部署在同一主机"""
+
+    def __init__(self):
+        # 延迟导入: 导入 memo_service 会初始化数据库
+        from . import memo_service
+        self.service = memo_service
+
+    def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not payload["title"] or not payload["content"]:
+            raise ValueError("title 和 content 不可为空")
+        return _memo_out(self.service.create_memo(**payload))
+
+    def get(self, memo_id: int) -> Dict[str, Any]:
+        memo = self.service.get_memo(memo_id)
+        if memo is None:
+            raise ValueError("Memo 不存在")
+        return _memo_out(memo)
+
+    def list(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # 与 API 一致: 指定 offset 时按偏移分页,否则按游标分页,两者不能同时使用
+        if params.get("offset") and params.get("cursor"):
+            raise ValueError("offset 与 cursor 不能同时使用")
+        if params.get("offset"):
+            items = self.service.list_memos(**params)
+            next_cursor = None
+        else:
+            params.pop("offset", None)
+            items, next_cursor = self.service.list_memos_page(**params)
+        return {"items": [_memo_out(m) for m in items], "next_cursor": next_cursor}
+
+    def update(self, memo_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return _memo_out(self.service.update_memo(memo_id, **payload))
+
+    def delete(self, memo_id: int) -> Dict[str, Any]:
+        if not self.service.delete_memo(memo_id):
+            raise ValueError("Memo 不存在")
+        return {"deleted": True}
+
+    def tag_counts(self) -> List[Dict[str, Any]]:
+        return self.service.tag_counts()
+
+    def batch_create(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [_memo_out(m) for m in self.service.create_memos(items)]
+
+    def batch_update(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [_memo_out(m) for m in self.service.update_memos(items)]
+
+    def batch_delete(self, memo_ids: List[int]) -> Dict[str, Any]:
+        return self.service.delete_memos(memo_ids)
+
+
+def create_server(api_url: Optional[str] = None, in_process: bool = False) -> FastMCP:
     """
     创建并返回 Memo MCP 服务器,注册 CRUD 工具。
 
-    所有工具通过 HTTP 请求调用 API 服务器,而非直接操作数据库。
+    默认所有工具通过 HTTP 请求调用 API 服务器,而非直接操作数据库。
 
     Args:
         api_url: API 服务器地址 (可选,默认使用环境变量或 http://127.0.0.1:48000)
+        in_process: 为 True 时工具在当前进程内直接调用 memo_service,
+            适合作为受信任的原生工具挂载到 McpBox (见 create_local_server)
     """
     # 如果提供了 api_url 参数,则覆盖全局配置
     if api_url:
         global API_BASE_URL
         API_BASE_URL = api_url
 
+    if in_process:
+        backend = _LocalBackend()
+        instructions = "在当前进程内直接操作备忘录数据库"
+    else:
+        backend = _HttpBackend()
+        instructions = f"通过 HTTP API ({API_BASE_URL}) 操作备忘录数据库"
+
     server = FastMCP(
         name="Memo MCP",
-        instructions=f"通过 HTTP API ({API_BASE_URL}) 操作备忘录数据库",
+        instructions=instructions,
     )
 
     # 为了与 mcp_box_server.py 保持一致的命名
@@ -89,24 +197,24 @@ def create_server(api_url: Optional[str] = None) -> FastMCP:
     ) -> Dict[str, Any]:
         """创建一条新的备忘录,并返回完整记录"""
         payload = {"title": title, "content": content, "tags": tags or []}
-        data = _http_request("POST", "/memos", json_data=payload)
-        return data
+        return backend.create(payload)
 
     @mcp.tool(description='根据 id 查询备忘录')
     def memo_get(
         memo_id: Annotated[int, Field(description="备忘录 ID")]
     ) -> Dict[str, Any]:
         """根据 id 查询备忘录,不存在则抛出错误"""
-        data = _http_request("GET", f"/memos/{memo_id}")
-        return data
+        return backend.get(memo_id)
 
-    @mcp.tool(description='按更新时间倒序列出备忘录,支持搜索与分页')
+    @mcp.tool(description='按更新时间倒序列出备忘录,支持搜索与游标分页')
     def memo_list(
         search: Annotated[Optional[str], Field(default=None, description="搜索关键词,可选,搜索标题和内容")] = None,
         limit: Annotated[Optional[int], Field(default=None, description="返回结果数量限制,可选")] = None,
-        offset: Annotated[int, Field(default=0, description="分页偏移量,默认为 0")] = 0
-    ) -> List[Dict[str, Any]]:
-        """按更新时间倒序列出备忘录,支持搜索与分页"""
+        offset: Annotated[int, Field(default=0, description="分页偏移量,默认为 0,建议改用 cursor")] = 0,
+        cursor: Annotated[Optional[str], Field(default=None, description="分页游标,传入上一页返回的 next_cursor")] = None,
+        tag: Annotated[Optional[str], Field(default=None, description="只返回带有该标签的备忘录,可选")] = None,
+    ) -> Dict[str, Any]:
+        """按更新时间倒序列出备忘录,返回 {"items": [...], "next_cursor": 下一页游标或 None}"""
         params = {}
         if search:
             params["search"] = search
@@ -114,8 +222,11 @@ def create_server(api_url: Optional[str] = None) -> FastMCP:
             params["limit"] = limit
         if offset:
             params["offset"] = offset
-        data = _http_request("GET", "/memos", params=params)
-        return data
+        if cursor:
+            params["cursor"] = cursor
+        if tag:
+            params["tag"] = tag
+        return backend.list(params)
 
     @mcp.tool(description='更新指定备忘录的字段')
     def memo_update(
@@ -132,15 +243,47 @@ def create_server(api_url: Optional[str] = None) -> FastMCP:
             payload["content"] = content
         if tags is not None:
             payload["tags"] = tags
-        data = _http_request("PUT", f"/memos/{memo_id}", json_data=payload)
-        return data
+        return backend.update(memo_id, payload)
 
     @mcp.tool(description='删除指定 id 的备忘录')
     def memo_delete(
         memo_id: Annotated[int, Field(description="备忘录 ID")]
     ) -> Dict[str, Any]:
         """删除指定 id 的备忘录,返回删除结果"""
-        data = _http_request("DELETE", f"/memos/{memo_id}")
-        return data
+        return backend.delete(memo_id)
+
+    @mcp.tool(description='统计每个标签下的备忘录数量')
+    def memo_tag_counts() -> List[Dict[str, Any]]:
+        """返回 [{"tag": 标签, "count": 数量}, ...],按数量倒序"""
+        return backend.tag_counts()
+
+    @mcp.tool(description='批量创建备忘录,一次请求在同一事务中写入')
+    def memo_batch_create(
+        items: Annotated[List[Dict[str, Any]], Field(description="备忘录列表,每项包含 title、content 和可选的 tags")]
+    ) -> List[Dict[str, Any]]:
+        """批量创建备忘录,全部成功或全部失败,按输入顺序返回创建的记录"""
+        return backend.batch_create(items)
+
+    @mcp.tool(description='批量更新备忘录的字段,一次请求在同一事务中写入')
+    def memo_batch_update(
+        items: Annotated[List[Dict[str, Any]], Field(description="更新列表,每项包含 id 和要更新的 title、content、tags")]
+    ) -> List[Dict[str, Any]]:
+        """批量更新备忘录,任一 id 不存在时全部不更新,按输入顺序返回更新后的记录"""
+        return backend.batch_update(items)
+
+    @mcp.tool(description='按 id 批量删除备忘录')
+    def memo_batch_delete(
+        memo_ids: Annotated[List[int], Field(description="备忘录 ID 列表")]
+    ) -> Dict[str, Any]:
+        """批量删除备忘录,返回 {"deleted": [...], "missing": [...]}"""
+        return backend.batch_delete(memo_ids)
 
     return server
+
+
+def create_local_server() -> FastMCP:
+    """
+    创建进程内版本的 Memo MCP 服务器,供 McpBox 作为受信任的原生工具提供者挂载,
+    例如 MCP_BOX_PROVIDERS=demos.Memo.backend.mcp_server:create_local_server
+    """
+    return create_server(in_process=True)
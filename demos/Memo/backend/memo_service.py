@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import functools
 import json
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from . import db
 
@@ -10,6 +13,21 @@ from . import db
 # Ensure DB schema exists when service loads
 db.init_db()
 
+# Trigram FTS needs at least 3 characters; shorter queries fall back to LIKE
+FTS_MIN_QUERY_LEN = 3
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_TOKENS = 16
+
+_FTS_ENABLED = db.fts_enabled()
+
+# Rows fetched per batch when streaming an export
+EXPORT_BATCH_SIZE = 500
+
+# Upper bound on items per batch call; keeps the id IN (...) lists well under
+# SQLite's host parameter limit
+MAX_BATCH_SIZE = 1000
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -19,24 +37,62 @@ def _row_to_dict(row) -> Dict[str, Any]:
     return {k: row[k] for k in row.keys()}
 
 
+def _normalize_tags(tags: Optional[List[str]]) -> List[str]:
+    """Drop duplicate tags, keeping first-seen order."""
+    return list(dict.fromkeys(str(t) for t in tags or []))
+
+
+def _write_tags(cur, tags_by_memo: Dict[int, List[str]], replace: bool = False) -> None:
+    if replace:
+        cur.executemany("DELETE FROM memo_tags WHERE memo_id = ?", [(memo_id,) for memo_id in tags_by_memo])
+    cur.executemany(
+        "INSERT INTO memo_tags (memo_id, tag, position) VALUES (?, ?, ?)",
+        [
+            (memo_id, tag, position)
+            for memo_id, tags in tags_by_memo.items()
+            for position, tag in enumerate(_normalize_tags(tags))
+        ],
+    )
+
+
+def _attach_tags(cur, memos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace each memo's legacy tags column with its tag list from memo_tags."""
+    if not memos:
+        return memos
+    tags_by_memo: Dict[int, List[str]] = {memo["id"]: [] for memo in memos}
+    ids = list(tags_by_memo)
+    for start in range(0, len(ids), MAX_BATCH_SIZE):
+        chunk = ids[start:start + MAX_BATCH_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"SELECT memo_id, tag FROM memo_tags WHERE memo_id IN ({placeholders}) ORDER BY memo_id, position",
+            tuple(chunk),
+        )
+        for memo_id, tag in cur.fetchall():
+            tags_by_memo[memo_id].append(tag)
+    for memo in memos:
+        memo["tags"] = tags_by_memo[memo["id"]]
+    return memos
+
+
 def create_memo(title: str, content: str, tags: Optional[List[str]] = None) -> Dict[str, Any]:
     if not title or not content:
         raise ValueError("title 和 content 不可为空")
-    tags_json = json.dumps(tags or [])
     created = _now_iso()
     with db.connect() as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO memos (title, content, tags, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO memos (title, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+            RETURNING *
             """,
-            (title, content, tags_json, created, created),
+            (title, content, created, created),
         )
-        memo_id = cur.lastrowid
-        cur.execute("SELECT * FROM memos WHERE id=?", (memo_id,))
-        row = cur.fetchone()
-    return _row_to_dict(row)
+        memo = _row_to_dict(cur.fetchone())
+        _write_tags(cur, {memo["id"]: tags or []})
+        memo["tags"] = _normalize_tags(tags)
+    return memo
 
 
 def get_memo(memo_id: int) -> Optional[Dict[str, Any]]:
@@ -44,17 +100,83 @@ def get_memo(memo_id: int) -> Optional[Dict[str, Any]]:
         cur = conn.cursor()
         cur.execute("SELECT * FROM memos WHERE id=?", (memo_id,))
         row = cur.fetchone()
-        return _row_to_dict(row) if row else None
+        return _attach_tags(cur, [_row_to_dict(row)])[0] if row else None
 
 
-def list_memos(search: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
-    sql = "SELECT * FROM memos"
-    params: List[Any] = []
-    if search:
-        sql += " WHERE title LIKE ? OR content LIKE ?"
-        like = f"%{search}%"
-        params.extend([like, like])
-    sql += " ORDER BY updated_at DESC"
+def _fts_phrase(search: str) -> str:
+    """Quote the search text as a single FTS5 phrase so operators in it are literal."""
+    return '"' + search.replace('"', '""') + '"'
+
+
+def _encode_cursor(key: List[Any]) -> str:
+    raw = json.dumps(key, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, mode: str) -> List[Any]:
+    """Decode an opaque page cursor; ``mode`` must match the ordering it was issued for."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValueError("无效的分页游标")
+    if not isinstance(key, list) or len(key) != 3 or key[0] != mode:
+        raise ValueError("无效的分页游标")
+    return key[1:]
+
+
+TAG_FILTER = "id IN (SELECT memo_id FROM memo_tags WHERE tag = ?)"
+
+
+def _query_memos(
+    search: Optional[str],
+    limit: Optional[int],
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    tag: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Run the list query and return the rows plus the keyset mode they are ordered by.
+
+    Recent listing ("t") is ordered by (updated_at, id) descending and served by
+    idx_memos_updated_at_id; full-text search ("r") is ordered by (bm25 rank, -id).
+    """
+    if search and _FTS_ENABLED and len(search) >= FTS_MIN_QUERY_LEN:
+        mode = "r"
+        sql = f"""
+            SELECT * FROM (
+                SELECT m.*,
+                       snippet(memos_fts, -1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet,
+                       bm25(memos_fts) AS rank
+                FROM memos_fts JOIN memos m ON m.id = memos_fts.rowid
+                WHERE memos_fts MATCH ?{" AND m." + TAG_FILTER if tag else ""}
+            )
+        """
+        params: List[Any] = [_fts_phrase(search)]
+        if tag:
+            params.append(tag)
+        if cursor:
+            sql += " WHERE (rank, -id) > (?, ?)"
+            rank, last_id = _decode_cursor(cursor, mode)
+            params.extend([rank, -last_id])
+        sql += " ORDER BY rank, id DESC"
+    else:
+        mode = "t"
+        sql = "SELECT * FROM memos"
+        params = []
+        where = []
+        if search:
+            where.append("(title LIKE ? OR content LIKE ?)")
+            like = f"%{search}%"
+            params.extend([like, like])
+        if tag:
+            where.append(TAG_FILTER)
+            params.append(tag)
+        if cursor:
+            where.append("(updated_at, id) < (?, ?)")
+            params.extend(_decode_cursor(cursor, mode))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC, id DESC"
     if limit is not None:
         sql += " LIMIT ? OFFSET ?"
         params.extend([limit, offset])
@@ -62,7 +184,51 @@ def list_memos(search: Optional[str] = None, limit: Optional[int] = None, offset
         cur = conn.cursor()
         cur.execute(sql, tuple(params))
         rows = cur.fetchall()
-        return [_row_to_dict(r) for r in rows]
+        return _attach_tags(cur, [_row_to_dict(r) for r in rows]), mode
+
+
+def list_memos(
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    tag: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """List memos by most recent update, or by relevance (bm25) when searching.
+
+    ``tag`` restricts the result to memos carrying that tag (via idx_memo_tags_tag).
+    Full-text matches carry a ``snippet`` with the hit wrapped in <mark> tags.
+    Prefer list_memos_page() for paging; large offsets rescan all earlier rows.
+    """
+    memos, _ = _query_memos(search, limit, offset, tag=tag)
+    for memo in memos:
+        memo.pop("rank", None)
+    return memos
+
+
+def list_memos_page(
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    tag: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Keyset-paginated list_memos(): returns one page and the cursor for the next.
+
+    Each page seeks directly past the previous page's last (updated_at, id) key,
+    so deep pages cost the same as the first and concurrent updates do not
+    shift page boundaries. ``next_cursor`` is None on the last page. Raises
+    ValueError for a malformed cursor.
+    """
+    # Fetch one extra row to learn whether another page exists
+    memos, mode = _query_memos(search, None if limit is None else limit + 1, cursor=cursor, tag=tag)
+    next_cursor = None
+    if limit is not None and len(memos) > limit:
+        memos = memos[:limit]
+        last = memos[-1]
+        key = [last["rank"], last["id"]] if mode == "r" else [last["updated_at"], last["id"]]
+        next_cursor = _encode_cursor([mode, *key])
+    for memo in memos:
+        memo.pop("rank", None)
+    return memos, next_cursor
 
 
 def update_memo(
@@ -71,31 +237,228 @@ def update_memo(
     content: Optional[str] = None,
     tags: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
-    # Fetch current data
-    current = get_memo(memo_id)
-    if not current:
-        raise ValueError(f"Memo {memo_id} 不存在")
-    new_title = title if title is not None else current["title"]
-    new_content = content if content is not None else current["content"]
-    new_tags = json.dumps(tags) if tags is not None else current["tags"]
-    updated = _now_iso()
+    # Only the provided fields are assigned, in a single UPDATE ... RETURNING,
+    # so concurrent updates to other fields are never overwritten with stale values
+    assignments = []
+    params: List[Any] = []
+    if title is not None:
+        assignments.append("title = ?")
+        params.append(title)
+    if content is not None:
+        assignments.append("content = ?")
+        params.append(content)
+    assignments.append("updated_at = ?")
+    params.extend([_now_iso(), memo_id])
     with db.connect() as conn:
         cur = conn.cursor()
         cur.execute(
-            """
-            UPDATE memos
-            SET title = ?, content = ?, tags = ?, updated_at = ?
-            WHERE id = ?
-            """,
-            (new_title, new_content, new_tags, updated, memo_id),
+            f"UPDATE memos SET {', '.join(assignments)} WHERE id = ? RETURNING *",
+            tuple(params),
         )
-        cur.execute("SELECT * FROM memos WHERE id=?", (memo_id,))
         row = cur.fetchone()
-    return _row_to_dict(row)
+        if not row:
+            raise ValueError(f"Memo {memo_id} 不存在")
+        if tags is not None:
+            _write_tags(cur, {memo_id: tags}, replace=True)
+        return _attach_tags(cur, [_row_to_dict(row)])[0]
 
 
 def delete_memo(memo_id: int) -> bool:
     with db.connect() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM memos WHERE id=?", (memo_id,))
-        return cur.rowcount > 0
\ No newline at end of file
+        return cur.rowcount > 0
+
+
+def _check_batch_size(items: List[Any]) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"单次批量操作最多 {MAX_BATCH_SIZE} 条")
+
+
+def _select_by_ids(cur, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    placeholders = ", ".join("?" for _ in ids)
+    cur.execute(f"SELECT * FROM memos WHERE id IN ({placeholders})", tuple(ids))
+    return {row["id"]: _row_to_dict(row) for row in cur.fetchall()}
+
+
+def create_memos(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Create many memos in one transaction; returns them in input order.
+
+    Every item is validated before anything is written, so the batch is
+    all-or-nothing.
+    """
+    _check_batch_size(items)
+    if not items:
+        return []
+    created = _now_iso()
+    rows = []
+    for item in items:
+        if not item.get("title") or not item.get("content"):
+            raise ValueError("title 和 content 不可为空")
+        rows.append((item["title"], item["content"], created, created))
+    memos = []
+    with db.connect() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        # Read each id back from its own INSERT rather than assuming the batch
+        # got a contiguous range
+        for row in rows:
+            cur.execute(
+                """
+                INSERT INTO memos (title, content, created_at, updated_at)
+                VALUES (?, ?, ?, ?)
+                RETURNING *
+                """,
+                row,
+            )
+            memos.append(_row_to_dict(cur.fetchone()))
+        _write_tags(cur, {memo["id"]: item.get("tags") or [] for memo, item in zip(memos, items)})
+    for memo, item in zip(memos, items):
+        memo["tags"] = _normalize_tags(item.get("tags"))
+    return memos
+
+
+def update_memos(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Apply partial updates to many memos in one transaction; returns them in input order.
+
+    Each item carries an ``id`` plus any of title/content/tags. Items that set
+    the same fields share one executemany statement. Raises ValueError (and
+    writes nothing) if any id does not exist.
+    """
+    _check_batch_size(items)
+    if not items:
+        return []
+    updated = _now_iso()
+    groups: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+    tags_by_memo: Dict[int, List[str]] = {}
+    for item in items:
+        fields = tuple(f for f in ("title", "content") if item.get(f) is not None)
+        groups.setdefault(fields, []).append((*(item[f] for f in fields), updated, item["id"]))
+        if item.get("tags") is not None:
+            tags_by_memo[item["id"]] = item["tags"]
+    ids = [item["id"] for item in items]
+    with db.connect() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        missing = sorted(set(ids) - set(_select_by_ids(cur, ids)))
+        if missing:
+            raise ValueError(f"Memo {missing} 不存在")
+        for fields, rows in groups.items():
+            assignments = ", ".join([f"{f} = ?" for f in fields] + ["updated_at = ?"])
+            cur.executemany(f"UPDATE memos SET {assignments} WHERE id = ?", rows)
+        _write_tags(cur, tags_by_memo, replace=True)
+        memos = _select_by_ids(cur, ids)
+        _attach_tags(cur, list(memos.values()))
+    return [memos[memo_id] for memo_id in ids]
+
+
+def delete_memos(memo_ids: List[int]) -> Dict[str, List[int]]:
+    """Delete many memos in one transaction; returns the deleted and missing ids."""
+    _check_batch_size(memo_ids)
+    if not memo_ids:
+        return {"deleted": [], "missing": []}
+    with db.connect() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        existing = _select_by_ids(cur, memo_ids)
+        cur.executemany("DELETE FROM memos WHERE id = ?", [(memo_id,) for memo_id in existing])
+    return {
+        "deleted": [memo_id for memo_id in memo_ids if memo_id in existing],
+        "missing": [memo_id for memo_id in memo_ids if memo_id not in existing],
+    }
+
+
+def tag_counts() -> List[Dict[str, Any]]:
+    """Number of memos per tag, most used first (an index-only scan of idx_memo_tags_tag)."""
+    with db.connect() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT tag, COUNT(*) AS count FROM memo_tags GROUP BY tag ORDER BY count DESC, tag")
+        return [_row_to_dict(r) for r in cur.fetchall()]
+
+
+def iter_memo_batches(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield every memo, ordered by id, in batches of ``batch_size``.
+
+    Reads through a dedicated connection inside one read transaction, so the
+    export is a consistent snapshot even while writes continue, and only one
+    batch is held in memory at a time. Callers may advance the generator from
+    different threads, but never concurrently.
+    """
+    conn = db.open_connection()
+    try:
+        conn.execute("BEGIN")
+        cur = conn.cursor()
+        tags_cur = conn.cursor()
+        cur.execute("SELECT * FROM memos ORDER BY id")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield _attach_tags(tags_cur, [_row_to_dict(r) for r in rows])
+    finally:
+        conn.close()
+
+
+def import_memos(items: List[Dict[str, Any]]) -> int:
+    """Insert or replace one batch of exported memos in a single transaction.
+
+    Items with an ``id`` overwrite the memo with that id (so re-importing an
+    export is idempotent); items without one are created. Missing timestamps
+    default to now. Returns the number of memos written.
+    """
+    _check_batch_size(items)
+    now = _now_iso()
+    for item in items:
+        if not item.get("title") or not item.get("content"):
+            raise ValueError("title 和 content 不可为空")
+    with db.connect() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        tags_by_memo: Dict[int, List[str]] = {}
+        for item in items:
+            created = item.get("created_at") or now
+            cur.execute(
+                """
+                INSERT INTO memos (id, title, content, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    title = excluded.title,
+                    content = excluded.content,
+                    created_at = excluded.created_at,
+                    updated_at = excluded.updated_at
+                RETURNING id
+                """,
+                (item.get("id"), item["title"], item["content"], created, item.get("updated_at") or created),
+            )
+            tags_by_memo[cur.fetchone()[0]] = item.get("tags") or []
+        _write_tags(cur, tags_by_memo, replace=True)
+    return len(items)
+
+
+# Async variants for the API: reads run on the db reader pool, writes are
+# serialized on the db writer thread (see db.run_read / db.run_write)
+def _async_read(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await db.run_read(fn, *args, **kwargs)
+    return wrapper
+
+
+def _async_write(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await db.run_write(fn, *args, **kwargs)
+    return wrapper
+
+
+get_memo_async = _async_read(get_memo)
+list_memos_async = _async_read(list_memos)
+list_memos_page_async = _async_read(list_memos_page)
+tag_counts_async = _async_read(tag_counts)
+create_memo_async = _async_write(create_memo)
+update_memo_async = _async_write(update_memo)
+delete_memo_async = _async_write(delete_memo)
+create_memos_async = _async_write(create_memos)
+update_memos_async = _async_write(update_memos)
+delete_memos_async = _async_write(delete_memos)
+import_memos_async = _async_write(import_memos)
@@ -0,0 +1,99 @@
+"""Benchmark list response serialization: pydantic models vs. the direct JSON fast path.
+
+Usage:
+    python scripts/bench_serialization.py [--rows 10000] [--repeat 5]
+
+Seeds a throwaway SQLite DB with ``--rows`` memos, lists them once through
+memo_service, then times rendering the list response body both ways:
+
+- pydantic: the previous path, one MemoOut per row, re-validated against
+  List[MemoOut] and dumped the way FastAPI serializes a response_model;
+- fast: MemoJSONResponse over the plain row dicts (orjson when installed).
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+TMP_DIR = tempfile.mkdtemp(prefix="memo-bench-")
+os.environ["MEMO_DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from backend import db, memo_service  # noqa: E402
+from backend.api import MemoJSONResponse, MemoOut, _to_out, orjson  # noqa: E402
+
+
+def render_pydantic(memos: List[dict], adapter: TypeAdapter) -> bytes:
+    models = [
+        MemoOut(
+            id=m["id"],
+            title=m["title"],
+            content=m["content"],
+            tags=m["tags"],
+            created_at=m["created_at"],
+            updated_at=m["updated_at"],
+            snippet=m.get("snippet"),
+        )
+        for m in memos
+    ]
+    validated = adapter.validate_python(models, from_attributes=True)
+    return JSONResponse(adapter.dump_python(validated, mode="json", exclude_none=True)).body
+
+
+def render_fast(memos: List[dict]) -> bytes:
+    return MemoJSONResponse([_to_out(m) for m in memos]).body
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memo list serialization benchmark")
+    parser.add_argument("--rows", type=int, default=10000, help="number of memos to list")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per variant, best time is reported")
+    args = parser.parse_args()
+
+    for start in range(0, args.rows, memo_service.MAX_BATCH_SIZE):
+        count = min(memo_service.MAX_BATCH_SIZE, args.rows - start)
+        memo_service.create_memos([
+            {"title": f"备忘录 {start + i}", "content": "基准测试内容 " * 8, "tags": ["工作", f"t{i % 10}"]}
+            for i in range(count)
+        ])
+    memos = memo_service.list_memos()
+    adapter = TypeAdapter(List[MemoOut])
+
+    # Both paths must produce the same document
+    assert orjson is None or orjson.loads(render_fast(memos)) == orjson.loads(render_pydantic(memos, adapter))
+    slow = best_of(args.repeat, render_pydantic, memos, adapter)
+    fast = best_of(args.repeat, render_fast, memos)
+    encoder = "orjson" if orjson is not None else "json"
+    print(f"rows={len(memos)} repeat={args.repeat} encoder={encoder}")
+    print(f"pydantic: {slow * 1000:8.1f} ms")
+    print(f"fast:     {fast * 1000:8.1f} ms  ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        db.shutdown_executors()
+        db.close_connections()
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
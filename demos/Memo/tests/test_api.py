@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 from pathlib import Path
@@ -5,8 +6,9 @@ from pathlib import Path
 # Use a dedicated test DB for API tests
 TEST_DB = Path(__file__).resolve().parent.parent / "backend" / ".test_api.db"
 os.environ["MEMO_DB_PATH"] = str(TEST_DB)
-if TEST_DB.exists():
-    TEST_DB.unlink()
+for path in (TEST_DB, TEST_DB.with_name(TEST_DB.name + "-wal"), TEST_DB.with_name(TEST_DB.name + "-shm")):
+    if path.exists():
+        path.unlink()
 
 # Ensure project root import when running as a module
 ROOT = Path(__file__).resolve().parent.parent
@@ -65,6 +67,51 @@ def run():
     assert len(search) == 1
     print("Search:", search)
 
+    # Cursor pagination
+    r2 = client.post("/memos", json={"title": "第二条", "content": "分页"})
+    r = client.get("/memos", params={"limit": 1})
+    assert r.status_code == 200 and len(r.json()) == 1
+    cursor = r.headers["X-Next-Cursor"]
+    r = client.get("/memos", params={"limit": 1, "cursor": cursor})
+    assert r.status_code == 200 and r.json()[0]["id"] == memo_id and "X-Next-Cursor" not in r.headers
+    assert client.get("/memos", params={"cursor": "bad"}).status_code == 400
+    assert client.get("/memos", params={"offset": 1, "cursor": cursor}).status_code == 400
+    client.delete(f"/memos/{r2.json()['id']}")
+    print("Cursor pagination ok")
+
+    # Batch create / update / delete
+    r = client.post("/memos:batch", json={"items": [{"title": f"批量 {i}", "content": "批量内容"} for i in range(3)]})
+    assert r.status_code == 201, r.text
+    batch_ids = [m["id"] for m in r.json()]
+    assert len(batch_ids) == 3 and [m["title"] for m in r.json()] == ["批量 0", "批量 1", "批量 2"]
+    r = client.post("/memos:batchUpdate", json={"items": [{"id": batch_ids[0], "title": "批量改"}, {"id": batch_ids[2], "tags": ["x"]}]})
+    assert r.status_code == 200 and r.json()[0]["title"] == "批量改" and r.json()[1]["tags"] == ["x"]
+    r = client.post("/memos:batchUpdate", json={"items": [{"id": batch_ids[1], "title": "不应写入"}, {"id": 99999, "title": "x"}]})
+    assert r.status_code == 404
+    assert client.get(f"/memos/{batch_ids[1]}").json()["title"] == "批量 1"
+    r = client.post("/memos:batchDelete", json={"ids": batch_ids + [99999]})
+    assert r.json() == {"deleted": batch_ids, "missing": [99999]}
+    print("Batch ok:", batch_ids)
+
+    # NDJSON export / import round trip
+    r = client.get("/memos:export")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in r.text.splitlines()]
+    assert [m["id"] for m in exported] == sorted(m["id"] for m in exported) and exported
+    client.post("/memos:batchDelete", json={"ids": [m["id"] for m in exported]})
+    r = client.post("/memos:import", content=r.content)
+    assert r.status_code == 200 and r.json() == {"imported": len(exported)}
+    assert [json.loads(line) for line in client.get("/memos:export").text.splitlines()] == exported
+    r = client.post("/memos:import", content=b'{"title": "ok", "content": "ok"}\nnot json\n')
+    assert r.status_code == 400 and "第 2 行" in r.json()["detail"]
+    assert [m["id"] for m in client.get("/memos").json()] == [memo_id]
+    for bad in ('{"title": "x", "content": "y", "tags": "abc"}', '{"id": "x", "title": "x", "content": "y"}'):
+        r = client.post("/memos:import", content=f'{{"title": "ok", "content": "ok"}}\n{bad}\n'.encode())
+        assert r.status_code == 400, r.text
+        assert "第 2 行" in r.json()["detail"] and "已导入 0 条" in r.json()["detail"], r.json()
+    assert [m["id"] for m in client.get("/memos").json()] == [memo_id]
+    print("Export/import ok:", len(exported))
+
     # Delete memo
     r = client.delete(f"/memos/{memo_id}")
     assert r.status_code == 200
@@ -1,5 +1,7 @@
+import gc
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Use a dedicated test DB
@@ -7,8 +9,9 @@ TEST_DB = Path(__file__).resolve().parent.parent / "backend" / ".test_memo.db"
 os.environ["MEMO_DB_PATH"] = str(TEST_DB)
 
 # Clean previous test DB
-if TEST_DB.exists():
-    TEST_DB.unlink()
+for path in (TEST_DB, TEST_DB.with_name(TEST_DB.name + "-wal"), TEST_DB.with_name(TEST_DB.name + "-shm")):
+    if path.exists():
+        path.unlink()
 
 # Ensure project root is importable when running as a script
 ROOT = Path(__file__).resolve().parent.parent
@@ -16,12 +19,27 @@ root_str = str(ROOT)
 if root_str not in sys.path:
     sys.path.insert(0, root_str)
 
-from backend import memo_service  # noqa: E402
+from backend import db, memo_service  # noqa: E402
 
 
 def run():
     print("Running backend smoke tests...\n")
 
+    # Connection reuse and WAL mode
+    conn = db.connect()
+    assert conn is db.connect()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # Connections of exited threads are closed and dropped from the pool
+    pooled = len(db._connections)
+    threads = [threading.Thread(target=lambda: db.connect().execute("SELECT 1")) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+    assert len(db._connections) == pooled
+
     # Create
     m1 = memo_service.create_memo("第一次记录", "今天完成了数据库模块", ["工作", "进度"])
     assert m1["id"] > 0
@@ -40,13 +58,53 @@ def run():
     # Update
     u = memo_service.update_memo(m1["id"], title="更新后的标题")
     assert u["title"] == "更新后的标题"
+    assert u["content"] == "今天完成了数据库模块" and u["tags"] == m1["tags"]
     print("Update memo:", u)
 
     # Search
     search = memo_service.list_memos(search="数据库")
     assert len(search) == 1
+    assert "<mark>数据库</mark>" in search[0]["snippet"]
+    # Short queries fall back to LIKE
+    assert len(memo_service.list_memos(search="进")) == 0
+    assert len(memo_service.list_memos(search="完成")) == 1
     print("Search memos:", search)
 
+    # Tags
+    assert m1["tags"] == ["工作", "进度"]
+    m2 = memo_service.create_memo("带标签", "标签过滤", ["进度", "进度", "生活"])
+    assert m2["tags"] == ["进度", "生活"]
+    assert [m["id"] for m in memo_service.list_memos(tag="工作")] == [m1["id"]]
+    assert memo_service.tag_counts()[0] == {"tag": "进度", "count": 2}
+    assert memo_service.update_memo(m2["id"], tags=["生活"])["tags"] == ["生活"]
+    memo_service.delete_memo(m2["id"])
+    assert {t["tag"] for t in memo_service.tag_counts()} == {"工作", "进度"}
+    print("Tags ok:", memo_service.tag_counts())
+
+    # Keyset pagination
+    extra = [memo_service.create_memo(f"分页记录 {i}", f"分页内容 {i}") for i in range(5)]
+    page, cursor = memo_service.list_memos_page(limit=2)
+    seen = [m["id"] for m in page]
+    while cursor:
+        page, cursor = memo_service.list_memos_page(limit=2, cursor=cursor)
+        seen.extend(m["id"] for m in page)
+    assert seen == [m["id"] for m in memo_service.list_memos()] and len(seen) == 6
+    page, cursor = memo_service.list_memos_page(search="分页内容", limit=3)
+    page2, _ = memo_service.list_memos_page(search="分页内容", limit=3, cursor=cursor)
+    assert len(page) == 3 and len(page2) == 2 and not {m["id"] for m in page} & {m["id"] for m in page2}
+    for m in extra:
+        memo_service.delete_memo(m["id"])
+    print("Keyset pagination ok:", seen)
+
+    # Batch create returns each memo with the id it was stored under, in input order
+    batch = memo_service.create_memos([{"title": f"批量 {i}", "content": f"批量内容 {i}", "tags": [f"批{i}"]}
+                                       for i in range(3)])
+    assert [m["title"] for m in batch] == ["批量 0", "批量 1", "批量 2"]
+    assert [memo_service.get_memo(m["id"]) for m in batch] == batch
+    for m in batch:
+        memo_service.delete_memo(m["id"])
+    print("Batch create ok:", [m["id"] for m in batch])
+
     # Delete
     ok = memo_service.delete_memo(m1["id"])
     assert ok is True
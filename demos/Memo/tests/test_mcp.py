@@ -6,8 +6,9 @@ from pathlib import Path
 # 独立测试数据库文件
 TEST_DB = Path(__file__).resolve().parent.parent / "backend" / ".test_mcp.db"
 os.environ["MEMO_DB_PATH"] = str(TEST_DB)
-if TEST_DB.exists():
-    TEST_DB.unlink()
+for path in (TEST_DB, TEST_DB.with_name(TEST_DB.name + "-wal"), TEST_DB.with_name(TEST_DB.name + "-shm")):
+    if path.exists():
+        path.unlink()
 
 # 可导入项目根
 ROOT = Path(__file__).resolve().parent.parent
@@ -21,13 +22,16 @@ from backend.mcp_server import create_server  # noqa: E402
 def norm(res):
     """归一化 FastMCP 调用可能返回的结果。
     - dict: 直接返回
-    - (unstructured, structured): 返回 structured
+    - (unstructured, structured): 返回 structured,非对象返回值被包装在 {"result": ...} 中时解包
     - [TextContent...]: 尝试解析首个文本块为 JSON
     """
     if isinstance(res, dict):
         return res
     if isinstance(res, tuple) and len(res) == 2:
-        return res[1]
+        structured = res[1]
+        if isinstance(structured, dict) and list(structured) == ["result"]:
+            return structured["result"]
+        return structured
     if isinstance(res, list) and res:
         first = res[0]
         text = getattr(first, "text", None)
@@ -43,23 +47,27 @@ def norm(res):
 async def run_async():
     print("Running MCP tools smoke tests...\n")
 
-    server = create_server()
+    server = create_server(in_process=True)
 
     # 列出工具
     tools = await server.list_tools()
     names = sorted(t.name for t in tools)
     assert names == [
-        "memo.create",
-        "memo.delete",
-        "memo.get",
-        "memo.list",
-        "memo.update",
+        "memo_batch_create",
+        "memo_batch_delete",
+        "memo_batch_update",
+        "memo_create",
+        "memo_delete",
+        "memo_get",
+        "memo_list",
+        "memo_tag_counts",
+        "memo_update",
     ]
     print("Tools:", names)
 
     # 创建
     m1 = norm(await server.call_tool(
-        "memo.create",
+        "memo_create",
         {
             "title": "MCP 首条记录",
             "content": "通过 MCP 工具创建",
@@ -71,30 +79,30 @@ async def run_async():
     print("Create:", m1)
 
     # 查询
-    g = norm(await server.call_tool("memo.get", {"memo_id": memo_id}))
+    g = norm(await server.call_tool("memo_get", {"memo_id": memo_id}))
     assert g["title"] == "MCP 首条记录"
     print("Get:", g)
 
     # 列表
-    lst = norm(await server.call_tool("memo.list", {}))
-    assert isinstance(lst, dict) and "result" in lst and len(lst["result"]) == 1
+    lst = norm(await server.call_tool("memo_list", {}))
+    assert isinstance(lst, dict) and len(lst["items"]) == 1 and lst["next_cursor"] is None
     print("List:", lst)
 
     # 更新
-    u = norm(await server.call_tool("memo.update", {"memo_id": memo_id, "title": "MCP 更新标题"}))
+    u = norm(await server.call_tool("memo_update", {"memo_id": memo_id, "title": "MCP 更新标题"}))
     assert u["title"] == "MCP 更新标题"
     print("Update:", u)
 
     # 搜索
-    search = norm(await server.call_tool("memo.list", {"search": "MCP"}))
-    assert isinstance(search, dict) and "result" in search and len(search["result"]) == 1
+    search = norm(await server.call_tool("memo_list", {"search": "MCP"}))
+    assert isinstance(search, dict) and len(search["items"]) == 1
     print("Search:", search)
 
     # 删除
-    d = norm(await server.call_tool("memo.delete", {"memo_id": memo_id}))
+    d = norm(await server.call_tool("memo_delete", {"memo_id": memo_id}))
     assert d == {"deleted": True}
-    after = norm(await server.call_tool("memo.list", {}))
-    assert isinstance(after, dict) and after.get("result") == []
+    after = norm(await server.call_tool("memo_list", {}))
+    assert isinstance(after, dict) and after.get("items") == []
     print("Delete ok, remaining:", after)
 
     print("\nAll MCP tools smoke tests passed.")
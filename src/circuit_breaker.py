@@ -0,0 +1,103 @@
+"""沙箱后端熔断器
+
+E2B 异常时每次创建沙箱都要等到失败或超时，调用和线程不断堆积。熔断器统计最近一段时间内创建沙箱的结果
+（耗时超过阈值也计为失败），失败率达到阈值后打开：打开期间直接拒绝创建，冷却期过后放行一个探测请求，
+探测成功则恢复，失败则继续保持打开。
+"""
+
+import threading
+import time
+from collections import deque
+
+# 支持两种导入方式
+try:
+    from .utils.logging import verbose_logger
+except ImportError:
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from src.utils.logging import verbose_logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# 半开状态下放行的探测请求的许可，只有带此许可的结果决定熔断器恢复还是重新打开
+PROBE = "probe"
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开期间被拒绝的请求"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str = "sandbox", error_rate: float = 0.5, slow_threshold: float = 30.0,
+                 min_calls: int = 5, window: float = 60.0, cooldown: float = 30.0):
+        self.name = name
+        self.error_rate = error_rate
+        # 耗时超过该秒数的请求计为失败，0 表示不按耗时判断
+        self.slow_threshold = slow_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = CLOSED
+        # (完成时间, 是否失败)
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool | str:
+        """是否放行一个请求，半开状态下同时只放行一个探测请求，返回 PROBE 作为探测许可"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self.state = HALF_OPEN
+                verbose_logger.info(f"CircuitBreaker[{self.name}]: half open, probing")
+            if self._probing:
+                return False
+            self._probing = True
+            return PROBE
+
+    def check(self) -> bool | str:
+        """放行时返回许可，由 record 带回；拒绝时抛出 CircuitOpenError"""
+        permit = self.allow()
+        if not permit:
+            raise CircuitOpenError(f"{self.name} backend unavailable, circuit {self.state}")
+        return permit
+
+    def record(self, success: bool, elapsed: float, permit: bool | str = True):
+        failed = not success or (self.slow_threshold > 0 and elapsed > self.slow_threshold)
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if permit != PROBE:
+                    # 打开前放行、在探测期间才完成的请求不代表后端已恢复，也不结束探测
+                    return
+                self._probing = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    verbose_logger.info(f"CircuitBreaker[{self.name}]: closed")
+                return
+            if self.state == OPEN:
+                # 打开前已经发出的请求，结果不再影响状态
+                return
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, f in self._outcomes if f)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        verbose_logger.error(f"CircuitBreaker[{self.name}]: open for {self.cooldown}s")
@@ -1,10 +1,12 @@
-import re
-from collections.abc import Sequence
-from textwrap import dedent
+import threading
+import time
+import uuid
+from collections.abc import Collection, Sequence
 from typing import Any, List
 
-from e2b_code_interpreter import Sandbox
-from e2b_code_interpreter.models import Result
+import anyio
+from e2b_code_interpreter import TimeoutException
+from e2b_code_interpreter.models import Execution, Result
 from mcp.server.auth.provider import OAuthAuthorizationServerProvider
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.exceptions import ToolError
@@ -15,9 +17,16 @@ from mcp.types import (
     TextContent,
 )
 from mcp.types import Tool as MCPTool
+from pydantic import ValidationError
 
 # 支持两种导入方式
 try:
+    from .circuit_breaker import CircuitOpenError
+    from .host_executor import tool_timeout
+    from .sandbox_pool import SandboxPool, SandboxSession
+    from .sandbox_runtime import build_runtime_code
+    from .scheduler import FairScheduler, request_identity
+    from .tool_source import ToolSource, ToolSpec
     from .utils.logging import verbose_logger
 except ImportError:
     import sys
@@ -25,8 +34,26 @@ except ImportError:
     project_root = Path(__file__).parent.parent
     if str(project_root) not in sys.path:
         sys.path.insert(0, str(project_root))
+    from src.circuit_breaker import CircuitOpenError
+    from src.host_executor import tool_timeout
+    from src.sandbox_pool import SandboxPool, SandboxSession
+    from src.sandbox_runtime import build_runtime_code
+    from src.scheduler import FairScheduler, request_identity
+    from src.tool_source import ToolSource, ToolSpec
     from src.utils.logging import verbose_logger
 
+# 工具模块以独立 module 对象加载到沙箱内核中，同一模块内的多个工具共享辅助函数和导入；
+# 摘要不变时不重复执行模块代码。运行时提供的共享对象（如 http_client）注入到模块命名空间，
+# 代码对象随模块缓存，沙箱归还时重新执行以重置模块状态
+MODULE_LOAD_TEMPLATE = """
+if _mcpbox_modules.get({name!r}, (None,))[0] != {digest!r}:
+    _mcpbox_load({name!r}, {digest!r}, compile({code!r}, {filename!r}, "exec"))
+"""
+
+# 超时或取消后，向内核发送取消 async 调用的请求最多等待的秒数，超过则销毁沙箱
+CANCEL_TIMEOUT = 5.0
+
+
 class FastMCPBox(FastMCP):
     def __init__(
         self,
@@ -37,10 +64,31 @@ class FastMCPBox(FastMCP):
         *,
         tools: list[Tool] | None = None,
         sandbox_config: dict[str, Any] | None = None,
+        pool_config: dict[str, Any] | None = None,
+        http_pool_config: dict[str, Any] | None = None,
+        call_timeout: float | None = None,
+        trusted_modules: Collection[str] = (),
+        scheduler_config: dict[str, Any] | None = None,
         **settings: Any,
     ):
-        self.tool_codes = {}
+        self.tool_codes: dict[str, ToolSource | None] = {}
+        # MCP 工具名 -> 注册名（tool_codes 的键）
+        self._tool_index: dict[str, str] = {}
+        # 受信任的原生工具在当前进程内执行，不经过沙箱
+        self.native_tools: set[str] = set()
         self.e2b_config = sandbox_config
+        # 默认的单次调用超时（秒），工具可通过 annotations={"timeout": 秒} 单独指定，None 表示不限制
+        self.call_timeout = call_timeout
+        # 运维配置的可信工具模块（注册名），沙箱后端熔断时改在当前进程内执行
+        self.trusted_modules = set(trusted_modules)
+        # 注册名 -> 注册该模块的用户，调用方未声明租户时按模块所属用户排队
+        self.tool_owners: dict[str, str] = {}
+        self.scheduler = FairScheduler(**(scheduler_config or {}))
+        self.sandbox_pool = SandboxPool(
+            sandbox_config=sandbox_config,
+            runtime_code=build_runtime_code(http_pool_config),
+            **(pool_config or {}),
+        )
 
         super().__init__(
             name=name,
@@ -51,20 +99,43 @@ class FastMCPBox(FastMCP):
             **settings
         )
 
-    def store_tool_code(self, tool_name:str, raw_code: str):
-        code = self.prepare_sandbox_code(raw_code)
-        self.tool_codes[tool_name] = code
+    def store_tool_code(self, tool_name:str, tool_source: ToolSource, owner: str | None = None):
+        self.tool_codes[tool_name] = tool_source
+        if owner:
+            self.tool_owners[tool_name] = owner
+        for spec in tool_source.tools:
+            self._tool_index[spec.name] = tool_name
 
     def clear_tool_code(self, tool_name:str):
-        self.tool_codes[tool_name] = None
+        tool_source = self.tool_codes.pop(tool_name, None)
+        self.tool_owners.pop(tool_name, None)
+        if tool_source:
+            for spec in tool_source.tools:
+                self._tool_index.pop(spec.name, None)
 
-    def parse_requirements(self, code)-> List[str]:
-        requirements = []
-        requirements_match = re.search(r'<requirements>(.*?)</requirements>', code, re.DOTALL)
-        if requirements_match:
-            raw_requirements = requirements_match.group(1).strip()
-            requirements = [req.strip() for req in raw_requirements.split('\n') if req.strip()]
-        return requirements
+    def add_native_tool(self, tool: Tool):
+        self._tool_manager._tools[tool.name] = tool
+        self.native_tools.add(tool.name)
+
+    def prewarm_tool(self, tool_name: str):
+        """为刚注册的工具模块预热沙箱环境，首次调用不必等待创建沙箱和安装依赖"""
+        tool_source = self.tool_codes.get(tool_name)
+        if tool_source:
+            self.sandbox_pool.prewarm(tool_source.requirements)
+
+    def resolve_tool(self, name: str) -> tuple[str, ToolSource, ToolSpec]:
+        """按 MCP 工具名解析出所属模块名、模块和工具函数，兼容以注册名调用单工具模块"""
+        module_name = self._tool_index.get(name, name)
+        tool_source = self.tool_codes.get(module_name)
+        if tool_source is None:
+            raise ToolError(f"Unknown tool: {name}")
+
+        spec = tool_source.get_tool(name)
+        if spec is None and len(tool_source.tools) == 1:
+            spec = tool_source.tools[0]
+        if spec is None:
+            raise ToolError(f"Unknown tool: {name}")
+        return module_name, tool_source, spec
 
     async def list_tools(self) -> list[MCPTool]:
         """List all available tools."""
@@ -90,40 +161,67 @@ class FastMCPBox(FastMCP):
         input_schema = tool.inputSchema
         if tool.annotations and tool.annotations.model_extra:
             para_schemas = input_schema['properties']
-            para_descs = tool.annotations.model_extra['parameters']
+            para_descs = tool.annotations.model_extra.get('parameters')
             if para_descs and para_schemas:
                 for para_name in para_schemas:
-                    para_ann = para_descs[para_name]
-                    if para_ann and para_ann['description']:
+                    para_ann = para_descs.get(para_name)
+                    if para_ann and para_ann.get('description'):
                         para_desc = para_ann['description']
                         para_schemas[para_name]['description'] = para_desc
 
     async def call_tool(self, name: str, arguments: dict[str, Any]) -> Sequence[Content]:
         """Call a tool by name with arguments."""
         #context = self.get_context()
-        tool_code = self.tool_codes[name]
-        if tool_code is None:
-            raise ToolError(f"Unknown tool: {name}")
+        if name in self.native_tools:
+            return await super().call_tool(name, arguments)
 
-        requirements = self.parse_requirements(tool_code)
-        run_code = self.add_run_code(name, tool_code, arguments)
-        # @todo init local sandbox with param
-        sandbox = None
+        module_name, tool_source, spec = self.resolve_tool(name)
+
+        tool = self._tool_manager.get_tool(spec.name)
+        arguments = self.validate_arguments(tool, arguments)
+        requirements = tool_source.requirements
+        timeout = tool_timeout(tool, self.call_timeout)
+        # async 工具提交到内核事件循环，按调用 id 收集结果
+        call_id = uuid.uuid4().hex if spec.is_async else None
+        run_code = self.add_run_code(module_name, tool_source, spec.func_name, arguments, call_id)
+        # 同时执行的沙箱调用数有限时按租户和优先级排队，参数不合法的调用不会进入队列
+        tenant, priority = self.call_identity(module_name)
+        session = None
+        reusable = False
+        exec_time = None
         try:
-            #sandbox = Sandbox()
-            sandbox = Sandbox(**self.e2b_config)
-            for requirement in requirements:
-                pip_cmd = f"pip install --quiet {requirement}"
-                verbose_logger.info(f"call_tool sandbox.commands.run: command=:  {pip_cmd}")
-                sandbox.commands.run(pip_cmd)
-
-            execution = sandbox.run_code(run_code)
+            # 排队、获取沙箱和执行共用一个截止时间，排队过久或创建沙箱过慢的调用同样按时返回
+            with anyio.fail_after(timeout) as deadline:
+                async with self.scheduler.slot(tenant, priority):
+                    try:
+                        session = await self._acquire_session(requirements, spec.is_async, tenant)
+                        start = time.monotonic()
+                        remaining = None if timeout is None else deadline.deadline - anyio.current_time()
+                        if remaining is not None and remaining <= 0:
+                            # e2b 把 0 当作不限制执行时间；截止时间已过时不再执行，沙箱未被使用可以复用
+                            reusable = True
+                            raise TimeoutError
+                        # 超时或客户端取消请求时不再等待工作线程，由 finally 回收沙箱，阻塞中的 run_code 随之结束
+                        execution = await anyio.to_thread.run_sync(self._run_in_session, session, run_code, call_id,
+                                                                   remaining, abandon_on_cancel=True)
+                        exec_time = time.monotonic() - start
+                        reusable = True
+                    finally:
+                        if session:
+                            if not reusable and call_id:
+                                reusable = await self._cancel_async_call(session, call_id)
+                            self.sandbox_pool.release(session, reusable, exec_time)
+        except CircuitOpenError as e:
+            if module_name not in self.trusted_modules:
+                raise ToolError(f"Error executing tool {name} in sandbox : {e}")
+            verbose_logger.error(f"call_tool: {e}, run trusted tool={spec.name} on host")
+            return await super().call_tool(spec.name, arguments)
+        except (TimeoutError, TimeoutException):
+            verbose_logger.error(f"call_tool: tool={name} timed out after {timeout}s")
+            raise ToolError(f"Tool {name} timed out after {timeout}s")
         except Exception as e:
             verbose_logger.error(f"call_tool: run in sandbox unexpect error: {e}")
             raise ToolError(f"Error executing tool {name} in sandbox : {e}")
-        finally:
-            if sandbox:
-                sandbox.kill()
 
         if execution.error:
             verbose_logger.error(f"call_tool: run in sandbox error, error.name={execution.error.name}, error.value={execution.error.value}, error.traceback=\n{execution.error.traceback}")
@@ -132,21 +230,100 @@ class FastMCPBox(FastMCP):
         converted_result = self._convert_to_content(execution.results)
         return converted_result
 
-    def prepare_sandbox_code(self, raw_code:str) -> str:
-        code = re.sub(r'@mcp\.tool\(.*?\)\s+def', 'def', raw_code, flags=re.DOTALL)
-        code = dedent(code)
-        # print("===  prepare_sandbox_code  ===")
-        # print(code)
-        # print("===  end  ===")
-        return code
+    def call_identity(self, module_name: str) -> tuple[str | None, int]:
+        """当前调用的租户和优先级
+
+        租户优先取认证用户；请求头 X-MCP-Tenant 或 _meta 中声明的 tenant 只接受 TENANT_WEIGHTS 中配置的租户，
+        否则为工具模块的所属用户，调用方不能冒用其他租户排队。优先级取请求头 X-MCP-Priority 或 _meta 中的
+        priority，数值越大越先执行，默认 0，由调度器限制在配置的范围内
+        """
+        try:
+            request_context = self._mcp_server.request_context
+        except LookupError:
+            request_context = None
+        user, tenant, priority = request_identity(request_context)
+        if user:
+            return user, priority
+        if tenant not in self.scheduler.weights:
+            tenant = self.tool_owners.get(module_name)
+        return tenant, priority
+
+    def validate_arguments(self, tool: Tool | None, arguments: dict[str, Any]) -> dict[str, Any]:
+        """获取沙箱前按工具的参数模型校验参数，不合法的调用不占用沙箱即可返回错误
+
+        参数模型在注册工具时由 FuncMetadata 构建，校验器随模型编译一次、各次调用复用。
+        返回转换后参数的 JSON 形式（只含调用方传入的参数）：数值、布尔等 JSON 类型与本地模式一致，
+        datetime、UUID、Decimal 等在沙箱中得到字符串，pydantic 模型参数得到 dict，需要时由工具自行还原
+        """
+        if tool is None:
+            return arguments
+        fn_metadata = tool.fn_metadata
+        try:
+            parsed = fn_metadata.arg_model.model_validate(fn_metadata.pre_parse_json(arguments))
+        except ValidationError as e:
+            raise ToolError(f"Invalid arguments for tool {tool.name}: {e}")
+        return parsed.model_dump(mode="json", by_alias=True, exclude_unset=True)
 
-    def add_run_code(self, tool_name:str, code:str, arguments:dict[str, Any]) -> str:
+    def add_module_code(self, module_name: str, tool_source: ToolSource) -> str:
+        return MODULE_LOAD_TEMPLATE.format(
+            name=module_name,
+            digest=tool_source.digest,
+            code=tool_source.sandbox_code,
+            filename=f"<mcp_tool:{module_name}>",
+        )
+
+    def add_run_code(self, module_name: str, tool_source: ToolSource, func_name: str,
+                     arguments: dict[str, Any], call_id: str | None = None) -> str:
         params_str = ', '.join(f"{k}={repr(v)}" for k, v in arguments.items())
-        tool_exec = f"{tool_name}({params_str})"
-        verbose_logger.info(f"prepare_sandbox_run: run_sandbox_tool={tool_exec}")
-        code = code + f"\n{tool_exec}"
-        code = dedent(code)
-        return code
+        tool_exec = f"_mcpbox_modules[{module_name!r}][1].{func_name}({params_str})"
+        verbose_logger.info(f"prepare_sandbox_run: run_sandbox_tool={module_name}.{func_name}({params_str})")
+        if call_id:
+            tool_exec = f"_mcpbox_submit({call_id!r}, {tool_exec})"
+        return self.add_module_code(module_name, tool_source) + f"\n{tool_exec}"
+
+    async def _acquire_session(self, requirements: List[str], shared: bool, tenant: str | None) -> SandboxSession:
+        """在工作线程中获取沙箱（可能需要创建沙箱并安装依赖）
+
+        超时或取消时不再等待工作线程，工作线程稍后拿到的沙箱直接归还沙箱池，不会泄漏
+        """
+        lock = threading.Lock()
+        state: dict[str, Any] = {"abandoned": False, "session": None}
+
+        def acquire() -> SandboxSession:
+            session = self.sandbox_pool.acquire(requirements, shared, tenant)
+            with lock:
+                abandoned = state["abandoned"]
+                if not abandoned:
+                    state["session"] = session
+            if abandoned:
+                self.sandbox_pool.release(session)
+            return session
+
+        try:
+            return await anyio.to_thread.run_sync(acquire, abandon_on_cancel=True)
+        except BaseException:
+            # 工作线程已拿到沙箱、结果还没送回时被取消，由这里归还
+            with lock:
+                state["abandoned"] = True
+                session = state["session"]
+            if session:
+                self.sandbox_pool.release(session)
+            raise
+
+    def _run_in_session(self, session: SandboxSession, run_code: str, call_id: str | None,
+                        timeout: float | None = None) -> Execution:
+        if call_id:
+            return session.run_async_call(call_id, run_code)
+        return session.run_code(run_code, timeout)
+
+    async def _cancel_async_call(self, session: SandboxSession, call_id: str) -> bool:
+        """超时或取消的 async 调用只取消内核中的协程，共享沙箱继续服务其他调用；取消失败时沙箱不再复用
+
+        同步调用独占的沙箱直接销毁，内核中仍在执行的代码随沙箱一起结束
+        """
+        with anyio.move_on_after(CANCEL_TIMEOUT, shield=True):
+            return await anyio.to_thread.run_sync(session.cancel_async_call, call_id, abandon_on_cancel=True)
+        return False
 
     def _convert_to_content(self, e2b_results: List[Result]) -> Sequence[Content]:
         """Convert a result to a sequence of content objects."""
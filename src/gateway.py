@@ -0,0 +1,391 @@
+"""MCP Box 网关
+
+对外提供一个 MCP 端点，后面挂多个 McpBox：
+
+- list_tools 汇总所有 McpBox 的工具
+- 工具模块按注册名一致性哈希到某个 McpBox，call_tool 路由到持有该工具的 McpBox，
+  同一模块的调用始终落在同一个 McpBox，预热沙箱集中而不是分散在每个 McpBox 中
+- McpBox 加入或离开（含断线）时重新计算归属，只迁移归属发生变化的模块
+"""
+
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import json
+import os
+from collections.abc import Sequence
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+import anyio
+import click
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
+from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.types import Content, TextContent
+from mcp.types import Tool as MCPTool
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount
+from starlette.types import Receive, Scope, Send
+
+# 支持两种导入方式
+try:
+    from .scheduler import request_identity
+    from .utils.logging import verbose_logger
+except ImportError:
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from src.scheduler import request_identity
+    from src.utils.logging import verbose_logger
+
+PING_INTERVAL = 15
+PING_TIMEOUT = 10
+MAX_RECONNECT_DELAY = 30
+
+
+class HashRing:
+    """一致性哈希环，每个节点对应 replicas 个虚拟节点；增减节点时只有相邻区间的键改变归属"""
+
+    def __init__(self, nodes: Sequence[str] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._keys: list[int] = []
+        self._nodes: dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            if h not in self._nodes:
+                bisect.insort(self._keys, h)
+            self._nodes[h] = node
+
+    def remove(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            if self._nodes.get(h) == node:
+                del self._nodes[h]
+                self._keys.remove(h)
+
+    def get(self, key: str) -> str | None:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[i]]
+
+    @property
+    def nodes(self) -> set[str]:
+        return set(self._nodes.values())
+
+
+async def _wait(event: asyncio.Event, timeout: float) -> bool:
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(event.wait(), timeout)
+    return event.is_set()
+
+
+class Backend:
+    """到一个 McpBox 的常驻 MCP 会话，定期 ping 探活，断线后按指数退避重连"""
+
+    def __init__(self, url: str, on_change: Callable[["Backend", bool], Awaitable[None]]):
+        self.url = url
+        parts = urlsplit(url)
+        # McpBox 的管理接口与 MCP 传输在同一端口
+        self.manager_url = f"{parts.scheme}://{parts.netloc}"
+        self.session: ClientSession | None = None
+        self.on_change = on_change
+        self._stop = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            await self._task
+
+    async def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                async with sse_client(self.url) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        self.session = session
+                        delay = 1
+                        verbose_logger.info(f"Gateway: backend {self.url} connected")
+                        await self.on_change(self, True)
+                        while not await _wait(self._stop, PING_INTERVAL):
+                            with anyio.fail_after(PING_TIMEOUT):
+                                await session.send_ping()
+            except Exception as e:
+                verbose_logger.error(f"Gateway: backend {self.url} disconnected: {e}")
+            finally:
+                if self.session is not None:
+                    self.session = None
+                    await self.on_change(self, False)
+            if await _wait(self._stop, delay):
+                break
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+class McpGateway(FastMCP):
+    def __init__(self, name: str | None = None, backends: Sequence[str] = (), replicas: int = 100, **settings: Any):
+        super().__init__(name=name, **settings)
+        self.ring = HashRing(replicas=replicas)
+        self.backends: dict[str, Backend] = {}
+        self._initial_backends = list(backends)
+        # 工具名 -> McpBox url
+        self.tool_index: dict[str, str] = {}
+        # 注册名 -> {"code", "tools", "locations"}，缓存源码以便 McpBox 离开后迁移其上的模块
+        self.modules: dict[str, dict[str, Any]] = {}
+        self._rebalance_lock = asyncio.Lock()
+        self.http_client = httpx.AsyncClient(timeout=30)
+
+    def connected(self) -> list[Backend]:
+        return [backend for backend in self.backends.values() if backend.session is not None]
+
+    def add_backend(self, url: str):
+        if url not in self.backends:
+            self.backends[url] = Backend(url, self._on_backend_change)
+            self.backends[url].start()
+
+    async def remove_backend(self, url: str):
+        """McpBox 离开：先移出哈希环并把模块迁出（此时仍可从它上面移除），再断开会话"""
+        backend = self.backends.get(url)
+        if backend is None:
+            return
+        self.ring.remove(url)
+        await self.rebalance()
+        del self.backends[url]
+        await backend.stop()
+
+    async def _on_backend_change(self, backend: Backend, connected: bool):
+        if connected:
+            self.ring.add(backend.url)
+        else:
+            self.ring.remove(backend.url)
+        # 在独立任务中迁移，不阻塞会话任务
+        asyncio.create_task(self.rebalance())
+
+    async def _manager_request(self, url: str, method: str, path: str, mcp_tool_name: str | None = None,
+                               code: str | None = None, params: Any = None) -> Any:
+        """调用 McpBox 的管理接口，给出 params 时按原样作为查询参数（其中应包含 mcp_tool_name）"""
+        if params is None:
+            params = {"mcp_tool_name": mcp_tool_name} if mcp_tool_name else None
+        response = await self.http_client.request(
+            method, f"{self.backends[url].manager_url}{path}", params=params,
+            content=code.encode('utf-8') if code is not None else None,
+        )
+        return response.json()
+
+    async def refresh_modules(self):
+        """从在线的 McpBox 读取各模块的源码和所在位置，离线 McpBox 上的模块保留缓存的源码"""
+        locations: dict[str, set[str]] = {}
+        for backend in self.connected():
+            try:
+                modules = await self._manager_request(backend.url, "GET", "/list_mcp_tool/")
+            except Exception as e:
+                verbose_logger.error(f"Gateway: list modules from {backend.url} fail: {e}")
+                continue
+            for module in modules:
+                self.modules[module['mcp_tool_name']] = {"code": module['mcp_tool_code'], "tools": module['tools'],
+                                                         "shared": module.get('shared', False),
+                                                         "user_id": module.get('user_id')}
+                locations.setdefault(module['mcp_tool_name'], set()).add(backend.url)
+        for mcp_tool_name, module in self.modules.items():
+            module["locations"] = locations.get(mcp_tool_name, set())
+
+    async def refresh_tools(self) -> list[MCPTool]:
+        backends = self.connected()
+        results = await asyncio.gather(*(backend.session.list_tools() for backend in backends),
+                                       return_exceptions=True)
+        # 迁移过程中同一工具可能短暂存在于两个 McpBox，优先路由到其模块的归属 McpBox
+        owners = {tool: self.ring.get(mcp_tool_name)
+                  for mcp_tool_name, module in self.modules.items() for tool in module["tools"]}
+        tools: dict[str, MCPTool] = {}
+        index: dict[str, str] = {}
+        for backend, result in zip(backends, results):
+            if isinstance(result, BaseException):
+                verbose_logger.error(f"Gateway: list tools from {backend.url} fail: {result}")
+                continue
+            for tool in result.tools:
+                tools.setdefault(tool.name, tool)
+                if tool.name not in index or owners.get(tool.name) == backend.url:
+                    index[tool.name] = backend.url
+        self.tool_index = index
+        return list(tools.values())
+
+    async def rebalance(self):
+        """让每个模块只存在于按注册名哈希得到的 McpBox：先在归属 McpBox 注册，确认注册成功后再从其他 McpBox 移除
+
+        保存在共用数据库中的模块每个 McpBox 都会加载，移除会删除库中唯一的记录，这类模块不迁移，只按归属路由
+        """
+        async with self._rebalance_lock:
+            await self.refresh_modules()
+            moved = []
+            for mcp_tool_name, module in self.modules.items():
+                owner = self.ring.get(mcp_tool_name)
+                if owner is None or module["locations"] == {owner} or module.get("shared"):
+                    continue
+                try:
+                    if owner not in module["locations"]:
+                        params = {"mcp_tool_name": mcp_tool_name}
+                        if module.get("user_id") is not None:
+                            params["user_id"] = module["user_id"]
+                        result = await self._manager_request(owner, "POST", "/add_mcp_tool/", mcp_tool_name,
+                                                             module["code"], params=params)
+                        if result.get('result') != 0 and not await self._holds(owner, mcp_tool_name, module["code"]):
+                            verbose_logger.error(f"Gateway: move {mcp_tool_name} to {owner} fail: {result.get('error')}")
+                            continue
+                    for url in module["locations"] - {owner}:
+                        await self._manager_request(url, "POST", "/remove_mcp_tool/", mcp_tool_name)
+                except Exception as e:
+                    verbose_logger.error(f"Gateway: move {mcp_tool_name} to {owner} fail: {e}")
+                    continue
+                module["locations"] = {owner}
+                moved.append(mcp_tool_name)
+            if moved:
+                verbose_logger.info(f"Gateway: rebalanced modules {moved}")
+            await self.refresh_tools()
+
+    async def _holds(self, url: str, mcp_tool_name: str, code: str) -> bool:
+        """McpBox 上是否已注册了源码相同的模块"""
+        modules = await self._manager_request(url, "GET", "/list_mcp_tool/")
+        return any(module['mcp_tool_name'] == mcp_tool_name and module['mcp_tool_code'] == code for module in modules)
+
+    async def list_tools(self) -> list[MCPTool]:
+        """List all available tools."""
+        return await self.refresh_tools()
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> Sequence[Content] | tuple:
+        """Call a tool by name with arguments."""
+        if name not in self.tool_index:
+            await self.refresh_tools()
+        url = self.tool_index.get(name)
+        if url is None:
+            raise ToolError(f"Unknown tool: {name}")
+        backend = self.backends.get(url)
+        if backend is None or backend.session is None:
+            raise ToolError(f"No available McpBox for tool: {name}")
+
+        # 到 McpBox 的会话由所有客户端共用，客户端的租户和优先级放在 _meta 中逐次转发，由 McpBox 校验
+        try:
+            request_context = self._mcp_server.request_context
+        except LookupError:
+            request_context = None
+        user, tenant, priority = request_identity(request_context)
+        meta = {key: value for key, value in (("tenant", user or tenant), ("priority", priority)) if value}
+        result = await backend.session.call_tool(name, arguments, meta=meta or None)
+        if result.isError:
+            message = "".join(c.text for c in result.content if isinstance(c, TextContent))
+            raise ToolError(message or f"Error executing tool {name}")
+        if result.structuredContent is not None:
+            return result.content, result.structuredContent
+        return result.content
+
+    async def handle_add_mcp_tool(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """按注册名哈希选出 McpBox 并转发注册请求"""
+        request = Request(scope, receive)
+        mcp_tool_name = request.query_params.get("mcp_tool_name")
+        code = (await request.body()).decode('utf-8')
+        owner = self.ring.get(mcp_tool_name or "")
+        if owner is None:
+            result = {'result': 3, 'error': "handle_add_mcp_tool: no available McpBox !"}
+        else:
+            # user_id 等查询参数原样转发，McpBox 按 user_id 记录模块所属用户
+            result = await self._manager_request(owner, "POST", "/add_mcp_tool/", mcp_tool_name, code,
+                                                 params=request.query_params.multi_items())
+            if result.get('result') == 0:
+                self.modules[mcp_tool_name] = {"code": code, "tools": result.get('tools', []), "locations": {owner},
+                                               "user_id": request.query_params.get("user_id")}
+                await self.refresh_tools()
+                # 客户端连接网关而不是 McpBox
+                result['mcp_box_url'] = f"http://{self.settings.host}:{self.settings.port}/sse"
+        response = Response(content=json.dumps(result), status_code=200, media_type="application/json")
+        await response(scope, receive, send)
+
+    async def handle_remove_mcp_tool(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = Request(scope, receive)
+        mcp_tool_name = request.query_params.get("mcp_tool_name")
+        if mcp_tool_name not in self.modules:
+            await self.refresh_modules()
+        module = self.modules.get(mcp_tool_name)
+        locations = [url for url in module["locations"] if url in self.backends] if module else []
+        if not locations:
+            result = {'result': 1, 'error': f"handle_remove_mcp_tool: mcp_tool_name={mcp_tool_name}, not exists !"}
+        else:
+            for url in locations:
+                result = await self._manager_request(url, "POST", "/remove_mcp_tool/", mcp_tool_name)
+            self.modules.pop(mcp_tool_name, None)
+            await self.refresh_tools()
+        response = Response(content=json.dumps(result), status_code=200, media_type="application/json")
+        await response(scope, receive, send)
+
+    async def handle_backends(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """GET 查看 McpBox 列表，POST ?url= 加入，DELETE ?url= 离开"""
+        request = Request(scope, receive)
+        url = request.query_params.get("url")
+        if request.method == "POST" and url:
+            self.add_backend(url)
+        elif request.method == "DELETE" and url:
+            await self.remove_backend(url)
+        result = [{'url': backend.url, 'connected': backend.session is not None, 'in_ring': backend.url in self.ring.nodes,
+                   'modules': sorted(n for n, m in self.modules.items() if backend.url in m["locations"])}
+                  for backend in self.backends.values()]
+        response = Response(content=json.dumps(result), status_code=200, media_type="application/json")
+        await response(scope, receive, send)
+
+    def create_app(self) -> Starlette:
+        @contextlib.asynccontextmanager
+        async def lifespan(app: Starlette):
+            for url in self._initial_backends:
+                self.add_backend(url)
+            try:
+                yield
+            finally:
+                await asyncio.gather(*(backend.stop() for backend in self.backends.values()))
+                await self.http_client.aclose()
+
+        return Starlette(
+            routes=[
+                Mount("/add_mcp_tool/", app=self.handle_add_mcp_tool),
+                Mount("/remove_mcp_tool/", app=self.handle_remove_mcp_tool),
+                Mount("/backends/", app=self.handle_backends),
+                Mount("/", app=self.sse_app()),
+            ],
+            lifespan=lifespan,
+        )
+
+
+@click.command()
+@click.option("--host", default="localhost", help="Host to listen on for SSE")
+@click.option("--port", default=47080, help="Port to listen on for SSE")
+@click.option("--backends", default=None, help="Comma separated McpBox SSE urls, e.g. http://box1:47070/sse")
+@click.option("--replicas", default=100, help="Virtual nodes per McpBox on the hash ring")
+def main(host: str, port: int, backends: str | None, replicas: int):
+    load_dotenv()
+    backends = backends or os.getenv("MCP_GATEWAY_BACKENDS", "")
+    gateway = McpGateway(name="MCP Box Gateway", backends=[url.strip() for url in backends.split(",") if url.strip()],
+                         replicas=replicas, host=host, port=port)
+    verbose_logger.info(f"Start MCP Box Gateway host={host}, port={port}, backends={gateway._initial_backends}")
+    uvicorn.run(gateway.create_app(), host=host, port=port)
+
+
+if __name__ == "__main__":
+    main()
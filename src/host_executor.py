@@ -0,0 +1,137 @@
+"""本地工具执行器
+
+不经过沙箱、直接在 McpBox 进程内运行的工具（本地模式的动态工具、挂载的原生工具）中，
+同步函数若直接在 MCP 服务的事件循环上执行，一个慢工具就会阻塞所有会话。
+这里把同步工具派发到有界线程池；CPU 密集的动态工具可声明
+``annotations={"executor": "process"}`` 改用进程池，绕开 GIL。
+
+工具可声明 ``annotations={"timeout": 秒}`` 覆盖默认调用超时。超时后调用方立即得到错误，
+但线程无法被强制中断，已在执行的同步函数会在后台运行到结束。
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import types
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.server.fastmcp.tools import Tool
+
+# 支持两种导入方式
+try:
+    from .sandbox_runtime import create_http_clients
+    from .tool_source import ToolSource, ToolSpec
+    from .utils.logging import verbose_logger
+except ImportError:
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from src.sandbox_runtime import create_http_clients
+    from src.tool_source import ToolSource, ToolSpec
+    from src.utils.logging import verbose_logger
+
+PROCESS_EXECUTOR = "process"
+
+# 进程池工作进程内加载的工具模块：模块名 -> (摘要, module)
+_process_modules: dict[str, tuple[str, types.ModuleType]] = {}
+_process_injected: dict[str, Any] | None = None
+
+
+def _run_in_process(module_name: str, digest: str, code: str, func_name: str,
+                    http_pool_config: dict[str, Any] | None, kwargs: dict[str, Any]) -> Any:
+    """在工作进程中执行工具函数，摘要不变时不重复执行模块代码"""
+    global _process_injected
+    cached = _process_modules.get(module_name)
+    if cached is None or cached[0] != digest:
+        if _process_injected is None:
+            _process_injected = create_http_clients(http_pool_config)
+        module = types.ModuleType(module_name)
+        module.__dict__.update(_process_injected)
+        exec(compile(code, f"<mcp_tool:{module_name}>", "exec"), module.__dict__)
+        cached = _process_modules[module_name] = (digest, module)
+    return getattr(cached[1], func_name)(**kwargs)
+
+
+def wants_process(spec: ToolSpec) -> bool:
+    annotations = spec.decorator_kwargs.get("annotations")
+    return isinstance(annotations, dict) and annotations.get("executor") == PROCESS_EXECUTOR
+
+
+def tool_timeout(tool: Tool | None, default: float | None = None) -> float | None:
+    """工具的调用超时（秒）：annotations 中的 timeout 优先，否则取默认值，None 或 0 表示不限制"""
+    extra = tool.annotations.model_extra if tool is not None and tool.annotations else None
+    timeout = (extra or {}).get("timeout", default)
+    return float(timeout) if timeout else None
+
+
+class HostExecutor:
+    def __init__(self, max_workers: int = 8, process_workers: int = 0,
+                 http_pool_config: dict[str, Any] | None = None, call_timeout: float | None = None):
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcpbox-tool")
+        # spawn 启动的工作进程不继承 MCP 服务的线程和连接
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=process_workers, mp_context=multiprocessing.get_context("spawn"),
+        ) if process_workers > 0 else None
+        self.http_pool_config = http_pool_config
+        self.call_timeout = call_timeout
+
+    def offload(self, tool: Tool, module_name: str | None = None, tool_source: ToolSource | None = None,
+                spec: ToolSpec | None = None):
+        """把同步工具改为在线程池（声明了进程执行的动态工具在进程池）中执行，async 工具仍在事件循环上运行
+
+        参数校验和结果转换仍由 Tool.run 完成，这里只替换被调用的函数，并加上调用超时
+        """
+        timeout = tool_timeout(tool, self.call_timeout)
+        if tool.is_async:
+            if timeout:
+                self._limit_time(tool, timeout)
+            return
+        if spec is not None and wants_process(spec):
+            if self.process_pool is None or tool.context_kwarg is not None:
+                verbose_logger.error(f"HostExecutor: tool={tool.name} asks for process executor, "
+                                     f"process pool disabled or tool takes context, fallback to thread pool")
+            else:
+                call = functools.partial(_run_in_process, module_name, tool_source.digest,
+                                         tool_source.sandbox_code, spec.func_name, self.http_pool_config)
+                self._replace_fn(tool, self.process_pool, lambda **kwargs: functools.partial(call, kwargs))
+                self._limit_time(tool, timeout)
+                return
+        fn = tool.fn
+        self._replace_fn(tool, self.thread_pool, lambda **kwargs: functools.partial(fn, **kwargs))
+        self._limit_time(tool, timeout)
+
+    @staticmethod
+    def _replace_fn(tool: Tool, executor: Executor, bind):
+        fn = tool.fn
+
+        @functools.wraps(fn)
+        async def run_in_executor(**kwargs):
+            return await asyncio.get_running_loop().run_in_executor(executor, bind(**kwargs))
+
+        tool.fn = run_in_executor
+        tool.is_async = True
+
+    @staticmethod
+    def _limit_time(tool: Tool, timeout: float | None):
+        if not timeout:
+            return
+        fn = tool.fn
+
+        @functools.wraps(fn)
+        async def run_with_timeout(**kwargs):
+            try:
+                return await asyncio.wait_for(fn(**kwargs), timeout)
+            except asyncio.TimeoutError:
+                verbose_logger.error(f"HostExecutor: tool={tool.name} timed out after {timeout}s")
+                raise ToolError(f"Tool {tool.name} timed out after {timeout}s")
+
+        tool.fn = run_with_timeout
+
+    def shutdown(self, wait: bool = True):
+        self.thread_pool.shutdown(wait=wait)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=wait)
@@ -1,15 +1,19 @@
+import asyncio
+import contextlib
+import fcntl
+import importlib
 import json
 import os
-import re
+import socket
 import threading
+from textwrap import dedent
 import psycopg2
 from psycopg2.extras import DictCursor
 
+import anyio
 import click
 import uvicorn
 
-from textwrap import dedent
-
 from dotenv import load_dotenv
 from starlette.applications import Starlette
 from starlette.requests import Request
@@ -21,6 +25,11 @@ from mcp.server.fastmcp import FastMCP
 # 支持两种导入方式：作为模块导入和直接运行
 try:
     from .fast_mcp_sandbox import FastMCPBox
+    from .host_executor import HostExecutor
+    from .workers import serve_workers
+    from .sandbox_runtime import create_http_clients
+    from .scheduler import parse_weights
+    from .tool_source import ToolSource, ToolSourceError, parse_tool_source, unescape_tool_source
     from .utils.logging import verbose_logger
 except ImportError:
     # 直接运行时的处理
@@ -31,24 +40,51 @@ except ImportError:
     if str(project_root) not in sys.path:
         sys.path.insert(0, str(project_root))
     from src.fast_mcp_sandbox import FastMCPBox
+    from src.host_executor import HostExecutor
+    from src.workers import serve_workers
+    from src.sandbox_runtime import create_http_clients
+    from src.scheduler import parse_weights
+    from src.tool_source import ToolSource, ToolSourceError, parse_tool_source, unescape_tool_source
     from src.utils.logging import verbose_logger
 
+REGISTRY_FILE = "./config/mcp-tool.json"
+
 
 class McpBox():
     def __init__(self, name: str, host: str, port: int, transport: str = 'sse', sandbox_config: dict = None,
-                 store_in_file: bool = False):
+                 store_in_file: bool = False, pool_config: dict = None, http_pool_config: dict = None,
+                 executor_config: dict = None, registry_sync_interval: float = 0, call_timeout: float = None,
+                 trusted_modules: list[str] = None, scheduler_config: dict = None):
         if sandbox_config is None:
             verbose_logger.info(f"McpBox[{name}] run in host mode, host={host}, port={port}, transport={transport}")
             self.mcp = FastMCP(name=name)
             self.call_in_sandbox = False
         else:
             verbose_logger.info(f"McpBox[{name}]  run in sandbox mode, host={host}, port={port}, transport={transport}")
-            self.mcp = FastMCPBox(name=name, sandbox_config=sandbox_config)
+            self.mcp = FastMCPBox(name=name, sandbox_config=sandbox_config, pool_config=pool_config,
+                                  http_pool_config=http_pool_config, call_timeout=call_timeout,
+                                  trusted_modules=trusted_modules or (), scheduler_config=scheduler_config)
             self.call_in_sandbox = True
+        # 本地模式下注入工具命名空间的共享连接池客户端
+        self.http_clients = create_http_clients(http_pool_config)
+        # 在进程内执行的同步工具（本地模式的动态工具、原生工具）派发到线程池/进程池，不阻塞事件循环
+        self.host_executor = HostExecutor(http_pool_config=http_pool_config, call_timeout=call_timeout,
+                                          **(executor_config or {}))
 
         self.mcp.settings.host = host
         self.mcp.settings.port = port
         self.transport = transport
+        # 注册名 -> 工具模块，一个模块可以包含多个 @mcp.tool 工具
+        self.tool_sources: dict[str, ToolSource] = {}
+        # 注册名 -> 注册模块的用户，网关迁移模块时原样带上
+        self.tool_users: dict[str, str | None] = {}
+        # 原生工具名 -> 提供者名，由 mount_provider 挂载，不能通过管理接口移除
+        self.native_tools: dict[str, str] = {}
+        # 大于 0 时多个 worker 共享存储中的注册表：定期与存储对齐，文件存储模式下增删也写回文件
+        self.registry_sync_interval = registry_sync_interval
+        self._registry_version = None
+        # 本进程增删模块的次数，在工作线程读取注册表期间发生变化时本轮不对齐，避免按旧数据撤销刚完成的增删
+        self._registry_changes = 0
         if transport == 'sse':
             self.mcp_box_url = f"http://{host}:{port}/sse"
         elif transport == 'streamable-http':
@@ -111,15 +147,89 @@ class McpBox():
             verbose_logger.error(f"Database connection failed: {e}")
             raise e
 
+    def create_app(self) -> Starlette:
+        """把 MCP 传输（SSE / streamable-http）和工具管理接口挂载到同一个 ASGI 应用
+
+        工具注册表只在这一个事件循环上读写，不再与独立线程中的 MCP 服务共享，也省去第二个 uvicorn 服务
+        """
+        if self.transport == 'streamable-http':
+            transport_app = self.mcp.streamable_http_app()
+        else:
+            transport_app = self.mcp.sse_app()
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app: Starlette):
+            # 挂载的子应用不会运行自己的 lifespan，streamable-http 的会话管理器需要在这里启动
+            sync_task = None
+            if self.registry_sync_interval > 0:
+                sync_task = asyncio.create_task(self.sync_registry_forever())
+            try:
+                if self.transport == 'streamable-http':
+                    async with self.mcp.session_manager.run():
+                        yield
+                else:
+                    yield
+            finally:
+                if sync_task:
+                    sync_task.cancel()
+
+        return Starlette(
+            routes=[
+                Mount("/add_mcp_tool/", app=self.handle_add_mcp_tool),
+                Mount("/remove_mcp_tool/", app=self.handle_remove_mcp_tool),
+                Mount("/list_mcp_tool/", app=self.handle_list_mcp_tool),
+                Mount("/", app=transport_app),
+            ],
+            lifespan=lifespan,
+        )
+
+    def serve(self, extra_ports: tuple[int, ...] = ()):
+        """在当前线程用一个 uvicorn 服务运行 create_app()，可同时监听额外端口（兼容原来的 N+1 管理端口）"""
+        host, port = self.mcp.settings.host, self.mcp.settings.port
+        config = uvicorn.Config(self.create_app(), host=host, port=port,
+                                log_level=self.mcp.settings.log_level.lower())
+        sockets = [socket.create_server((host, p)) for p in (port, *extra_ports)]
+        verbose_logger.info(f"Start MCP Box Server host={host}, ports={[port, *extra_ports]}, transport={self.transport}")
+        uvicorn.Server(config).run(sockets=sockets)
+
     def start(self):
+        """旧的运行方式：MCP 服务在独立线程的事件循环中运行，管理接口需另起服务，推荐改用 serve()"""
         verbose_logger.info(
             f"Start MCP Box Server host={self.mcp.settings.host}, port={self.mcp.settings.port} on thread !")
         self.mcp_thread = threading.Thread(target=self.mcp.run, kwargs={"transport": self.transport})
         self.mcp_thread.daemon = True  # 设置为守护线程，主线程退出时自动结束
         self.mcp_thread.start()
 
+    def mount_provider(self, provider: FastMCP) -> list[str]:
+        """挂载受信任的原生工具提供者（如 Memo 的 create_local_server()）
+
+        提供者的工具与动态工具一起对外提供，但直接在当前进程内执行，沙箱模式下也不经过沙箱，
+        省去沙箱执行和 HTTP 往返的开销。只应挂载可信代码，返回挂载的工具名
+        """
+        tools = provider._tool_manager.list_tools()
+        existing = [tool.name for tool in tools if self.mcp._tool_manager.get_tool(tool.name)]
+        if existing:
+            raise ValueError(f"mount_provider: provider={provider.name}, tools {existing} already exist")
+        for tool in tools:
+            self.host_executor.offload(tool)
+            if self.call_in_sandbox:
+                self.mcp.add_native_tool(tool)
+            else:
+                self.mcp._tool_manager._tools[tool.name] = tool
+            self.native_tools[tool.name] = provider.name
+        mounted = [tool.name for tool in tools]
+        verbose_logger.info(f"McpBox mount provider '{provider.name}', tools={mounted}")
+        return mounted
+
+    def load_providers(self, specs: str):
+        """按 "模块:工厂函数" 列表（逗号分隔）导入并挂载原生工具提供者"""
+        for spec in filter(None, (item.strip() for item in specs.split(","))):
+            module_name, _, factory_name = spec.partition(":")
+            factory = getattr(importlib.import_module(module_name), factory_name or "create_server")
+            self.mount_provider(factory())
+
     def load_code_from_config(self):
-        with open("./config/mcp-tool.json", 'r', encoding='utf-8') as f:
+        with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
 
         if isinstance(data, list):
@@ -130,8 +240,9 @@ class McpBox():
                 mcp_tool_name = item.get('mcp_tool_name')
                 mcp_tool_code = item.get('mcp_tool_code')
                 if mcp_tool_code:
-                    self.store_code_to_sandbox(mcp_tool_name, mcp_tool_code)
-                    verbose_logger.info(f"Loaded MCP tool '{mcp_tool_name}' from config")
+                    tool_source = parse_tool_source(mcp_tool_code)
+                    if self.try_store_code_to_sandbox(mcp_tool_name, tool_source, item.get('user_id')):
+                        verbose_logger.info(f"Loaded MCP tool '{mcp_tool_name}' from config")
                 else:
                     verbose_logger.info(f"Empty code for MCP tool '{mcp_tool_name}', skipped")
             except Exception as e:
@@ -144,7 +255,7 @@ class McpBox():
             return
         try:
             with self.db_connection.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute("SELECT mcp_tool_name, mcp_tool_code FROM agents_mcp_box")
+                cursor.execute("SELECT mcp_tool_name, mcp_tool_code, user_id FROM agents_mcp_box")
                 rows = cursor.fetchall()
 
                 for row in rows:
@@ -152,8 +263,9 @@ class McpBox():
                     mcp_tool_code = row['mcp_tool_code']
 
                     if mcp_tool_code:
-                        self.store_code_to_sandbox(mcp_tool_name, mcp_tool_code)
-                        verbose_logger.info(f"Loaded MCP tool '{mcp_tool_name}' from database")
+                        tool_source = parse_tool_source(mcp_tool_code)
+                        if self.try_store_code_to_sandbox(mcp_tool_name, tool_source, row['user_id']):
+                            verbose_logger.info(f"Loaded MCP tool '{mcp_tool_name}' from database")
                     else:
                         verbose_logger.info(f"Empty code for MCP tool '{mcp_tool_name}', skipped")
             verbose_logger.info(f"Successfully loaded {len(rows)} MCP tools from database")
@@ -161,6 +273,92 @@ class McpBox():
             verbose_logger.error(f"Error loading code from database: {e}")
             raise e
 
+    def registry_version(self):
+        """存储中注册表的版本标识，未变化时同步不必读取全部源码"""
+        if self.store_in_db:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("SELECT md5(string_agg(mcp_tool_name || ':' || md5(COALESCE(mcp_tool_code, '')), ',' "
+                               "ORDER BY mcp_tool_name)) FROM agents_mcp_box")
+                version = cursor.fetchone()[0]
+            self.db_connection.commit()
+            return version
+        stat = os.stat(REGISTRY_FILE)
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_registry(self) -> dict[str, tuple[str, str | None]]:
+        """读取存储中的全部工具模块：注册名 -> (源码, 所属用户)"""
+        if self.store_in_db:
+            with self.db_connection.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute("SELECT mcp_tool_name, mcp_tool_code, user_id FROM agents_mcp_box")
+                rows = [(row['mcp_tool_name'], row['mcp_tool_code'], row['user_id']) for row in cursor.fetchall()]
+            self.db_connection.commit()
+        else:
+            with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+                rows = [(item.get('mcp_tool_name'), item.get('mcp_tool_code'), item.get('user_id'))
+                        for item in json.load(f)]
+        return {name: (code, user_id) for name, code, user_id in rows if code}
+
+    async def sync_registry(self):
+        """与存储中的注册表对齐：加载其他 worker 新增的模块，移除已删除的模块，源码变化的模块重新加载
+
+        读取存储是阻塞的数据库或文件 IO，放到工作线程中执行，不阻塞处理 MCP 请求的事件循环；
+        工具的增删仍在事件循环中进行
+        """
+        changes = self._registry_changes
+        version = await anyio.to_thread.run_sync(self.registry_version)
+        if version == self._registry_version:
+            return
+        stored = await anyio.to_thread.run_sync(self.read_registry)
+        if changes == self._registry_changes:
+            self.apply_registry(version, stored)
+
+    def apply_registry(self, version, stored: dict[str, tuple[str, str | None]]):
+        for mcp_tool_name in [name for name in self.tool_sources if name not in stored]:
+            removed = self.remove_code_from_sandbox(mcp_tool_name)
+            verbose_logger.info(f"sync_registry: removed mcp_tool_name={mcp_tool_name}, tools={removed}")
+        for mcp_tool_name, (code, user_id) in stored.items():
+            current = self.tool_sources.get(mcp_tool_name)
+            if current is not None and current.code == dedent(code):
+                continue
+            if current is not None:
+                self.remove_code_from_sandbox(mcp_tool_name)
+            try:
+                tool_source = parse_tool_source(code)
+            except (SyntaxError, ToolSourceError) as e:
+                verbose_logger.error(f"sync_registry: mcp_tool_name={mcp_tool_name} parse_code fail: {e}")
+                continue
+            existing = [spec.name for spec in tool_source.tools if self.mcp._tool_manager.get_tool(spec.name)]
+            if existing:
+                verbose_logger.error(f"sync_registry: mcp_tool_name={mcp_tool_name}, tools {existing} already exist, skipped")
+                continue
+            if not self.try_store_code_to_sandbox(mcp_tool_name, tool_source, user_id):
+                continue
+            if self.call_in_sandbox:
+                self.mcp.prewarm_tool(mcp_tool_name)
+            verbose_logger.info(f"sync_registry: loaded mcp_tool_name={mcp_tool_name}")
+        self._registry_version = version
+
+    async def sync_registry_forever(self):
+        while True:
+            await asyncio.sleep(self.registry_sync_interval)
+            try:
+                await self.sync_registry()
+            except Exception as e:
+                verbose_logger.error(f"sync_registry error: {e}")
+
+    def update_registry_file(self, mcp_tool_name: str, code: str | None, user_id: str | None = None):
+        """在文件锁内改写配置文件中的一个工具模块，code 为 None 表示删除"""
+        with open(REGISTRY_FILE + ".lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+                data = [item for item in json.load(f) if item.get('mcp_tool_name') != mcp_tool_name]
+            if code is not None:
+                data.append({'mcp_tool_name': mcp_tool_name, 'mcp_tool_code': code, 'user_id': user_id})
+            tmp_file = f"{REGISTRY_FILE}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, REGISTRY_FILE)
+
     def insert_mcp_to_db(self, mcp_tool_name: str, code: str, user_id: str):
         """插入MCP工具到数据库"""
         try:
@@ -194,61 +392,132 @@ class McpBox():
             self.db_connection.rollback()
             return False
 
-    async def parse_code(self, request: Request) -> str:
-        code, raw_code = None, None
+    async def parse_code(self, request: Request) -> ToolSource | None:
+        """解析请求体中的工具源码，无法解析时返回 None；不符合注册要求时抛出 ToolSourceError"""
+        tool_source, raw_code = None, None
         try:
             body_bytes = await request.body()
             raw_code = body_bytes.decode('utf-8')
-            code = re.sub(r'\\\\([nrt"])', lambda m: f'\\{m.group(1)}', raw_code)
-            code = dedent(code)
-            # print("===  parse_code  ===")
-            # print(code)
-            # print("===  end  ===")
+            try:
+                tool_source = parse_tool_source(raw_code)
+            except SyntaxError:
+                # 客户端把换行等字符二次转义时源码无法解析，还原后再试
+                tool_source = parse_tool_source(unescape_tool_source(raw_code))
+        except ToolSourceError:
+            raise
         except Exception as e:
             verbose_logger.error(f'# parse_code error\n: {raw_code} \n{e}')
-        return code
+        return tool_source
 
-    def dyn_add_mcp_tool(self, code: str):
+    def dyn_add_mcp_tool(self, tool_source: ToolSource, mcp_tool_name: str | None = None):
+        """执行模块代码注册其中的工具；执行失败时移除已注册的部分工具后重新抛出异常"""
+        registered = set(self.mcp._tool_manager._tools)
         try:
             namespace = {
                 "mcp": self.mcp,
-                "__builtins__": __builtins__  # 保留内置函数
+                "__builtins__": __builtins__,  # 保留内置函数
+                **self.http_clients,
             }
-            exec(code, namespace)
+            exec(tool_source.compile(), namespace)
         except Exception as e:
             verbose_logger.error(f'dyn_add_mcp_tool error: {e}')
+            for name in [name for name in self.mcp._tool_manager._tools if name not in registered]:
+                self.mcp._tool_manager._tools.pop(name)
+            raise
+        # 沙箱模式下只有运维配置的可信模块可能回退到当前进程内执行
+        trusted = not self.call_in_sandbox or (mcp_tool_name or "") in self.mcp.trusted_modules
+        for spec in tool_source.tools:
+            tool = self.mcp._tool_manager.get_tool(spec.name)
+            if tool and trusted:
+                self.host_executor.offload(tool, mcp_tool_name or spec.name, tool_source, spec)
+
+    def store_code_to_sandbox(self, mcp_tool_name: str, tool_source: ToolSource, user_id: str | None = None):
+        self._registry_changes += 1
+        self.dyn_add_mcp_tool(tool_source, mcp_tool_name)
+        self.tool_sources[mcp_tool_name] = tool_source
+        self.tool_users[mcp_tool_name] = user_id
+        if self.call_in_sandbox:
+            self.mcp.store_tool_code(mcp_tool_name, tool_source, user_id)
 
-    def store_code_to_sandbox(self, mcp_tool_name: str, mcp_tool_code: str):
-        self.dyn_add_mcp_tool(mcp_tool_code)
+    def try_store_code_to_sandbox(self, mcp_tool_name: str, tool_source: ToolSource,
+                                  user_id: str | None = None) -> bool:
+        """加载存储中的模块，执行失败时记录日志并跳过，不影响其他模块的加载"""
+        try:
+            self.store_code_to_sandbox(mcp_tool_name, tool_source, user_id)
+        except Exception as e:
+            verbose_logger.error(f"Failed to load MCP tool '{mcp_tool_name}', skipped: {e}")
+            return False
+        return True
+
+    def remove_code_from_sandbox(self, mcp_tool_name: str) -> list[str]:
+        """移除注册单元及其包含的全部工具，返回被移除的工具名"""
+        self._registry_changes += 1
+        tool_source = self.tool_sources.pop(mcp_tool_name)
+        self.tool_users.pop(mcp_tool_name, None)
+        removed = []
+        for spec in tool_source.tools:
+            if self.mcp._tool_manager.get_tool(spec.name):
+                self.mcp._tool_manager._tools.pop(spec.name)
+                removed.append(spec.name)
         if self.call_in_sandbox:
-            self.mcp.store_tool_code(mcp_tool_name, mcp_tool_code)
+            self.mcp.clear_tool_code(mcp_tool_name)
+        return removed
 
     async def handle_add_mcp_tool(self, scope: Scope, receive: Receive, send: Send) -> None:
         _result = 0
         error = ''
+        tool_source = None
 
         request = Request(scope, receive)
         mcp_tool_name = request.query_params.get("mcp_tool_name")
-        if self.mcp._tool_manager.get_tool(mcp_tool_name):
+        user_id = request.query_params.get("user_id", "test")
+        if mcp_tool_name in self.tool_sources:
             _result = 1
             error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name} already exists, remove first !"
             verbose_logger.error(error)
         else:
             verbose_logger.info(f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name}")
-            code = await self.parse_code(request)
-            if code:
-                self.store_code_to_sandbox(mcp_tool_name, code)
-                # @todo code add to DB
-                if self.store_in_db:
-                    self.insert_mcp_to_db(mcp_tool_name, code, "test")
-            else:
+            parse_error = ''
+            try:
+                tool_source = await self.parse_code(request)
+            except ToolSourceError as e:
+                parse_error = f": {e}"
+            if not tool_source or not tool_source.tools:
                 _result = 2
-                error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name} parse_code fail !"
+                error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name} parse_code fail{parse_error} !"
                 verbose_logger.error(error)
+            else:
+                existing = [spec.name for spec in tool_source.tools if self.mcp._tool_manager.get_tool(spec.name)]
+                if existing:
+                    _result = 1
+                    error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name}, tools {existing} already exist, remove first !"
+                    verbose_logger.error(error)
+                else:
+                    try:
+                        self.store_code_to_sandbox(mcp_tool_name, tool_source, user_id)
+                    except Exception as e:
+                        _result = 3
+                        error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name} load fail: {e} !"
+                        verbose_logger.error(error)
+                    else:
+                        saved = True
+                        if self.store_in_db:
+                            saved = self.insert_mcp_to_db(mcp_tool_name, tool_source.code, user_id)
+                        elif self.registry_sync_interval > 0:
+                            self.update_registry_file(mcp_tool_name, tool_source.code, user_id)
+                        if not saved:
+                            # 写库失败（如主键重复）时撤销本地注册，避免与数据库中的注册表不一致
+                            self.remove_code_from_sandbox(mcp_tool_name)
+                            _result = 4
+                            error = f"handle_add_mcp_tool: mcp_tool_name={mcp_tool_name} insert to database fail !"
+                            verbose_logger.error(error)
+                        elif self.call_in_sandbox:
+                            self.mcp.prewarm_tool(mcp_tool_name)
 
         result = None
         if _result == 0:
-            result = {'result': _result, 'error': error, 'transport': self.transport, 'mcp_box_url': self.mcp_box_url}
+            result = {'result': _result, 'error': error, 'transport': self.transport, 'mcp_box_url': self.mcp_box_url,
+                      'tools': [spec.name for spec in tool_source.tools]}
         else:
             result = {'result': _result, 'error': error}
 
@@ -261,14 +530,14 @@ class McpBox():
 
         request = Request(scope, receive)
         mcp_tool_name = request.query_params.get("mcp_tool_name")
-        if self.mcp._tool_manager.get_tool(mcp_tool_name):
-            verbose_logger.info(f"handle_remove_mcp_tool: mcp_tool_name={mcp_tool_name}")
-            self.mcp._tool_manager._tools.pop(mcp_tool_name)
-            if self.call_in_sandbox:
-                self.mcp.clear_tool_code(mcp_tool_name)
+        if mcp_tool_name in self.tool_sources:
+            removed = self.remove_code_from_sandbox(mcp_tool_name)
+            verbose_logger.info(f"handle_remove_mcp_tool: mcp_tool_name={mcp_tool_name}, tools={removed}")
             # @todo remove code From DB
             if self.store_in_db:
                 self.remove_mcp_from_db(mcp_tool_name)
+            elif self.registry_sync_interval > 0:
+                self.update_registry_file(mcp_tool_name, None)
         else:
             _result = 1
             error = f"handle_remove_mcp_tool: mcp_tool_name={mcp_tool_name}, not exists !"
@@ -278,17 +547,27 @@ class McpBox():
         response = Response(content=json.dumps(result), status_code=200, media_type="application/json")
         await response(scope, receive, send)
 
+    async def handle_list_mcp_tool(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """列出已注册的工具模块及其源码，供网关迁移工具模块"""
+        # shared 表示模块保存在各 McpBox 共用的数据库中，从任一 McpBox 移除都会删除库中的记录
+        result = [{'mcp_tool_name': mcp_tool_name, 'mcp_tool_code': tool_source.code,
+                   'tools': [spec.name for spec in tool_source.tools], 'shared': self.store_in_db,
+                   'user_id': self.tool_users.get(mcp_tool_name)}
+                  for mcp_tool_name, tool_source in self.tool_sources.items()]
+        response = Response(content=json.dumps(result), status_code=200, media_type="application/json")
+        await response(scope, receive, send)
+
     def __del__(self):
         """析构函数，关闭数据库连接"""
+        if hasattr(self, 'host_executor'):
+            self.host_executor.shutdown(wait=False)
         if hasattr(self, 'db_connection') and self.db_connection:
             self.db_connection.close()
             verbose_logger.info("Database connection closed")
 
 
-@click.command()
-@click.option("--host", default="localhost", help="Host to listen on for SSE")
-@click.option("--port", default=47070, help="Port to listen on for SSE")
-def main(host: str, port: int):
+def create_mcp_box(host: str, port: int, registry_sync_interval: float = 0) -> McpBox:
+    """按环境变量创建 McpBox"""
     # sandbox_config = {} #run in sandbox
     # sandbox_config = None # run in local
     load_dotenv()
@@ -296,21 +575,68 @@ def main(host: str, port: int):
     sandbox_config = {
         "debug_host": os.getenv("E2B_JUPYTER_HOST"),
     }
+    pool_config = {
+        "size": int(os.getenv("SANDBOX_POOL_SIZE", "0")),
+        "max_size": int(os.getenv("SANDBOX_POOL_MAX_SIZE", os.getenv("SANDBOX_POOL_SIZE", "0"))),
+        "scale_down_delay": float(os.getenv("SANDBOX_POOL_SCALE_DOWN_DELAY", "300")),
+        "max_async_calls": int(os.getenv("SANDBOX_POOL_MAX_ASYNC_CALLS", "10")),
+        "max_shared_calls": int(os.getenv("SANDBOX_POOL_MAX_SHARED_CALLS", "100")),
+        "reset": os.getenv("SANDBOX_POOL_RESET", "true").strip().lower() == "true",
+        "breaker_config": {
+            "error_rate": float(os.getenv("SANDBOX_BREAKER_ERROR_RATE", "0.5")),
+            "slow_threshold": float(os.getenv("SANDBOX_BREAKER_SLOW_SECONDS", "30")),
+            "cooldown": float(os.getenv("SANDBOX_BREAKER_COOLDOWN", "30")),
+        },
+    }
+    http_pool_config = {
+        "max_connections": int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20")),
+        "max_keepalive_connections": int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "10")),
+    }
+    executor_config = {
+        "max_workers": int(os.getenv("HOST_TOOL_THREADS", "8")),
+        "process_workers": int(os.getenv("HOST_TOOL_PROCESSES", "0")),
+    }
+    call_timeout = float(os.getenv("TOOL_CALL_TIMEOUT", "300"))
+    trusted_modules = [name.strip() for name in os.getenv("SANDBOX_TRUSTED_MODULES", "").split(",") if name.strip()]
+    scheduler_config = {
+        "max_concurrent": int(os.getenv("SANDBOX_MAX_CONCURRENT_CALLS", "32")),
+        "weights": parse_weights(os.getenv("TENANT_WEIGHTS", "")),
+        "max_priority": int(os.getenv("SANDBOX_MAX_PRIORITY", "10")),
+    }
     mcp_box = McpBox(name="Dynamic MCP Box Server", host=host, port=port, sandbox_config=sandbox_config,
-                     store_in_file=store_in_file)
-    mcp_box.start()
-
-    starlette_app = Starlette(
-        debug=True,
-        routes=[
-            Mount("/add_mcp_tool/", app=mcp_box.handle_add_mcp_tool),
-            Mount("/remove_mcp_tool/", app=mcp_box.handle_remove_mcp_tool),
-        ],
-    )
-
-    port = port + 1
-    verbose_logger.info(f"Start Mcp Box Manager on host={host}, port={port}")
-    uvicorn.run(starlette_app, host=host, port=port)
+                     store_in_file=store_in_file, pool_config=pool_config, http_pool_config=http_pool_config,
+                     executor_config=executor_config, registry_sync_interval=registry_sync_interval,
+                     call_timeout=call_timeout, trusted_modules=trusted_modules, scheduler_config=scheduler_config)
+    mcp_box.load_providers(os.getenv("MCP_BOX_PROVIDERS", ""))
+    return mcp_box
+
+
+def create_app() -> Starlette:
+    """uvicorn 应用工厂，例如 uvicorn src.mcp_box:create_app --factory --host 0.0.0.0 --port 47070
+
+    监听地址由 MCP_BOX_HOST / MCP_BOX_PORT 指定，用于生成返回给客户端的 mcp_box_url
+    """
+    load_dotenv()
+    host = os.getenv("MCP_BOX_HOST", "localhost")
+    port = int(os.getenv("MCP_BOX_PORT", "47070"))
+    return create_mcp_box(host, port).create_app()
+
+
+@click.command()
+@click.option("--host", default="localhost", help="Host to listen on for SSE")
+@click.option("--port", default=47070, help="Port to listen on for SSE")
+@click.option("--workers", default=lambda: int(os.getenv("MCP_BOX_WORKERS", "1")), type=int,
+              help="Number of worker processes sharing the listening sockets")
+def main(host: str, port: int, workers: int):
+    # MCP 服务和管理接口同在端口 N，端口 N+1 仍可访问管理接口
+    if workers > 1:
+        load_dotenv()
+        registry_sync_interval = float(os.getenv("MCP_BOX_REGISTRY_SYNC_INTERVAL", "2"))
+        serve_workers(host, port, workers, extra_ports=(port + 1,),
+                      worker_config={"registry_sync_interval": registry_sync_interval})
+    else:
+        mcp_box = create_mcp_box(host, port)
+        mcp_box.serve(extra_ports=(port + 1,))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,493 @@
+"""沙箱预热池
+
+按运行环境指纹（依赖列表）缓存已安装依赖、已加载运行时的沙箱，调用结束后归还复用，
+避免每次调用都重新创建沙箱并执行 pip install。每个环境保留的预热沙箱数根据调用到达率和
+执行耗时在 [size, max_size] 之间自动伸缩。
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, List
+
+from e2b_code_interpreter import Sandbox
+from e2b_code_interpreter.models import Execution, ExecutionError, Result
+
+# 支持两种导入方式
+try:
+    from .circuit_breaker import CircuitBreaker
+    from .sandbox_runtime import build_cancel_code, build_collect_code, build_reset_code, parse_collect_output
+    from .utils.logging import verbose_logger
+except ImportError:
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from src.circuit_breaker import CircuitBreaker
+    from src.sandbox_runtime import build_cancel_code, build_collect_code, build_reset_code, parse_collect_output
+    from src.utils.logging import verbose_logger
+
+# 宿主端单次轮询 async 调用结果时，内核最多等待的秒数
+COLLECT_WAIT = 0.05
+# 还没有观测到执行耗时时假定的单次调用耗时（秒）
+DEFAULT_EXEC_TIME = 1.0
+# 执行耗时指数加权平均的新样本权重
+EXEC_TIME_ALPHA = 0.2
+# 销毁沙箱失败时的最多尝试次数和首次重试间隔（秒），之后每次翻倍
+REAP_RETRIES = 3
+REAP_BACKOFF = 1.0
+
+
+def env_fingerprint(requirements: List[str]) -> str:
+    """运行环境指纹：依赖相同的工具可以共用同一个沙箱"""
+    return hashlib.sha256("\n".join(sorted(requirements)).encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass
+class EnvStats:
+    """一个运行环境的负载统计"""
+    requirements: List[str]
+    # (到达时间, 权重)，独占调用权重为 1，共享沙箱的 async 调用按每沙箱并发上限折算
+    arrivals: deque = field(default_factory=deque)
+    exec_time: float = DEFAULT_EXEC_TIME
+    # 需要保留的空闲预热沙箱数
+    target: int = 0
+    # 最近一次需求达到 target 的时间，用于缩容滞后
+    raised_at: float = 0.0
+    # 正在后台创建的沙箱数
+    warming: int = 0
+
+
+class SandboxSession:
+    """一个已安装依赖并加载运行时的沙箱"""
+
+    def __init__(self, sandbox_config: dict[str, Any], requirements: List[str], runtime_code: str,
+                 breaker: CircuitBreaker | None = None, permit: bool | str = True):
+        self.fingerprint = env_fingerprint(requirements)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.calls = 0
+        self.inflight = 0
+        # 共享中的 async 沙箱所属的 (环境指纹, 租户)，独占时为 None
+        self.shared_key: tuple[str, str | None] | None = None
+        # 上次重置以来分配给调用的次数
+        self.served = 0
+        self.broken = False
+        # 同一内核的 cell 串行执行，run_code 之间互斥；轮询由等待中的调用轮流承担
+        self._run_lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._waiters: dict[str, Future] = {}
+        # 只有创建沙箱本身计入熔断统计，依赖安装失败是工具自身的问题
+        start = time.monotonic()
+        try:
+            self.sandbox = Sandbox(**sandbox_config)
+        except Exception:
+            if breaker:
+                breaker.record(False, time.monotonic() - start, permit)
+            raise
+        if breaker:
+            breaker.record(True, time.monotonic() - start, permit)
+        try:
+            for requirement in requirements:
+                pip_cmd = f"pip install --quiet {requirement}"
+                verbose_logger.info(f"SandboxSession sandbox.commands.run: command=:  {pip_cmd}")
+                self.sandbox.commands.run(pip_cmd)
+            execution = self.sandbox.run_code(runtime_code)
+            if execution.error:
+                raise RuntimeError(f"load runtime error, error.name={execution.error.name}, "
+                                   f"error.value={execution.error.value}")
+        except Exception:
+            self.kill()
+            raise
+
+    def run_code(self, code: str, timeout: float | None = None) -> Execution:
+        with self._run_lock:
+            self.calls += 1
+            self.last_used = time.monotonic()
+            return self.sandbox.run_code(code, timeout=timeout)
+
+    def run_async_call(self, call_id: str, submit_code: str) -> Execution:
+        """提交 async 工具到内核事件循环并等待其完成，期间其他调用可以继续提交"""
+        waiter = Future()
+        self._waiters[call_id] = waiter
+        execution = self.run_code(submit_code)
+        if execution.error:
+            self._waiters.pop(call_id, None)
+            return execution
+
+        while not waiter.done():
+            if self._poll_lock.acquire(blocking=False):
+                try:
+                    if not waiter.done():
+                        self._poll()
+                finally:
+                    self._poll_lock.release()
+            else:
+                wait([waiter], timeout=COLLECT_WAIT)
+        return waiter.result()
+
+    def cancel_async_call(self, call_id: str) -> bool:
+        """取消内核中仍在执行的 async 调用并唤醒等待它的线程，返回沙箱是否仍可复用"""
+        waiter = self._waiters.pop(call_id, None)
+        if waiter is not None:
+            waiter.set_exception(CancelledError(f"call {call_id} cancelled"))
+        if self.broken:
+            return False
+        try:
+            execution = self.run_code(build_cancel_code(call_id))
+        except Exception as e:
+            verbose_logger.error(f"SandboxSession cancel error, call_id={call_id}: {e}")
+            return False
+        return execution.error is None
+
+    def reset(self) -> bool:
+        """把内核恢复到加载运行时后的状态，返回是否可以交给下一个调用"""
+        try:
+            execution = self.run_code(build_reset_code())
+        except Exception as e:
+            verbose_logger.error(f"SandboxSession reset error: {e}")
+            return False
+        if execution.error:
+            verbose_logger.error(f"SandboxSession reset error, error.name={execution.error.name}, "
+                                 f"error.value={execution.error.value}")
+            return False
+        return True
+
+    def _poll(self):
+        try:
+            execution = self.run_code(build_collect_code(COLLECT_WAIT))
+            if execution.error:
+                raise RuntimeError(f"collect error, error.name={execution.error.name}, "
+                                   f"error.value={execution.error.value}")
+            done = parse_collect_output(execution.logs.stdout)
+        except Exception as e:
+            # 无法再收集结果，沙箱不再可用，唤醒所有等待中的调用
+            self.broken = True
+            for call_id in list(self._waiters):
+                self._waiters.pop(call_id).set_exception(e)
+            return
+
+        for call_id, payload in done.items():
+            waiter = self._waiters.pop(call_id, None)
+            if waiter is None:
+                continue
+            error = payload.get("error")
+            if error:
+                waiter.set_result(Execution(error=ExecutionError(**error)))
+            elif payload.get("text") is None:
+                waiter.set_result(Execution())
+            else:
+                waiter.set_result(Execution(results=[Result(text=payload["text"], is_main_result=True)]))
+
+    def kill(self) -> bool:
+        try:
+            self.sandbox.kill()
+            return True
+        except Exception as e:
+            verbose_logger.error(f"SandboxSession kill error: {e}")
+            return False
+
+
+class SandboxReaper:
+    """在后台线程中销毁沙箱，调用结束后不必等待销毁请求即可返回结果
+
+    销毁失败时按指数退避重试，重试用尽后只记录日志（沙箱到期后由 E2B 自动回收），不会变成工具错误
+    """
+
+    def __init__(self, workers: int = 2, retries: int = REAP_RETRIES, backoff: float = REAP_BACKOFF):
+        self.retries = retries
+        self.backoff = backoff
+        # (到期时间, 序号, 已尝试次数, 沙箱)
+        self._queue: list[tuple[float, int, int, SandboxSession]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f"sandbox-reaper-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, session: SandboxSession, attempt: int = 0, delay: float = 0.0):
+        with self._cond:
+            if not self._closed:
+                heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), attempt, session))
+                self._cond.notify()
+                return
+        # 关闭后才归还的沙箱（如关闭时仍在执行的调用）直接销毁
+        session.kill()
+
+    def _next(self) -> tuple[int, SandboxSession] | None:
+        with self._cond:
+            while True:
+                if not self._queue:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+                    continue
+                delay = self._queue[0][0] - time.monotonic()
+                # 关闭时不再等待重试间隔，尽快处理完剩余的沙箱
+                if delay > 0 and not self._closed:
+                    self._cond.wait(delay)
+                    continue
+                _, _, attempt, session = heapq.heappop(self._queue)
+                return attempt, session
+
+    def _run(self):
+        while (item := self._next()) is not None:
+            attempt, session = item
+            if session.kill():
+                continue
+            attempt += 1
+            if attempt < self.retries:
+                self.submit(session, attempt, self.backoff * 2 ** (attempt - 1))
+            else:
+                verbose_logger.error(f"SandboxReaper: give up killing sandbox after {attempt} attempts, "
+                                     f"fingerprint={session.fingerprint}")
+
+    def close(self, timeout: float | None = None):
+        """停止接收重试，处理完已排队的沙箱后退出"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+class SandboxPool:
+    """按环境指纹保留空闲预热沙箱，max_size=0 时每次调用后销毁（不复用）
+
+    每个环境保留的空闲沙箱数按 Little 定律估算：最近 scale_window 秒的到达率 × 平均执行耗时
+    × headroom，限制在 [size, max_size] 之间。需求上升时立即在后台补足预热沙箱；需求下降后
+    持续 scale_down_delay 秒才缩容，避免突发流量间隙反复创建、销毁沙箱。
+
+    同一租户的 async 工具调用可以共享同一个沙箱（每个沙箱最多 max_async_calls 个并发调用），
+    同步工具调用独占沙箱。共享沙箱累计服务 max_shared_calls 个调用后不再接纳新调用，等进行中的调用结束后重置。reset=True 时沙箱归还后先在后台重置内核状态，重置成功才放回空闲队列。
+    不再使用的沙箱交给 SandboxReaper 在后台销毁。
+
+    创建沙箱经过熔断器：E2B 异常时不再逐个等待创建失败，没有可用的预热沙箱时直接抛出 CircuitOpenError。
+    """
+
+    def __init__(self, sandbox_config: dict[str, Any], runtime_code: str, size: int = 0,
+                 max_async_calls: int = 10, max_shared_calls: int = 100, max_size: int | None = None, scale_window: float = 60.0,
+                 scale_down_delay: float = 300.0, scale_interval: float = 5.0, headroom: float = 1.2,
+                 warm_workers: int = 4, reset: bool = True, reap_workers: int = 2,
+                 breaker_config: dict[str, Any] | None = None):
+        self.sandbox_config = sandbox_config
+        self.runtime_code = runtime_code
+        self.min_size = size
+        self.max_size = size if max_size is None else max(size, max_size)
+        self.max_async_calls = max_async_calls
+        self.max_shared_calls = max_shared_calls
+        self.scale_window = scale_window
+        self.scale_down_delay = scale_down_delay
+        self.scale_interval = scale_interval
+        self.headroom = headroom
+        self.reset = reset
+        self._idle: dict[str, deque[SandboxSession]] = {}
+        self._shared: dict[tuple[str, str | None], list[SandboxSession]] = {}
+        self._stats: dict[str, EnvStats] = {}
+        # 同一环境、同一租户的共享沙箱串行创建，并发到达的 async 调用等待并加入同一个沙箱
+        self._creating: dict[tuple[str, str | None], threading.Lock] = {}
+        # 正在后台重置、尚未放回空闲队列的沙箱
+        self._recycling: set[SandboxSession] = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reaper = SandboxReaper(workers=reap_workers)
+        self.breaker = CircuitBreaker(**(breaker_config or {}))
+        self._warmer = None
+        if self.max_size > 0:
+            self._warmer = ThreadPoolExecutor(max_workers=warm_workers, thread_name_prefix="sandbox-warm")
+            threading.Thread(target=self._autoscale_loop, name="sandbox-autoscale", daemon=True).start()
+
+    def acquire(self, requirements: List[str], shared: bool = False, tenant: str | None = None) -> SandboxSession:
+        """取一个沙箱；shared=True 时可以加入同一租户正在执行 async 调用的沙箱，不同租户不共享内核"""
+        fingerprint = env_fingerprint(requirements)
+        # 不保留预热沙箱时每个调用独占一个沙箱，保持调用间隔离
+        shared_key = (fingerprint, tenant) if shared and self.max_size > 0 else None
+        self._record_arrival(fingerprint, requirements, 1 / self.max_async_calls if shared_key else 1)
+        if not shared_key:
+            return self._acquire(requirements, fingerprint, shared_key)
+        with self._lock:
+            creating = self._creating.setdefault(shared_key, threading.Lock())
+        with creating:
+            return self._acquire(requirements, fingerprint, shared_key)
+
+    def _acquire(self, requirements: List[str], fingerprint: str,
+                 shared_key: tuple[str, str | None] | None) -> SandboxSession:
+        with self._lock:
+            if shared_key:
+                for session in self._shared.get(shared_key, []):
+                    if (not session.broken and session.inflight < self.max_async_calls
+                            and session.served < self.max_shared_calls):
+                        session.inflight += 1
+                        session.served += 1
+                        return session
+            idle = self._idle.get(fingerprint)
+            session = idle.pop() if idle else None
+            if session:
+                self._checkout(session, shared_key)
+                return session
+
+        permit = self.breaker.check()
+        verbose_logger.info(f"SandboxPool: create sandbox, fingerprint={fingerprint}, requirements={requirements}")
+        session = SandboxSession(self.sandbox_config, requirements, self.runtime_code, self.breaker, permit)
+        with self._lock:
+            self._checkout(session, shared_key)
+        return session
+
+    def _checkout(self, session: SandboxSession, shared_key: tuple[str, str | None] | None):
+        session.inflight = 1
+        session.served += 1
+        session.shared_key = shared_key
+        if shared_key:
+            self._shared.setdefault(shared_key, []).append(session)
+
+    def release(self, session: SandboxSession, reusable: bool = True, exec_time: float | None = None):
+        with self._lock:
+            stats = self._stats.get(session.fingerprint)
+            if stats and exec_time is not None:
+                stats.exec_time += EXEC_TIME_ALPHA * (exec_time - stats.exec_time)
+            session.inflight -= 1
+            if not reusable:
+                session.broken = True
+            if session.inflight > 0:
+                return
+            if session.shared_key:
+                sessions = self._shared[session.shared_key]
+                sessions.remove(session)
+                if not sessions:
+                    del self._shared[session.shared_key]
+                session.shared_key = None
+            if not session.broken and stats:
+                idle = self._idle.setdefault(session.fingerprint, deque())
+                if len(idle) < stats.target:
+                    if not self.reset:
+                        session.served = 0
+                        idle.append(session)
+                        return
+                    if self._warmer is not None and not self._closed.is_set():
+                        # 重置需要一次内核往返，不占用调用的响应时间
+                        stats.warming += 1
+                        self._recycling.add(session)
+                        self._warmer.submit(self._recycle, session, stats)
+                        return
+        self._reaper.submit(session)
+
+    def _recycle(self, session: SandboxSession, stats: EnvStats):
+        reusable = session.reset()
+        with self._lock:
+            session.served = 0
+            stats.warming -= 1
+            self._recycling.discard(session)
+            idle = self._idle.setdefault(session.fingerprint, deque())
+            if reusable and not self._closed.is_set() and len(idle) < stats.target:
+                idle.append(session)
+                return
+        self._reaper.submit(session)
+
+    def prewarm(self, requirements: List[str]):
+        """为新注册的工具预热运行环境，至少保留一个空闲沙箱直到缩容滞后期结束"""
+        if self.max_size == 0:
+            return
+        fingerprint = env_fingerprint(requirements)
+        with self._lock:
+            stats = self._get_stats(fingerprint, requirements)
+            stats.target = max(stats.target, min(max(self.min_size, 1), self.max_size))
+            stats.raised_at = time.monotonic()
+            self._schedule_warm(fingerprint, stats)
+
+    def autoscale(self):
+        """按最新负载统计调整各环境的预热沙箱数：补足不足的，销毁缩容后多余的"""
+        now = time.monotonic()
+        surplus = []
+        with self._lock:
+            for fingerprint, stats in self._stats.items():
+                self._rescale(stats, now)
+                idle = self._idle.get(fingerprint)
+                while idle and len(idle) > stats.target:
+                    surplus.append(idle.popleft())
+                self._schedule_warm(fingerprint, stats)
+        for session in surplus:
+            verbose_logger.info(f"SandboxPool: scale down, fingerprint={session.fingerprint}")
+            self._reaper.submit(session)
+
+    def _autoscale_loop(self):
+        while not self._closed.wait(self.scale_interval):
+            try:
+                self.autoscale()
+            except Exception as e:
+                verbose_logger.error(f"SandboxPool autoscale error: {e}")
+
+    def _get_stats(self, fingerprint: str, requirements: List[str]) -> EnvStats:
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            stats = self._stats[fingerprint] = EnvStats(requirements=list(requirements), target=self.min_size)
+        return stats
+
+    def _record_arrival(self, fingerprint: str, requirements: List[str], weight: float):
+        if self.max_size == 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            stats = self._get_stats(fingerprint, requirements)
+            stats.arrivals.append((now, weight))
+            self._rescale(stats, now)
+            self._schedule_warm(fingerprint, stats)
+
+    def _rescale(self, stats: EnvStats, now: float):
+        while stats.arrivals and stats.arrivals[0][0] < now - self.scale_window:
+            stats.arrivals.popleft()
+        rate = sum(weight for _, weight in stats.arrivals) / self.scale_window
+        desired = math.ceil(rate * stats.exec_time * self.headroom)
+        desired = min(max(desired, self.min_size), self.max_size)
+        if desired >= stats.target:
+            stats.target = desired
+            stats.raised_at = now
+        elif now - stats.raised_at >= self.scale_down_delay:
+            stats.target = desired
+
+    def _schedule_warm(self, fingerprint: str, stats: EnvStats):
+        if self._warmer is None or self._closed.is_set():
+            return
+        deficit = stats.target - len(self._idle.get(fingerprint, ())) - stats.warming
+        for _ in range(max(deficit, 0)):
+            stats.warming += 1
+            self._warmer.submit(self._warm, fingerprint, stats)
+
+    def _warm(self, fingerprint: str, stats: EnvStats):
+        try:
+            permit = self.breaker.check()
+            verbose_logger.info(f"SandboxPool: warm sandbox, fingerprint={fingerprint}, requirements={stats.requirements}")
+            session = SandboxSession(self.sandbox_config, stats.requirements, self.runtime_code, self.breaker, permit)
+        except Exception as e:
+            verbose_logger.error(f"SandboxPool warm error, fingerprint={fingerprint}: {e}")
+            with self._lock:
+                stats.warming -= 1
+            return
+        with self._lock:
+            stats.warming -= 1
+            idle = self._idle.setdefault(fingerprint, deque())
+            if not self._closed.is_set() and len(idle) < stats.target:
+                idle.append(session)
+                return
+        self._reaper.submit(session)
+
+    def close(self):
+        self._closed.set()
+        if self._warmer:
+            self._warmer.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            sessions.extend(self._recycling)
+            self._idle.clear()
+            self._recycling.clear()
+        for session in sessions:
+            self._reaper.submit(session)
+        self._reaper.close()
@@ -0,0 +1,270 @@
+"""沙箱内核运行时
+
+在每个沙箱内核中只执行一次的预置代码，以及注入到工具模块命名空间中的共享对象。
+"""
+
+import json
+from typing import Any
+
+import httpx
+
+DEFAULT_HTTP_POOL_CONFIG = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "timeout": 10.0,
+}
+
+# 工具通过注入的 http_client / async_http_client 复用 keep-alive 连接池，
+# 连接随预热沙箱一起保留，避免每次调用重新建立 TCP/TLS 连接
+HTTP_CLIENT_RUNTIME = """
+try:
+    import httpx as _mcpbox_httpx
+except ImportError:
+    _mcpbox_httpx = None
+
+_mcpbox_injected = globals().setdefault("_mcpbox_injected", {{}})
+if _mcpbox_httpx is not None and "http_client" not in _mcpbox_injected:
+    _mcpbox_limits = _mcpbox_httpx.Limits(
+        max_connections={max_connections},
+        max_keepalive_connections={max_keepalive_connections},
+        keepalive_expiry={keepalive_expiry},
+    )
+    _mcpbox_injected["http_client"] = _mcpbox_httpx.Client(limits=_mcpbox_limits, timeout={timeout})
+    _mcpbox_injected["async_http_client"] = _mcpbox_httpx.AsyncClient(limits=_mcpbox_limits, timeout={timeout})
+"""
+
+# 内核中常驻一个后台事件循环线程，async 工具提交到该循环后立即返回，
+# 由宿主端轮询 _mcpbox_collect 收集已完成的调用，多个调用可在同一个预热沙箱中并发执行
+ASYNC_RUNTIME = """
+import asyncio as _mcpbox_asyncio
+import concurrent.futures as _mcpbox_futures
+import json as _mcpbox_json
+import threading as _mcpbox_threading
+import traceback as _mcpbox_traceback
+
+if "_mcpbox_loop" not in globals():
+    _mcpbox_loop = _mcpbox_asyncio.new_event_loop()
+    _mcpbox_threading.Thread(target=_mcpbox_loop.run_forever, name="mcpbox-loop", daemon=True).start()
+    _mcpbox_calls = {{}}
+
+def _mcpbox_submit(call_id, coro):
+    _mcpbox_calls[call_id] = _mcpbox_asyncio.run_coroutine_threadsafe(coro, _mcpbox_loop)
+
+def _mcpbox_cancel(call_id):
+    future = _mcpbox_calls.pop(call_id, None)
+    if future is not None:
+        future.cancel()
+
+def _mcpbox_collect(wait):
+    pending = list(_mcpbox_calls.items())
+    if pending:
+        _mcpbox_futures.wait([f for _, f in pending], timeout=wait, return_when=_mcpbox_futures.FIRST_COMPLETED)
+    done = {{}}
+    for call_id, future in pending:
+        if not future.done():
+            continue
+        _mcpbox_calls.pop(call_id, None)
+        if future.cancelled():
+            done[call_id] = {{"error": {{"name": "CancelledError", "value": "", "traceback": ""}}}}
+        elif future.exception() is not None:
+            exc = future.exception()
+            done[call_id] = {{"error": {{
+                "name": type(exc).__name__,
+                "value": str(exc),
+                "traceback": "".join(_mcpbox_traceback.format_exception(type(exc), exc, exc.__traceback__)),
+            }}}}
+        else:
+            result = future.result()
+            done[call_id] = {{"text": None if result is None else repr(result)}}
+    print({marker!r} + _mcpbox_json.dumps(done))
+"""
+
+# 预热沙箱在两次调用之间恢复到加载运行时后的状态，不必销毁重建即可隔离前后两次调用（可能来自不同租户）：
+# 工具模块用缓存的代码对象重新执行，得到全新的模块对象（模块级变量、嵌套容器、类属性都回到初始值）；
+# 恢复环境变量、工作目录和注入的 HTTP 客户端配置并清空其 cookie；删除新增的全局变量、输入输出历史
+# 和临时文件，取消残留的后台任务，结束调用期间派生的子进程。无法清理干净时抛出异常，由宿主端销毁沙箱。
+# 工具导入的第三方模块（sys.modules）中的状态不在重置范围内
+RESET_RUNTIME = """
+import builtins as _mcpbox_builtins
+import os as _mcpbox_os
+import shutil as _mcpbox_shutil
+import signal as _mcpbox_signal
+import tempfile as _mcpbox_tempfile
+import time as _mcpbox_time
+import types as _mcpbox_types
+
+# 注册名 -> (摘要, 模块, 代码对象)
+_mcpbox_modules = globals().setdefault("_mcpbox_modules", {})
+
+def _mcpbox_load(name, digest, code):
+    module = _mcpbox_types.ModuleType(name)
+    module.__dict__.update(_mcpbox_injected)
+    exec(code, module.__dict__)
+    _mcpbox_modules[name] = (digest, module, code)
+
+def _mcpbox_client_state(client):
+    return {
+        "headers": client.headers.copy(),
+        "params": client.params,
+        "auth": client.auth,
+        "base_url": client.base_url,
+        "timeout": client.timeout,
+        "follow_redirects": client.follow_redirects,
+        "event_hooks": {key: list(hooks) for key, hooks in client.event_hooks.items()},
+    }
+
+def _mcpbox_restore_client(client, state):
+    for key, value in state.items():
+        setattr(client, key, value)
+    client.cookies.clear()
+
+def _mcpbox_children():
+    parents = {}
+    for entry in _mcpbox_os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[0] != "Z":
+            parents[int(entry)] = int(fields[1])
+    children, frontier = [], [_mcpbox_os.getpid()]
+    while frontier:
+        parent = frontier.pop()
+        for pid, ppid in parents.items():
+            if ppid == parent:
+                children.append(pid)
+                frontier.append(pid)
+    return children
+
+async def _mcpbox_cancel_tasks():
+    current = _mcpbox_asyncio.current_task()
+    for task in _mcpbox_asyncio.all_tasks():
+        if task is not current:
+            task.cancel()
+
+def _mcpbox_reset():
+    dirty = []
+    for call_id in list(_mcpbox_calls):
+        _mcpbox_cancel(call_id)
+    _mcpbox_asyncio.run_coroutine_threadsafe(_mcpbox_cancel_tasks(), _mcpbox_loop).result(timeout=1)
+
+    _mcpbox_os.environ.clear()
+    _mcpbox_os.environ.update(_mcpbox_baseline["environ"])
+    _mcpbox_os.chdir(_mcpbox_baseline["cwd"])
+    for key, state in _mcpbox_baseline["clients"].items():
+        _mcpbox_restore_client(_mcpbox_injected[key], state)
+
+    for name, (digest, _, code) in list(_mcpbox_modules.items()):
+        try:
+            _mcpbox_load(name, digest, code)
+        except Exception:
+            # 重新执行失败的模块下次调用时按源码重新加载
+            del _mcpbox_modules[name]
+
+    user_ns = globals()
+    for key in [key for key in user_ns if key not in _mcpbox_baseline["globals"]]:
+        del user_ns[key]
+    shell = getattr(_mcpbox_builtins, "get_ipython", lambda: None)()
+    if shell is not None:
+        shell.run_line_magic("reset", "-f in")
+        shell.run_line_magic("reset", "-f out")
+
+    for directory, entries in _mcpbox_baseline["files"].items():
+        for entry in set(_mcpbox_os.listdir(directory)) - entries:
+            path = _mcpbox_os.path.join(directory, entry)
+            try:
+                if _mcpbox_os.path.isdir(path) and not _mcpbox_os.path.islink(path):
+                    _mcpbox_shutil.rmtree(path)
+                else:
+                    _mcpbox_os.remove(path)
+            except OSError:
+                dirty.append(path)
+
+    strays = [pid for pid in _mcpbox_children() if pid not in _mcpbox_baseline["children"]]
+    for pid in strays:
+        try:
+            _mcpbox_os.kill(pid, _mcpbox_signal.SIGKILL)
+        except OSError:
+            pass
+    if strays:
+        _mcpbox_time.sleep(0.1)
+        for pid in strays:
+            try:
+                _mcpbox_os.waitpid(pid, _mcpbox_os.WNOHANG)
+            except ChildProcessError:
+                pass
+        alive = [pid for pid in _mcpbox_children() if pid not in _mcpbox_baseline["children"]]
+        if alive:
+            dirty.append(f"processes {alive}")
+    if dirty:
+        raise RuntimeError(f"sandbox reset incomplete: {dirty}")
+
+if "_mcpbox_baseline" not in globals():
+    _mcpbox_baseline = {
+        "globals": set(globals()) | {"_mcpbox_baseline"},
+        "files": {_mcpbox_tempfile.gettempdir(): set(_mcpbox_os.listdir(_mcpbox_tempfile.gettempdir()))},
+        "children": set(_mcpbox_children()),
+        "environ": dict(_mcpbox_os.environ),
+        "cwd": _mcpbox_os.getcwd(),
+        "clients": {key: _mcpbox_client_state(client) for key, client in _mcpbox_injected.items()
+                    if key in ("http_client", "async_http_client")},
+    }
+"""
+
+ASYNC_RESULT_MARKER = "__MCPBOX_ASYNC_RESULTS__"
+
+
+def get_http_pool_config(http_pool_config: dict[str, Any] | None = None) -> dict[str, Any]:
+    config = dict(DEFAULT_HTTP_POOL_CONFIG)
+    if http_pool_config:
+        config.update(http_pool_config)
+    return config
+
+
+def build_runtime_code(http_pool_config: dict[str, Any] | None = None) -> str:
+    """生成沙箱内核预置代码，重复执行时不会重建已有的客户端和事件循环
+
+    重置用的基线在预置代码末尾记录，依赖已在此之前安装完毕
+    """
+    return (HTTP_CLIENT_RUNTIME.format(**get_http_pool_config(http_pool_config))
+            + ASYNC_RUNTIME.format(marker=ASYNC_RESULT_MARKER)
+            + RESET_RUNTIME)
+
+
+def build_collect_code(wait: float) -> str:
+    return f"_mcpbox_collect({wait!r})"
+
+
+def build_reset_code() -> str:
+    return "_mcpbox_reset()"
+
+
+def build_cancel_code(call_id: str) -> str:
+    return f"_mcpbox_cancel({call_id!r})"
+
+
+def parse_collect_output(stdout: list[str]) -> dict[str, dict[str, Any]]:
+    """从 _mcpbox_collect 的输出中解析已完成调用的结果"""
+    done = {}
+    for line in "".join(stdout).splitlines():
+        if line.startswith(ASYNC_RESULT_MARKER):
+            done.update(json.loads(line[len(ASYNC_RESULT_MARKER):]))
+    return done
+
+
+def create_http_clients(http_pool_config: dict[str, Any] | None = None) -> dict[str, Any]:
+    """本地模式下注入工具命名空间的共享 HTTP 客户端"""
+    config = get_http_pool_config(http_pool_config)
+    limits = httpx.Limits(
+        max_connections=config["max_connections"],
+        max_keepalive_connections=config["max_keepalive_connections"],
+        keepalive_expiry=config["keepalive_expiry"],
+    )
+    return {
+        "http_client": httpx.Client(limits=limits, timeout=config["timeout"]),
+        "async_http_client": httpx.AsyncClient(limits=limits, timeout=config["timeout"]),
+    }
@@ -0,0 +1,167 @@
+"""工具调用调度器
+
+同一个 McpBox 上，一个租户一次发起的大批调用会占满沙箱，其他租户的交互式调用只能排在后面。
+调度器限制同时执行的沙箱调用数，超出的调用按租户排队：
+
+- 优先级高的调用先执行，同一优先级内各租户按权重公平轮转（按权重折算的虚拟时间最小的租户先执行）
+- 刚开始排队的租户从当前最小虚拟时间起算，空闲期间不积攒额度
+- 排队中的调用被取消时直接出队，不占用执行名额
+- 没有排队和执行中调用的租户随即移除，调度开销只与活跃租户数有关
+- 优先级限制在 [-max_priority, max_priority] 之间，调用方不能无限抬高自己的优先级
+"""
+
+import asyncio
+import contextlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from mcp.server.auth.middleware.bearer_auth import AuthenticatedUser
+
+DEFAULT_TENANT = "default"
+TENANT_HEADER = "x-mcp-tenant"
+PRIORITY_HEADER = "x-mcp-priority"
+
+
+@dataclass
+class TenantQueue:
+    weight: float
+    # 已分配执行名额的虚拟时间，每执行一次增加 1 / weight
+    vtime: float = 0.0
+    # 执行中的调用数
+    running: int = 0
+    # 优先级 -> 等待中的调用
+    waiting: dict[int, deque[asyncio.Future]] = field(default_factory=dict)
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """解析 "租户:权重" 列表（逗号分隔），例如 "alice:4,bob:1" """
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tenant, _, weight = item.partition(":")
+        weights[tenant.strip()] = float(weight or 1)
+    return weights
+
+
+def request_identity(request_context: Any) -> tuple[str | None, str | None, int]:
+    """从 MCP 请求上下文取 (认证用户, 调用方声明的租户, 优先级)
+
+    声明的租户和优先级来自请求头 X-MCP-Tenant / X-MCP-Priority 或请求 _meta 中的 tenant / priority，
+    是否采信由调用方决定；无法解析的优先级按 0 处理
+    """
+    request = request_context.request if request_context else None
+    meta = request_context.meta.model_extra if request_context and request_context.meta else None
+    headers = getattr(request, "headers", None) or {}
+    user = getattr(request, "scope", {}).get("user")
+    user = user.username if isinstance(user, AuthenticatedUser) else None
+    tenant = headers.get(TENANT_HEADER) or (meta or {}).get("tenant")
+    priority = headers.get(PRIORITY_HEADER) or (meta or {}).get("priority") or 0
+    try:
+        priority = int(priority)
+    except (TypeError, ValueError):
+        priority = 0
+    return user, tenant, priority
+
+
+class FairScheduler:
+    def __init__(self, max_concurrent: int = 0, weights: dict[str, float] | None = None,
+                 default_weight: float = 1.0, max_priority: int = 10):
+        # 0 表示不限制，调用直接执行
+        self.max_concurrent = max_concurrent
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_priority = max_priority
+        self.running = 0
+        self._tenants: dict[str, TenantQueue] = {}
+        self._waiting = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant: str | None = None, priority: int = 0):
+        """在租户的队列中等待一个执行名额，退出时归还"""
+        if self.max_concurrent <= 0:
+            yield
+            return
+        tenant = tenant or DEFAULT_TENANT
+        await self.acquire(tenant, priority)
+        try:
+            yield
+        finally:
+            self.release(tenant)
+
+    async def acquire(self, tenant: str, priority: int = 0):
+        priority = max(-self.max_priority, min(priority, self.max_priority))
+        queue = self._tenant(tenant)
+        if self.running < self.max_concurrent and self._waiting == 0:
+            self._start(queue)
+            return
+        if not any(queue.waiting.values()):
+            # 重新开始排队的租户不能用空闲期间的虚拟时间插到其他租户前面
+            queue.vtime = max(queue.vtime, self._min_vtime())
+        future = asyncio.get_running_loop().create_future()
+        queue.waiting.setdefault(priority, deque()).append(future)
+        self._waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # 已分到名额后才被取消，归还名额
+                self.release(tenant)
+            else:
+                waiting = queue.waiting.get(priority)
+                if waiting is not None:
+                    with contextlib.suppress(ValueError):
+                        waiting.remove(future)
+                    if not waiting:
+                        del queue.waiting[priority]
+                self._waiting -= 1
+                self._discard_idle(tenant)
+            raise
+
+    def release(self, tenant: str):
+        self.running -= 1
+        self._tenants[tenant].running -= 1
+        self._discard_idle(tenant)
+        while self.running < self.max_concurrent:
+            picked = self._next()
+            if picked is None:
+                return
+            queue, priority = picked
+            waiting = queue.waiting[priority]
+            future = waiting.popleft()
+            if not waiting:
+                del queue.waiting[priority]
+            if future.cancelled():
+                # 调用方正在处理取消，由它自己更新等待计数
+                continue
+            self._waiting -= 1
+            self._start(queue)
+            future.set_result(None)
+
+    def _tenant(self, tenant: str) -> TenantQueue:
+        queue = self._tenants.get(tenant)
+        if queue is None:
+            queue = self._tenants[tenant] = TenantQueue(weight=self.weights.get(tenant, self.default_weight))
+        return queue
+
+    def _discard_idle(self, tenant: str):
+        queue = self._tenants.get(tenant)
+        if queue is not None and queue.running == 0 and not queue.waiting:
+            del self._tenants[tenant]
+
+    def _start(self, queue: TenantQueue):
+        self.running += 1
+        queue.running += 1
+        queue.vtime += 1 / queue.weight
+
+    def _min_vtime(self) -> float:
+        active = [queue.vtime for queue in self._tenants.values() if queue.waiting]
+        return min(active, default=0.0)
+
+    def _next(self) -> tuple[TenantQueue, int] | None:
+        """最高优先级中虚拟时间最小的租户"""
+        best = None
+        for queue in self._tenants.values():
+            for priority in queue.waiting:
+                if best is None or (-priority, queue.vtime) < (-best[1], best[0].vtime):
+                    best = (queue, priority)
+        return best
@@ -0,0 +1,152 @@
+"""MCP 工具源码解析
+
+一次 AST 解析得到工具模块的全部信息：依赖声明、``@mcp.tool`` 装饰器元数据、
+函数签名，以及去掉装饰器后可直接在沙箱中执行的模块代码。
+"""
+
+import ast
+import hashlib
+import re
+from dataclasses import dataclass, field
+from textwrap import dedent
+from typing import Any, List, Optional
+
+REQUIREMENTS_PATTERN = re.compile(r'<requirements>(.*?)</requirements>', re.DOTALL)
+ESCAPED_CHAR_PATTERN = re.compile(r'\\\\([nrt"])')
+# Python 解析器认作换行的只有这三种；str.splitlines 还会在 \u2028、\x0c 等字符处断行，行号会错位
+LINE_BREAK_PATTERN = re.compile(r'\r\n|\r|\n')
+# 注册时就要用到的装饰器参数（路由用的工具名），必须是字符串字面量
+LITERAL_KWARGS = ("name",)
+
+
+class ToolSourceError(ValueError):
+    """工具源码能解析但不符合注册要求"""
+
+
+@dataclass
+class ToolSpec:
+    """模块中一个 ``@mcp.tool`` 函数的元数据"""
+    name: str
+    func_name: str
+    is_async: bool
+    params: List[str]
+    required_params: List[str]
+    decorator_kwargs: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ToolSource:
+    """解析后的工具模块"""
+    code: str
+    digest: str
+    tree: ast.Module
+    sandbox_code: str
+    requirements: List[str]
+    tools: List[ToolSpec]
+
+    def get_tool(self, name: str) -> Optional[ToolSpec]:
+        for spec in self.tools:
+            if spec.name == name:
+                return spec
+        return None
+
+    def compile(self, filename: str = "<mcp_tool>"):
+        """直接由已解析的 AST 编译，避免 exec 时再次解析源码"""
+        return compile(self.tree, filename, "exec")
+
+
+def _is_mcp_tool_decorator(node: ast.expr) -> bool:
+    target = node.func if isinstance(node, ast.Call) else node
+    return (
+        isinstance(target, ast.Attribute)
+        and target.attr == "tool"
+        and isinstance(target.value, ast.Name)
+        and target.value.id == "mcp"
+    )
+
+
+def _decorator_kwargs(node: ast.expr) -> dict[str, Any]:
+    kwargs = {}
+    if not isinstance(node, ast.Call):
+        return kwargs
+    for keyword in node.keywords:
+        if keyword.arg is None:
+            continue
+        try:
+            value = ast.literal_eval(keyword.value)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            # 非字面量参数（变量、表达式、不可哈希的字典键等）只能在 exec 时求值，这里跳过
+            value = None
+            if keyword.arg not in LITERAL_KWARGS:
+                continue
+        if keyword.arg in LITERAL_KWARGS and not isinstance(value, str):
+            raise ToolSourceError(f"@mcp.tool({keyword.arg}=...) at line {keyword.value.lineno} "
+                                  f"must be a string literal")
+        kwargs[keyword.arg] = value
+    return kwargs
+
+
+def _parse_requirements(tree: ast.Module) -> List[str]:
+    for stmt in tree.body:
+        if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+                and isinstance(stmt.value.value, str)):
+            continue
+        requirements_match = REQUIREMENTS_PATTERN.search(stmt.value.value)
+        if requirements_match:
+            raw_requirements = requirements_match.group(1).strip()
+            return [req.strip() for req in raw_requirements.split('\n') if req.strip()]
+    return []
+
+
+def _parse_tool_spec(node: ast.FunctionDef | ast.AsyncFunctionDef, decorator: ast.expr) -> ToolSpec:
+    args = node.args
+    positional = args.posonlyargs + args.args
+    params = [arg.arg for arg in positional + args.kwonlyargs]
+    first_default = len(positional) - len(args.defaults)
+    required = [arg.arg for arg in positional[:first_default]]
+    required += [arg.arg for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is None]
+
+    decorator_kwargs = _decorator_kwargs(decorator)
+    return ToolSpec(
+        name=decorator_kwargs.get("name") or node.name,
+        func_name=node.name,
+        is_async=isinstance(node, ast.AsyncFunctionDef),
+        params=params,
+        required_params=required,
+        decorator_kwargs=decorator_kwargs,
+    )
+
+
+def parse_tool_source(code: str) -> ToolSource:
+    """解析工具源码，语法错误时抛出 SyntaxError，工具名不是字符串字面量时抛出 ToolSourceError"""
+    code = dedent(code)
+    tree = ast.parse(code)
+    lines = LINE_BREAK_PATTERN.split(code)
+    if lines[-1] == "":
+        lines.pop()
+
+    tools = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not _is_mcp_tool_decorator(decorator):
+                continue
+            tools.append(_parse_tool_spec(node, decorator))
+            # 装饰器独占 lineno..end_lineno 行，置空而不删除以保持沙箱报错行号一致
+            for i in range(decorator.lineno - 1, decorator.end_lineno):
+                lines[i] = ""
+
+    return ToolSource(
+        code=code,
+        digest=hashlib.sha256(code.encode('utf-8')).hexdigest()[:16],
+        tree=tree,
+        sandbox_code="\n".join(lines) + "\n",
+        requirements=_parse_requirements(tree),
+        tools=tools,
+    )
+
+
+def unescape_tool_source(raw_code: str) -> str:
+    """还原被客户端二次转义的源码（\\\\n -> \\n 等）"""
+    return ESCAPED_CHAR_PATTERN.sub(lambda m: f'\\{m.group(1)}', raw_code)
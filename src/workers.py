@@ -0,0 +1,158 @@
+"""多 worker 运行 McpBox
+
+主进程绑定监听端口后启动 N 个 worker 进程，各 worker 在同一组监听 socket 上 accept，可以利用多个 CPU 核心。
+
+- 工具注册表：各 worker 定期与存储（数据库或配置文件）对齐，见 McpBox.sync_registry
+- SSE 会话：会话只存在于建立 /sse 长连接的 worker 中，worker i 的消息端点为 /messages/i/，
+  落到其他 worker 的消息请求经 worker i 的 unix socket 转发给它
+- streamable-http：多 worker 时以无状态模式运行，任一 worker 都能处理请求
+"""
+
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+from typing import Any
+
+import httpx
+import uvicorn
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# 支持两种导入方式
+try:
+    from .utils.logging import verbose_logger
+except ImportError:
+    import sys
+    from pathlib import Path
+    project_root = Path(__file__).parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from src.utils.logging import verbose_logger
+
+MESSAGE_PREFIX = "/messages/"
+# 转发时不透传的逐跳头
+HOP_HEADERS = {b"connection", b"content-length", b"transfer-encoding", b"keep-alive"}
+
+
+def worker_socket_path(run_dir: str, index: int) -> str:
+    return os.path.join(run_dir, f"worker-{index}.sock")
+
+
+class SessionRouter:
+    """把发往其他 worker 会话的 SSE 消息转发给持有该会话的 worker，其余请求交给本 worker 的应用"""
+
+    def __init__(self, app: ASGIApp, index: int, run_dir: str):
+        self.app = app
+        self.index = index
+        self.run_dir = run_dir
+        self._clients: dict[int, httpx.AsyncClient] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(MESSAGE_PREFIX):
+            target = scope["path"][len(MESSAGE_PREFIX):].split("/", 1)[0]
+            if target.isdigit() and int(target) != self.index:
+                await self.forward(int(target), scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    def _client(self, target: int) -> httpx.AsyncClient:
+        client = self._clients.get(target)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(uds=worker_socket_path(self.run_dir, target))
+            client = self._clients[target] = httpx.AsyncClient(transport=transport, timeout=30)
+        return client
+
+    async def forward(self, target: int, scope: Scope, receive: Receive, send: Send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        # 保留原始 Host 头，目标 worker 的传输安全校验与直连时一致
+        headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"] if k.lower() not in HOP_HEADERS]
+        url = f"http://mcpbox{scope['path']}"
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        try:
+            upstream = await self._client(target).request(scope["method"], url, headers=headers, content=body)
+            response = Response(
+                content=upstream.content,
+                status_code=upstream.status_code,
+                headers={k: v for k, v in upstream.headers.items() if k.lower().encode("latin-1") not in HOP_HEADERS},
+            )
+        except httpx.TransportError as e:
+            verbose_logger.error(f"SessionRouter: forward to worker {target} fail: {e}")
+            response = Response(content="Could not find session", status_code=404)
+        await response(scope, receive, send)
+
+
+def _run_worker(index: int, host: str, port: int, sockets: list[socket.socket], run_dir: str,
+                worker_config: dict[str, Any]):
+    # 延迟导入，避免与 mcp_box 循环导入
+    try:
+        from .mcp_box import create_mcp_box
+    except ImportError:
+        from src.mcp_box import create_mcp_box
+
+    uds_path = worker_socket_path(run_dir, index)
+    if os.path.exists(uds_path):
+        os.unlink(uds_path)
+    uds = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    uds.bind(uds_path)
+    uds.listen(128)
+
+    mcp_box = create_mcp_box(host, port, **worker_config)
+    mcp_box.mcp.settings.message_path = f"{MESSAGE_PREFIX}{index}/"
+    mcp_box.mcp.settings.stateless_http = True
+    app = SessionRouter(mcp_box.create_app(), index, run_dir)
+    verbose_logger.info(f"McpBox worker {index} started, pid={os.getpid()}")
+    config = uvicorn.Config(app, host=host, port=port, log_level=mcp_box.mcp.settings.log_level.lower())
+    uvicorn.Server(config).run(sockets=[*sockets, uds])
+
+
+def serve_workers(host: str, port: int, workers: int, extra_ports: tuple[int, ...] = (),
+                  worker_config: dict[str, Any] | None = None):
+    """绑定端口后启动 workers 个 worker 进程，worker 异常退出时按原编号重启，收到 SIGINT/SIGTERM 时全部停止"""
+    sockets = [socket.create_server((host, p)) for p in (port, *extra_ports)]
+    run_dir = tempfile.mkdtemp(prefix="mcpbox-")
+    context = multiprocessing.get_context("spawn")
+    processes: dict[int, multiprocessing.Process] = {}
+
+    def spawn(index: int):
+        process = context.Process(
+            target=_run_worker, name=f"mcpbox-worker-{index}",
+            args=(index, host, port, sockets, run_dir, worker_config or {}),
+        )
+        process.start()
+        processes[index] = process
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    verbose_logger.info(f"Start MCP Box Server host={host}, ports={[port, *extra_ports]}, workers={workers}")
+    for index in range(workers):
+        spawn(index)
+    try:
+        while not stop.wait(1):
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    verbose_logger.error(f"McpBox worker {index} exited with code {process.exitcode}, restarting")
+                    spawn(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            # SSE 长连接可能拖住优雅退出
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+        for sock in sockets:
+            sock.close()
+        shutil.rmtree(run_dir, ignore_errors=True)
@@ -0,0 +1,73 @@
+"""在当前进程内执行代码的假沙箱，替换 e2b Sandbox 以便不连接 E2B 测试沙箱调用流程"""
+
+import ast
+import io
+import threading
+import time
+from contextlib import redirect_stdout
+
+from e2b_code_interpreter.models import Execution, ExecutionError, Logs, Result
+
+
+class FakeSandbox:
+    created = 0
+    killed = 0
+    # 创建沙箱前等待的秒数、是否抛出异常，测试中按需修改
+    boot_delay = 0.0
+    boot_error: Exception | None = None
+    # kill 前若干次失败
+    kill_failures = 0
+
+    _lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        if FakeSandbox.boot_delay:
+            threading.Event().wait(FakeSandbox.boot_delay)
+        if FakeSandbox.boot_error is not None:
+            raise FakeSandbox.boot_error
+        FakeSandbox.created += 1
+        self.namespace = {"__name__": "__main__"}
+        self.commands = self
+        self.kill_times: list[float] = []
+
+    @classmethod
+    def install(cls):
+        """替换沙箱池使用的 Sandbox，并清零计数"""
+        import src.sandbox_pool as sandbox_pool
+        sandbox_pool.Sandbox = cls
+        cls.created = cls.killed = cls.kill_failures = 0
+        cls.boot_delay = 0.0
+        cls.boot_error = None
+
+    def run(self, cmd: str, **kwargs):
+        """commands.run：依赖安装不做任何事"""
+
+    def run_code(self, code: str, timeout: float | None = None, **kwargs) -> Execution:
+        # 各沙箱共用一个进程，cell 串行执行；最后一个表达式的值作为结果返回，cell 的标准输出记入 logs
+        with FakeSandbox._lock:
+            tree = ast.parse(code)
+            last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+            results = []
+            stdout = io.StringIO()
+            try:
+                with redirect_stdout(stdout):
+                    exec(compile(tree, "<cell>", "exec"), self.namespace)
+                    if last is not None:
+                        value = eval(compile(ast.Expression(last.value), "<cell>", "eval"), self.namespace)
+                        if value is not None:
+                            results.append(Result(text=repr(value), is_main_result=True))
+            except Exception as e:
+                return Execution(results=[], logs=self._logs(stdout),
+                                 error=ExecutionError(name=type(e).__name__, value=str(e), traceback=""))
+            return Execution(results=results, logs=self._logs(stdout))
+
+    @staticmethod
+    def _logs(stdout: io.StringIO) -> Logs:
+        output = stdout.getvalue()
+        return Logs(stdout=[output] if output else [])
+
+    def kill(self):
+        self.kill_times.append(time.monotonic())
+        if len(self.kill_times) <= FakeSandbox.kill_failures:
+            raise RuntimeError("kill failed")
+        FakeSandbox.killed += 1
@@ -0,0 +1,54 @@
+import sys
+import time
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, PROBE, CircuitBreaker, CircuitOpenError  # noqa: E402
+
+
+def run():
+    print("Running circuit breaker smoke tests...\n")
+
+    breaker = CircuitBreaker(error_rate=0.5, slow_threshold=1.0, min_calls=4, cooldown=0.2)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    # 超过耗时阈值的成功请求也计为失败
+    breaker.record(True, 2.0)
+    assert breaker.state == OPEN and not breaker.allow()
+    try:
+        breaker.check()
+        raise AssertionError("open breaker should reject")
+    except CircuitOpenError as e:
+        print("Rejected:", e)
+
+    # 冷却期过后只放行一个探测请求，探测失败重新打开
+    time.sleep(0.25)
+    assert breaker.allow() == PROBE and breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record(False, 0.1, PROBE)
+    assert breaker.state == OPEN
+
+    # 探测期间完成的其他请求（打开前放行）不影响状态，也不结束探测
+    time.sleep(0.25)
+    permit = breaker.check()
+    assert permit == PROBE
+    breaker.record(True, 0.1)
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+
+    # 探测成功恢复
+    breaker.record(True, 0.1, permit)
+    assert breaker.state == CLOSED and breaker.allow() is True
+
+    print("\nAll circuit breaker smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from e2b_code_interpreter import TimeoutException  # noqa: E402
+from mcp.server.fastmcp.exceptions import ToolError  # noqa: E402
+
+from src.fast_mcp_sandbox import FastMCPBox  # noqa: E402
+from src.tool_source import parse_tool_source  # noqa: E402
+from tests.fake_sandbox import FakeSandbox  # noqa: E402
+
+CODE = '''
+@mcp.tool()
+def add(a: int, b: int = 1):
+    return a + b
+
+@mcp.tool(annotations={"timeout": 0.3})
+def quick(a: int):
+    return a
+'''
+
+OTHER_CODE = '''
+@mcp.tool()
+def echo(text: str):
+    return text
+'''
+
+
+def run():
+    print("Running sandbox call smoke tests...\n")
+
+    FakeSandbox.install()
+    box = FastMCPBox(name="test", sandbox_config={}, trusted_modules={"calc"})
+    tool_source = parse_tool_source(CODE)
+    exec(tool_source.compile(), {"mcp": box})
+    box.store_tool_code("calc", tool_source)
+    other_source = parse_tool_source(OTHER_CODE)
+    exec(other_source.compile(), {"mcp": box})
+    box.store_tool_code("other", other_source)
+    acquired = []
+    acquire = box.sandbox_pool.acquire
+    box.sandbox_pool.acquire = lambda *args: acquired.append(args) or acquire(*args)
+
+    # 参数按签名转换后传入沙箱
+    result = asyncio.run(box.call_tool("add", {"a": "2"}))
+    assert result[0].text == "3" and len(acquired) == 1
+
+    # 不合法的参数在获取沙箱前返回错误
+    try:
+        asyncio.run(box.call_tool("add", {"a": "two"}))
+        raise AssertionError("invalid arguments should be rejected")
+    except ToolError as e:
+        print("Rejected:", str(e).splitlines()[0])
+    assert len(acquired) == 1 and FakeSandbox.created == 1
+
+    # 超时包含获取沙箱的时间：创建沙箱过慢时按时返回，稍后创建好的沙箱归还沙箱池后销毁
+    FakeSandbox.boot_delay = 1.0
+    start = time.monotonic()
+    try:
+        asyncio.run(box.call_tool("quick", {"a": 1}))
+        raise AssertionError("slow sandbox creation should time out")
+    except ToolError as e:
+        print("Timed out:", e)
+    assert time.monotonic() - start < 0.8
+    FakeSandbox.boot_delay = 0.0
+    deadline = time.monotonic() + 5
+    while FakeSandbox.killed < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert FakeSandbox.created == 2 and FakeSandbox.killed == 2
+
+    # 获取沙箱后截止时间已过（剩余时间为 0 时 e2b 不限制执行时间）：不再执行，按超时返回
+    acquire_session = box._acquire_session
+    run_in_session = box._run_in_session
+    ran = []
+
+    async def slow_acquire(*args):
+        session = await acquire_session(*args)
+        time.sleep(0.35)
+        return session
+
+    box._acquire_session = slow_acquire
+    box._run_in_session = lambda *args: ran.append(args) or run_in_session(*args)
+    released = []
+    release = box.sandbox_pool.release
+    box.sandbox_pool.release = lambda session, reusable=True, *args: released.append(reusable) or \
+        release(session, reusable, *args)
+    try:
+        asyncio.run(box.call_tool("quick", {"a": 1}))
+        raise AssertionError("expired deadline should time out")
+    except ToolError as e:
+        assert str(e) == "Tool quick timed out after 0.3s", e
+    # 沙箱没有执行代码，可以继续复用
+    assert not ran and released == [True]
+    box._acquire_session = acquire_session
+    box.sandbox_pool.release = release
+
+    # e2b 的执行超时与调用超时返回同样的错误
+    def e2b_timeout(*args):
+        raise TimeoutException("Execution timed out")
+
+    box._run_in_session = e2b_timeout
+    try:
+        asyncio.run(box.call_tool("quick", {"a": 1}))
+        raise AssertionError("e2b timeout should be reported")
+    except ToolError as e:
+        assert str(e) == "Tool quick timed out after 0.3s", e
+    box._run_in_session = run_in_session
+    assert asyncio.run(box.call_tool("quick", {"a": 1}))[0].text == "1"
+
+    # 熔断期间只有运维配置的可信模块改在当前进程内执行
+    box.sandbox_pool.breaker._open(time.monotonic())
+    assert asyncio.run(box.call_tool("add", {"a": 2, "b": 5}))[0].text == "7"
+    try:
+        asyncio.run(box.call_tool("echo", {"text": "hi"}))
+        raise AssertionError("untrusted module should not fall back to host")
+    except ToolError as e:
+        print("Rejected:", e)
+
+    box.sandbox_pool.close()
+    print("\nAll sandbox call smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,115 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.gateway import HashRing, McpGateway  # noqa: E402
+
+
+class FakeGateway(McpGateway):
+    """用内存中的注册表代替 McpBox 管理接口"""
+
+    def __init__(self, boxes: dict[str, dict[str, str]], shared: bool = False, reject: set[str] = frozenset()):
+        super().__init__(name="test")
+        self.boxes = boxes
+        self.shared = shared
+        self.reject = reject
+        self.ring = HashRing(boxes)
+        # (McpBox, 注册名) -> 注册时收到的查询参数
+        self.params: dict[tuple[str, str], dict[str, str]] = {}
+
+    def connected(self):
+        return [type("Backend", (), {"url": url}) for url in self.boxes]
+
+    async def refresh_tools(self):
+        return []
+
+    async def _manager_request(self, url, method, path, mcp_tool_name=None, code=None, params=None):
+        box = self.boxes[url]
+        if path == "/list_mcp_tool/":
+            return [{'mcp_tool_name': name, 'mcp_tool_code': code, 'tools': [name], 'shared': self.shared,
+                     'user_id': self.params.get((url, name), {}).get('user_id')}
+                    for name, code in box.items()]
+        if path == "/add_mcp_tool/":
+            if mcp_tool_name in box or url in self.reject:
+                return {'result': 1, 'error': "already exists"}
+            box[mcp_tool_name] = code
+            self.params[(url, mcp_tool_name)] = dict(params or {})
+            return {'result': 0}
+        box.pop(mcp_tool_name)
+        return {'result': 0}
+
+
+def run():
+    print("Running gateway smoke tests...\n")
+
+    keys = [f"tool_{i}" for i in range(3000)]
+    ring = HashRing(["box1", "box2", "box3"])
+    before = {key: ring.get(key) for key in keys}
+    counts = {node: list(before.values()).count(node) for node in ring.nodes}
+    assert set(counts) == {"box1", "box2", "box3"} and min(counts.values()) > 600
+    print("Distribution:", counts)
+
+    # 加入节点：只有迁往新节点的键改变归属
+    ring.add("box4")
+    after = {key: ring.get(key) for key in keys}
+    moved = [key for key in keys if after[key] != before[key]]
+    assert all(after[key] == "box4" for key in moved) and len(moved) < len(keys) / 2
+    print("Join moved:", len(moved))
+
+    # 离开节点：恢复原来的归属
+    ring.remove("box4")
+    assert {key: ring.get(key) for key in keys} == before
+    assert HashRing().get("tool_0") is None
+
+    # 迁移：模块只保留在归属 McpBox 上
+    names = [f"module_{i}" for i in range(20)]
+    gateway = FakeGateway({"box1": {name: f"code {name}" for name in names}, "box2": {}})
+    asyncio.run(gateway.rebalance())
+    assert all(gateway.ring.get(name) == url for url, box in gateway.boxes.items() for name in box)
+    assert gateway.boxes["box2"] and sorted(name for box in gateway.boxes.values() for name in box) == sorted(names)
+
+    # 归属 McpBox 注册失败时不从原 McpBox 移除
+    gateway = FakeGateway({"box1": {name: f"code {name}" for name in names}, "box2": {}}, reject={"box2"})
+    asyncio.run(gateway.rebalance())
+    assert len(gateway.boxes["box1"]) == len(names) and not gateway.boxes["box2"]
+
+    # 共用数据库的模块不迁移，避免删除库中唯一的记录
+    gateway = FakeGateway({"box1": {name: f"code {name}" for name in names},
+                           "box2": {name: f"code {name}" for name in names}}, shared=True)
+    asyncio.run(gateway.rebalance())
+    assert len(gateway.boxes["box1"]) == len(gateway.boxes["box2"]) == len(names)
+
+    # 注册请求的 user_id 等查询参数原样转发到归属 McpBox，迁移时带上模块所属用户
+    gateway = FakeGateway({"box1": {}})
+    app = Starlette(routes=[Mount("/add_mcp_tool/", app=gateway.handle_add_mcp_tool)])
+
+    async def add_tool():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway") as client:
+            response = await client.post("/add_mcp_tool/", content="code",
+                                         params={"mcp_tool_name": "module_0", "user_id": "alice", "tag": "x"})
+        return response.json()
+
+    assert asyncio.run(add_tool())["result"] == 0
+    assert gateway.params[("box1", "module_0")] == {"mcp_tool_name": "module_0", "user_id": "alice", "tag": "x"}
+    gateway.boxes["box2"] = {}
+    gateway.ring = HashRing(["box2"])
+    asyncio.run(gateway.rebalance())
+    assert gateway.boxes == {"box1": {}, "box2": {"module_0": "code"}}
+    assert gateway.params[("box2", "module_0")] == {"mcp_tool_name": "module_0", "user_id": "alice"}
+    print("Forwarded params:", gateway.params)
+
+    print("\nAll gateway smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
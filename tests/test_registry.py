@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.mcp_box import McpBox  # noqa: E402
+
+# 第一个工具注册后模块执行失败
+broken_code = """
+@mcp.tool()
+def broken_a():
+    return 1
+
+raise RuntimeError("boom")
+
+@mcp.tool()
+def broken_b():
+    return 2
+"""
+
+ok_code = """
+@mcp.tool()
+def echo(text: str):
+    return text
+"""
+
+upper_code = """
+@mcp.tool()
+def echo(text: str):
+    return text.upper()
+"""
+
+add_code = """
+@mcp.tool()
+def add(a: int, b: int):
+    return a + b
+"""
+
+
+def create_box(registry: list[dict]) -> McpBox:
+    """本地模式、文件存储的 McpBox，注册表文件在临时目录中"""
+    os.chdir(tempfile.mkdtemp())
+    os.mkdir("config")
+    with open("config/mcp-tool.json", "w", encoding="utf-8") as f:
+        json.dump(registry, f)
+    return McpBox(name="test", host="127.0.0.1", port=47070, store_in_file=True)
+
+
+async def add_tool(box: McpBox, mcp_tool_name: str, code: str) -> dict:
+    transport = httpx.ASGITransport(app=box.create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://box") as client:
+        response = await client.post("/add_mcp_tool/", params={"mcp_tool_name": mcp_tool_name}, content=code)
+    return response.json()
+
+
+async def run_async():
+    cwd = os.getcwd()
+    try:
+        # 存储中执行失败的模块被跳过，不影响其他模块加载
+        box = create_box([{"mcp_tool_name": "broken", "mcp_tool_code": broken_code},
+                          {"mcp_tool_name": "ok", "mcp_tool_code": ok_code}])
+        assert list(box.tool_sources) == ["ok"]
+        assert [tool.name for tool in box.mcp._tool_manager.list_tools()] == ["echo"]
+
+        # 模块执行失败时返回错误，已注册的部分工具被移除，模块不入注册表
+        result = await add_tool(box, "broken", broken_code)
+        assert result["result"] == 3 and "boom" in result["error"], result
+        assert "broken" not in box.tool_sources
+        assert [tool.name for tool in box.mcp._tool_manager.list_tools()] == ["echo"]
+        print("Add broken module:", result)
+
+        # 写库失败（如主键重复）时撤销本地注册
+        box.store_in_db = True
+        box.insert_mcp_to_db = lambda mcp_tool_name, code, user_id: False
+        result = await add_tool(box, "adder", add_code)
+        assert result["result"] == 4, result
+        assert "adder" not in box.tool_sources and not box.mcp._tool_manager.get_tool("add")
+        box.insert_mcp_to_db = lambda mcp_tool_name, code, user_id: True
+        result = await add_tool(box, "adder", add_code)
+        assert result["result"] == 0 and result["tools"] == ["add"], result
+        print("Add with database failure:", result)
+
+        # 按存储中的注册表对齐：新增、源码变化、删除
+        box = create_box([{"mcp_tool_name": "ok", "mcp_tool_code": ok_code}])
+        box.apply_registry("v1", {"ok": (upper_code, None), "adder": (add_code, "u1")})
+        assert sorted(box.tool_sources) == ["adder", "ok"] and box._registry_version == "v1"
+        content = await box.mcp.call_tool("echo", {"text": "hi"})
+        assert content[0].text == "HI", content
+        box.apply_registry("v2", {"adder": (add_code, "u1")})
+        assert list(box.tool_sources) == ["adder"] and not box.mcp._tool_manager.get_tool("echo")
+
+        # sync_registry 读取注册表文件后对齐，版本未变化时不重复读取
+        with open("config/mcp-tool.json", "w", encoding="utf-8") as f:
+            json.dump([{"mcp_tool_name": "ok", "mcp_tool_code": ok_code}], f)
+        await box.sync_registry()
+        assert list(box.tool_sources) == ["ok"] and box.mcp._tool_manager.get_tool("echo")
+        version = box._registry_version
+        box.read_registry = lambda: (_ for _ in ()).throw(AssertionError("registry unchanged"))
+        await box.sync_registry()
+        assert box._registry_version == version
+        print("Registry sync:", list(box.tool_sources))
+    finally:
+        os.chdir(cwd)
+
+
+def run():
+    print("Running registry smoke tests...\n")
+    asyncio.run(run_async())
+    print("\nAll registry smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,135 @@
+import sys
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.sandbox_pool import EnvStats, SandboxPool, SandboxReaper, SandboxSession, env_fingerprint  # noqa: E402
+from src.sandbox_runtime import build_runtime_code  # noqa: E402
+from tests.fake_sandbox import FakeSandbox  # noqa: E402
+
+
+def _wait(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def run():
+    print("Running sandbox pool smoke tests...\n")
+
+    FakeSandbox.install()
+    # 不启用后台伸缩，由测试直接调用 autoscale
+    pool = SandboxPool({}, "", size=1, max_size=6, scale_window=10.0, scale_down_delay=30.0,
+                       scale_interval=3600, headroom=1.5, reset=False)
+
+    # Little 定律：10 秒内 20 次到达（2 次/秒）× 平均执行 2 秒 × headroom 1.5 = 6
+    now = 1000.0
+    stats = EnvStats(requirements=[], exec_time=2.0, target=1)
+    stats.arrivals.extend((now - i * 0.5, 1) for i in reversed(range(20)))
+    pool._rescale(stats, now)
+    print("Target:", stats.target)
+    assert stats.target == 6
+
+    # 超出上限时限制在 max_size，窗口外的到达不计入
+    stats.exec_time = 10.0
+    pool._rescale(stats, now)
+    assert stats.target == 6
+    pool._rescale(stats, now + 5)
+    assert stats.target == 6 and len(stats.arrivals) == 11
+
+    # 需求下降后在 scale_down_delay 内保持 target，之后才缩容到下限
+    stats.arrivals.clear()
+    pool._rescale(stats, now + 20)
+    assert stats.target == 6
+    pool._rescale(stats, now + 5 + 30)
+    print("Scaled down to:", stats.target)
+    assert stats.target == 1
+
+    # 按 target 预热，缩容后多余的空闲沙箱交给 reaper 销毁
+    fingerprint = env_fingerprint([])
+    pool.prewarm([])
+    stats = pool._stats[fingerprint]
+    stats.target = 3
+    pool.autoscale()
+    assert _wait(lambda: len(pool._idle.get(fingerprint, ())) == 3)
+    stats.raised_at = time.monotonic() - pool.scale_down_delay
+    pool.autoscale()
+    assert stats.target == 1 and len(pool._idle[fingerprint]) == 1
+    assert _wait(lambda: FakeSandbox.killed == 2)
+    print("Created:", FakeSandbox.created, "killed:", FakeSandbox.killed)
+
+    pool.close()
+
+    # 销毁失败时按指数退避重试：第 1 次失败后等 backoff，第 2 次失败后等 2 × backoff
+    reaper = SandboxReaper(workers=1, retries=3, backoff=0.1)
+    FakeSandbox.killed = 0
+    FakeSandbox.kill_failures = 2
+    session = SandboxSession({}, [], "")
+    start = time.monotonic()
+    reaper.submit(session)
+    assert time.monotonic() - start < 0.05
+    assert _wait(lambda: FakeSandbox.killed == 1)
+    times = session.sandbox.kill_times
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    print("Retry gaps:", [round(gap, 2) for gap in gaps])
+    assert len(times) == 3 and gaps[0] >= 0.1 and gaps[1] >= 0.2
+
+    # 重试用尽后放弃，不抛出异常
+    FakeSandbox.kill_failures = 10
+    session = SandboxSession({}, [], "")
+    reaper.submit(session)
+    assert _wait(lambda: len(session.sandbox.kill_times) == 3)
+    time.sleep(0.5)
+    assert len(session.sandbox.kill_times) == 3 and FakeSandbox.killed == 1
+    reaper.close()
+
+    # 同一个内核中并发执行多个 async 调用，由等待中的调用轮流收集结果
+    FakeSandbox.kill_failures = 0
+    session = SandboxSession({}, [], build_runtime_code())
+    session.run_code("async def slow(value, delay):\n"
+                     "    await _mcpbox_asyncio.sleep(delay)\n"
+                     "    if value is None:\n"
+                     "        raise ValueError('no value')\n"
+                     "    return value\n")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        start = time.monotonic()
+        first = executor.submit(session.run_async_call, "c1", "_mcpbox_submit('c1', slow('a', 0.6))")
+        second = executor.submit(session.run_async_call, "c2", "_mcpbox_submit('c2', slow('b', 0.3))")
+        assert second.result(timeout=5).results[0].text == "'b'"
+        assert first.result(timeout=5).results[0].text == "'a'"
+        elapsed = time.monotonic() - start
+        print("Overlapping calls:", round(elapsed, 2))
+        assert elapsed < 0.85
+
+        failed = session.run_async_call("c3", "_mcpbox_submit('c3', slow(None, 0))")
+        assert failed.error.name == "ValueError" and failed.error.value == "no value"
+
+        # 取消仍在执行的调用：等待的线程被唤醒，内核中的任务被取消，沙箱仍可复用
+        calls = session.sandbox.namespace["_mcpbox_calls"]
+        pending = executor.submit(session.run_async_call, "c4", "_mcpbox_submit('c4', slow('d', 30))")
+        assert _wait(lambda: "c4" in calls)
+        future = calls["c4"]
+        assert session.cancel_async_call("c4")
+        try:
+            pending.result(timeout=5)
+            raise AssertionError("cancelled call should raise")
+        except CancelledError as e:
+            print("Cancelled:", e)
+        assert _wait(future.cancelled) and not calls and not session._waiters and not session.broken
+    assert session.run_async_call("c5", "_mcpbox_submit('c5', slow(5, 0))").results[0].text == "5"
+    session.kill()
+
+    print("\nAll sandbox pool smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+# 在子进程中加载内核运行时：_mcpbox_reset 会结束本进程派生的子进程并删除临时目录中新增的文件
+KERNEL_CODE = """
+import asyncio
+import os
+import subprocess
+import tempfile
+
+from src.sandbox_runtime import build_runtime_code
+
+
+def main():
+    ns = globals()
+    tmp = tempfile.gettempdir()
+    ns["_mcpbox_load"]("counter", "d1", compile("count = [0]\\ndef bump():\\n    count[0] += 1\\n    return count[0]\\n",
+                                                "<mcp_tool:counter>", "exec"))
+    baseline = ns["_mcpbox_baseline"]
+    client = ns["_mcpbox_injected"]["http_client"]
+
+    # 一次调用留下的各种状态
+    assert ns["_mcpbox_modules"]["counter"][1].bump() == 1
+    os.environ["MCPBOX_LEAK"] = "1"
+    os.environ.pop("MCPBOX_KEEP")
+    os.makedirs(os.path.join(tmp, "leak-dir"))
+    open(os.path.join(tmp, "leak.txt"), "w").close()
+    os.chdir(os.path.join(tmp, "leak-dir"))
+    ns["leaked"] = object()
+    client.headers["X-Tenant"] = "a"
+    client.cookies.set("session", "a")
+    child = subprocess.Popen(["sleep", "30"])
+    ns["_mcpbox_submit"]("call-1", asyncio.sleep(30))
+
+    ns["_mcpbox_reset"]()
+
+    assert ns["_mcpbox_modules"]["counter"][1].bump() == 1
+    assert dict(os.environ) == baseline["environ"] and os.environ["MCPBOX_KEEP"] == "1"
+    assert os.getcwd() == baseline["cwd"]
+    assert sorted(os.listdir(tmp)) == sorted(baseline["files"][tmp])
+    assert "leaked" not in ns and set(ns) == baseline["globals"]
+    assert "X-Tenant" not in client.headers and not client.cookies
+    # 子进程已被结束并回收
+    assert not os.path.exists(f"/proc/{child.pid}")
+    assert set(ns["_mcpbox_children"]()) == baseline["children"]
+    assert not ns["_mcpbox_calls"]
+    print("reset ok")
+
+
+os.environ["MCPBOX_KEEP"] = "1"
+exec(build_runtime_code())
+main()
+"""
+
+
+def run():
+    print("Running sandbox runtime smoke tests...\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 临时目录单独指定，重置只会删除本测试创建的文件
+        env = {**os.environ, "TMPDIR": tmp, "PYTHONPATH": root_str}
+        process = subprocess.run([sys.executable, "-c", KERNEL_CODE], env=env, cwd=root_str,
+                                 capture_output=True, text=True, timeout=60)
+        assert process.returncode == 0 and "reset ok" in process.stdout, process.stdout + process.stderr
+    print("Reset:", process.stdout.strip())
+
+    print("\nAll sandbox runtime smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,81 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.scheduler import FairScheduler, parse_weights  # noqa: E402
+
+
+async def _schedule(scheduler: FairScheduler, calls: list[tuple[str, int]]) -> list[str]:
+    order = []
+    gate = asyncio.Event()
+
+    async def call(tenant: str, priority: int):
+        async with scheduler.slot(tenant, priority):
+            order.append(tenant)
+            await gate.wait()
+
+    # 先占满唯一的执行名额，其余调用进入队列
+    blocker = asyncio.create_task(call("blocker", 0))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(call(tenant, priority)) for tenant, priority in calls]
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+    return order[1:]
+
+
+def run():
+    print("Running scheduler smoke tests...\n")
+
+    assert parse_weights("alice:4, bob:1,carol") == {"alice": 4.0, "bob": 1.0, "carol": 1.0}
+
+    # 批量租户先提交 6 个调用，交互租户随后的调用不必排在全部批量调用之后
+    order = asyncio.run(_schedule(FairScheduler(max_concurrent=1), [("batch", 0)] * 6 + [("agent", 0)] * 2))
+    print("Fair order:", order)
+    assert order.index("agent") <= 2 and order[:4].count("agent") == 2
+
+    # 权重 3:1
+    order = asyncio.run(_schedule(FairScheduler(max_concurrent=1, weights={"a": 3}), [("a", 0)] * 6 + [("b", 0)] * 6))
+    print("Weighted order:", order)
+    assert order[:8].count("a") == 6
+
+    # 高优先级先执行
+    order = asyncio.run(_schedule(FairScheduler(max_concurrent=1), [("batch", 0)] * 3 + [("agent", 5)]))
+    assert order[0] == "agent"
+
+    # 排队中的调用被取消后不占用名额
+    async def cancelled():
+        scheduler = FairScheduler(max_concurrent=1)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release("a")
+        await asyncio.wait_for(scheduler.acquire("c"), 1)
+        assert scheduler.running == 1
+        # 没有排队和执行中调用的租户不再保留
+        assert set(scheduler._tenants) == {"c"}
+    asyncio.run(cancelled())
+
+    # 空闲租户随即移除
+    scheduler = FairScheduler(max_concurrent=1)
+    asyncio.run(_schedule(scheduler, [(f"tenant-{i}", 0) for i in range(50)]))
+    assert scheduler._tenants == {} and scheduler.running == 0
+
+    # 优先级限制在 max_priority 之内，声明更高优先级不能越过同级调用
+    order = asyncio.run(_schedule(FairScheduler(max_concurrent=1, max_priority=5),
+                                  [("a", 5), ("b", 10**9), ("c", 5)]))
+    assert order == ["a", "b", "c"]
+
+    print("\nAll scheduler smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
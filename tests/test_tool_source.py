@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.tool_source import ToolSourceError, parse_tool_source, unescape_tool_source  # noqa: E402
+
+multi_tool_code = """
+    \"\"\"
+    <requirements>
+    httpx>=0.27.0
+    </requirements>
+    \"\"\"
+    def _helper(x):
+        return (x, (x + 1))
+
+    @mcp.tool(
+        name="demo.add",
+        description='加法 (a + b)',
+        annotations={"parameters": {"a": {"description": "加数 (int)"}}}
+    )
+    def demo_add(a: int, b: int = 1):
+        return a + b
+
+    @mcp.tool(description='回显', annotations=ANNOTATIONS)
+    async def demo_echo(text: str, *, upper: bool):
+        return text.upper() if upper else text
+"""
+
+
+def run():
+    print("Running tool source smoke tests...\n")
+
+    ts = parse_tool_source(multi_tool_code)
+    assert ts.requirements == ["httpx>=0.27.0"]
+    assert [t.name for t in ts.tools] == ["demo.add", "demo_echo"]
+
+    add = ts.get_tool("demo.add")
+    assert add.func_name == "demo_add" and not add.is_async
+    assert add.params == ["a", "b"] and add.required_params == ["a"]
+    assert add.decorator_kwargs["annotations"]["parameters"]["a"]["description"] == "加数 (int)"
+
+    echo = ts.get_tool("demo_echo")
+    assert echo.is_async and echo.required_params == ["text", "upper"]
+    # 其他非字面量参数在 exec 时求值，解析时跳过
+    assert echo.decorator_kwargs == {"description": "回显"}
+    print("Tools:", ts.tools)
+
+    # 装饰器被去除，行号保持不变
+    assert "@mcp.tool" not in ts.sandbox_code
+    assert len(ts.sandbox_code.splitlines()) == len(ts.code.splitlines())
+    namespace = {}
+    exec(ts.sandbox_code, namespace)
+    assert namespace["demo_add"](2) == 3
+
+    # 工具名不是字符串字面量时注册即报错，而不是静默使用函数名
+    for decorator in ('@mcp.tool(name=TOOL_NAME)', '@mcp.tool(name=f"{1 + 1}")', '@mcp.tool(name=1)'):
+        try:
+            parse_tool_source(f"{decorator}\ndef f():\n    pass\n")
+            raise AssertionError(f"{decorator} should be rejected")
+        except ToolSourceError as e:
+            print("Rejected:", e)
+    # 描述及其他参数可以是表达式，留到 exec 时求值
+    for decorator in ('@mcp.tool(description=f"{1 + 1}")', '@mcp.tool(description=None)',
+                      '@mcp.tool(annotations={[1]: 2})'):
+        ts = parse_tool_source(f"{decorator}\ndef f():\n    pass\n")
+        assert [t.name for t in ts.tools] == ["f"] and "annotations" not in ts.tools[0].decorator_kwargs
+
+    # 字符串中的 \u2028 等字符不是换行，置空的仍是装饰器所在行
+    ts = parse_tool_source('X = "a\u2028b"\r\n@mcp.tool()\r\ndef f():\r\n    return X\r\n')
+    assert "@mcp.tool" not in ts.sandbox_code
+    namespace = {}
+    exec(compile(ts.sandbox_code, "<mcp_tool>", "exec"), namespace)
+    assert namespace["f"]() == "a\u2028b"
+
+    # 二次转义的源码
+    escaped = 'x = "a\\\\nb"'
+    assert unescape_tool_source(escaped) == 'x = "a\\nb"'
+
+    print("\nAll tool source smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,81 @@
+import asyncio
+import shutil
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+# 可导入项目根
+ROOT = Path(__file__).resolve().parent.parent
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from src.workers import SessionRouter, worker_socket_path  # noqa: E402
+
+
+def worker_app(index: int):
+    """回显收到的请求，并标明处理请求的 worker"""
+    async def app(scope, receive, send):
+        request = Request(scope, receive)
+        response = JSONResponse({
+            "worker": index,
+            "path": request.url.path,
+            "query": request.url.query,
+            "host": request.headers.get("host"),
+            "body": (await request.body()).decode(),
+        })
+        await response(scope, receive, send)
+    return app
+
+
+async def run_async():
+    run_dir = tempfile.mkdtemp(prefix="mcpbox-test-")
+    # worker 1 在自己的 unix socket 上提供服务
+    uds = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    uds.bind(worker_socket_path(run_dir, 1))
+    uds.listen(16)
+    server = uvicorn.Server(uvicorn.Config(SessionRouter(worker_app(1), 1, run_dir), log_level="warning"))
+    serve_task = asyncio.create_task(server.serve(sockets=[uds]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    router = SessionRouter(worker_app(0), 0, run_dir)
+    transport = httpx.ASGITransport(app=router)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://box.example") as client:
+            # worker 1 的会话消息被转发过去，路径、参数、Host 头和请求体保持不变
+            r = await client.post("/messages/1/", params={"session_id": "abc"}, content=b'{"jsonrpc": "2.0"}')
+            assert r.status_code == 200 and r.json() == {
+                "worker": 1, "path": "/messages/1/", "query": "session_id=abc",
+                "host": "box.example", "body": '{"jsonrpc": "2.0"}',
+            }, r.text
+            # 本 worker 的会话消息和其他请求由本 worker 处理
+            for path in ("/messages/0/", "/sse", "/messages/x/"):
+                r = await client.get(path)
+                assert r.json()["worker"] == 0 and r.json()["path"] == path, r.text
+            # 目标 worker 不存在时按会话不存在处理
+            r = await client.post("/messages/2/", params={"session_id": "abc"}, content=b"{}")
+            assert r.status_code == 404, r.text
+            print("Forwarded:", r.status_code)
+    finally:
+        for client in router._clients.values():
+            await client.aclose()
+        server.should_exit = True
+        await serve_task
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def run():
+    print("Running workers smoke tests...\n")
+    asyncio.run(run_async())
+    print("\nAll workers smoke tests passed.")
+
+
+if __name__ == "__main__":
+    run()